@@ -0,0 +1,281 @@
+"""
+앱 설정을 프로세스에서 한 번만 읽어 두는 곳. 다른 모듈은 환경 변수를 직접 읽지 않고 여기서 받습니다.
+
+- get_settings(): 화면 설정(API 키, 비밀번호, 대화 창 크기 등). st.secrets도 읽으므로 st.cache_resource로 둡니다.
+  gemini_chatbot.py는 rerun마다 처음부터 다시 실행되므로, 예전처럼 스크립트에서 .env를 읽고
+  st.secrets를 찾으면 학생이 버튼을 누를 때마다 같은 일을 되풀이합니다.
+- get_service_settings(): 요청 엔진·모델 경로·캐시·저장소·계측·채팅 API 설정. 환경 변수(.env)만 읽으며,
+  Streamlit 밖(채팅 API, tools/ 명령줄 도구)에서도 모듈을 가져올 때 쓰이므로 functools.cache로 둡니다.
+  (st.cache_resource는 화면의 'Clear cache'로 지워져, 이미 만든 엔진과 설정이 어긋날 수 있음)
+
+.env는 load_environment()에서 한 번만 읽습니다. .env나 secrets.toml을 고치면 앱을 다시 시작해야 반영됩니다.
+도구 스크립트는 앱 모듈을 가져오기 전에 os.environ을 고쳐야 합니다.
+"""
+import functools
+import os
+from dataclasses import dataclass
+
+import streamlit as st
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    """화면(gemini_chatbot.py, 선생님 페이지)에서 쓰는 설정. 요청 엔진·저장소 설정은 ServiceSettings에 있습니다."""
+
+    # 학교 Gemini API 키들 (GOOGLE_API_KEY + 쉼표로 나눈 GEMINI_API_KEYS). 비어 있으면 학생이 사이드바에 입력
+    api_keys: tuple[str, ...]
+    # 학교 키를 요청마다 나눠 주는 방식: least_loaded(진행 중인 요청이 가장 적은 키) / round_robin(차례로)
+    key_assignment: str
+    # 선생님 대시보드·관리자 통계 비밀번호 (없으면 누구나 볼 수 있음)
+    teacher_password: str | None
+    # 세션 상태에 남겨 두는 최근 메시지 수. 그보다 오래된 대화는 저장소에서 필요할 때만 읽음
+    conversation_window: int
+    # '이전 대화 더 보기'를 누를 때마다 저장소에서 더 읽어 오는 메시지 수
+    history_page_size: int
+    # 스트리밍 모드 (GEMINI_STREAMING=0 이면 응답이 완성된 뒤 한 번에 표시)
+    stream_responses: bool
+    # '선생님이 생각 중' 연출을 위한 최소 체감 지연(초). 요청과 동시에 흐르므로
+    # 응답이 이 시간보다 늦게 오면 추가 대기는 0이 됩니다. (기본 0 = 연출 없음)
+    min_thinking_seconds: float
+
+
+@dataclass(frozen=True)
+class EngineSettings:
+    """요청 엔진(gemini_engine) 설정."""
+
+    # Gemini API 주소 (로컬 스텁 서버 테스트용으로 바꿈)
+    base_url: str
+    # 요청 타임아웃(초)
+    timeout: float
+    # 프로세스 전체에서 동시에 열어 둘 수 있는 최대 연결 수
+    pool_max_connections: int
+    # 재사용을 위해 유지할 유휴(keep-alive) 연결 수와 유지 시간(초)
+    pool_max_keepalive: int
+    pool_keepalive_seconds: float
+    # 프로세스 전체에서 동시에 Gemini로 보내는 최대 요청 수 (넘으면 루프 안에서 순서를 기다림)
+    max_concurrent_requests: int
+    # 분당 요청 수 제한(API 키 할당량에 맞춤, 0이면 끔)과 한꺼번에 보낼 수 있는 최대 요청 수.
+    # 공유 저장소(SHARED_BACKEND_URL)를 설정하면 프로세스가 아니라 모든 복제본을 합쳐서 셈
+    rate_limit_rpm: float
+    rate_limit_burst: int
+    # 재시도: 최대 시도 횟수, 지수 백오프 기본/최대 대기(초), 재시도 예산 비율(새 요청 대비)
+    retry_max_attempts: int
+    retry_base_delay: float
+    retry_max_delay: float
+    retry_budget_ratio: float
+    # 서킷 브레이커: 연속 실패 몇 번에 열지, 연 뒤 몇 초 동안 바로 실패시킬지
+    breaker_failure_threshold: int
+    breaker_reset_seconds: float
+
+
+@dataclass(frozen=True)
+class RoutingSettings:
+    """턴 종류별 모델 목록과 헤지 요청(model_router) 설정."""
+
+    # 턴 종류별 모델 목록 (쉼표로 구분, 앞의 모델부터 쓰고 과부하이면 다음 모델로 넘어감)
+    opener_models: str
+    mentoring_models: str
+    summary_models: str
+    # 헤지 요청: 응답 헤더가 모델의 평소 지연(백분위)보다 늦으면 두 번째 요청을 보냄
+    hedge_enabled: bool
+    # 헤지 기준 백분위, 기준을 세우기 전에 모을 최소 표본 수, 기준 지연의 하한(초)
+    hedge_percentile: float
+    hedge_min_samples: int
+    hedge_min_delay: float
+
+
+@dataclass(frozen=True)
+class ReplySettings:
+    """답변 만들기(gemini_client, evaluation) 설정: 평가 형식, 대화 기록 압축, 캐시, 미리 요청."""
+
+    # 구조화된 평가 받기 (끄면 보통 글로 답하고 평가는 남지 않음)
+    structured_output: bool
+    # 대화 기록 압축: 추정 토큰 수가 예산을 넘으면 오래된 대화를 요약해서 보냄 (0이면 끔)
+    history_token_budget: int
+    # 요약하지 않고 그대로 보낼 최근 메시지 수
+    history_keep_recent: int
+    # 오래된 대화를 요약하는 묶음 크기(메시지 수). 같은 묶음은 한 번만 요약됨
+    history_summary_segment: int
+    # 컨텍스트 캐시: 긴 시스템 프롬프트를 Gemini 쪽에 캐시해 두고 이름으로만 참조
+    context_cache: bool
+    # 컨텍스트 캐시 유지 시간(초). 만료가 가까워지면 TTL을 연장하거나 새로 만듦
+    context_cache_ttl_seconds: int
+    # 응답 캐시: 첫 턴(아이디어 선택 직후) 답변을 재사용
+    response_cache: bool
+    # 답변 유지 시간(초), 보관할 최대 키 수, 키마다 모아 두고 골라 쓸 답변 수
+    response_cache_ttl_seconds: float
+    response_cache_max_entries: int
+    response_cache_variants: int
+    # 재시작 뒤에도 쓰도록 저장할 SQLite 파일 경로 (비우면 메모리에만 보관)
+    response_cache_path: str
+    # 의미 캐시: 같은 주제·같은 단계의 비슷한 후속 질문에 예전 답변을 재사용 (semantic_cache 참고)
+    semantic_cache: bool
+    # 재사용할 최소 유사도 (0~1). 낮출수록 더 자주 재사용하지만 질문과 덜 맞는 답변이 나감 (tools/eval_semantic_cache.py로 정함)
+    semantic_cache_threshold: float
+    # 보관할 최대 답변 수, 답변 유지 시간(초)
+    semantic_cache_max_entries: int
+    semantic_cache_ttl_seconds: float
+    # 학생의 몇 번째 질문까지 재사용할지 (대화가 길어질수록 그 학생만의 내용이 많아짐)
+    semantic_cache_max_stage: int
+    # 첫 답변 미리 요청: 학생이 선택지를 고르는 동안 백그라운드에서 요청해 둠
+    speculation: bool
+    # 세션마다 미리 보낼 수 있는 최대 요청 수 (선택지를 이리저리 바꿔도 할당량을 낭비하지 않도록)
+    speculation_max_per_session: int
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """대화 저장소(conversation_store)와 공유 저장소(shared_state) 설정."""
+
+    # 대화 저장소 종류: sqlite(기본), memory 또는 shared (SHARED_BACKEND_URL의 공유 저장소)
+    conversation_store: str
+    # 대화 저장소 SQLite 파일 경로
+    conversation_db_path: str
+    # 복제본끼리 함께 쓰는 공유 저장소 주소 (비우면 공유하지 않고 프로세스마다 따로 둠)
+    shared_backend_url: str
+
+
+@dataclass(frozen=True)
+class TelemetrySettings:
+    """호출 계측(telemetry) 설정."""
+
+    # 호출마다 JSON 한 줄씩 남길 파일 경로 (비우면 남기지 않음)
+    trace_path: str
+    # Prometheus가 긁어 갈 /metrics를 열 포트 (0이면 열지 않음)
+    metrics_port: int
+    # 관리자 페이지 백분위 계산에 쓰는 최근 호출 수
+    samples: int
+
+
+@dataclass(frozen=True)
+class ChatApiSettings:
+    """채팅 API(chat_api.py) 설정."""
+
+    # 동시에 진행할 수 있는 답변 턴 수 (턴마다 스레드 하나. 넘으면 스레드가 빌 때까지 기다림)
+    max_turns: int
+    # 학생 메시지 최대 길이(글자)
+    max_message_chars: int
+    # 메모리에 들고 있는 대화 수. 밀려난 대화는 다음 턴에 저장소에서 다시 읽음
+    session_cache_size: int
+    # 다른 주소에 올린 정적 화면에서 부를 때 허용할 출처 (비우면 같은 주소에서만)
+    allowed_origins: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class ServiceSettings:
+    """요청 엔진·모델 경로·답변·저장소·계측·채팅 API 설정 묶음."""
+
+    engine: EngineSettings
+    routing: RoutingSettings
+    replies: ReplySettings
+    storage: StorageSettings
+    telemetry: TelemetrySettings
+    chat_api: ChatApiSettings
+
+
+@functools.cache
+def load_environment() -> None:
+    """.env 파일을 프로세스에서 한 번만 읽어 환경 변수에 더합니다. (이미 있는 환경 변수는 덮어쓰지 않음)"""
+    load_dotenv()
+
+
+def read_secret(name: str) -> str | None:
+    """st.secrets 또는 .env의 값. secrets.toml이 없어도 .env만으로 동작합니다."""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+    return os.getenv(name)
+
+
+def split_list(value: str) -> tuple[str, ...]:
+    """쉼표로 나눈 목록 → 튜플 (빈 칸과 중복 제거, 순서 유지)."""
+    return tuple(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+
+
+@st.cache_resource(show_spinner=False)
+def get_settings() -> AppSettings:
+    """화면 설정을 처음 한 번만 읽어 프로세스 전체에서 함께 씁니다."""
+    load_environment()
+    return AppSettings(
+        # 같은 키를 두 번 적었으면 한 번만 (순서 유지)
+        api_keys=split_list(f"{read_secret('GOOGLE_API_KEY') or ''},{read_secret('GEMINI_API_KEYS') or ''}"),
+        key_assignment=os.getenv("GEMINI_KEY_ASSIGNMENT", "least_loaded"),
+        teacher_password=read_secret("TEACHER_PASSWORD") or None,
+        conversation_window=max(1, int(os.getenv("CONVERSATION_WINDOW", "40"))),
+        history_page_size=int(os.getenv("CONVERSATION_HISTORY_PAGE_SIZE", "20")),
+        stream_responses=os.getenv("GEMINI_STREAMING", "1") != "0",
+        min_thinking_seconds=float(os.getenv("TEACHER_MIN_THINKING_SECONDS", "0")),
+    )
+
+
+@functools.cache
+def get_service_settings() -> ServiceSettings:
+    """요청 엔진·캐시·저장소 설정을 처음 한 번만 읽어 프로세스 전체에서 함께 씁니다."""
+    load_environment()
+    env = os.getenv
+    return ServiceSettings(
+        engine=EngineSettings(
+            base_url=env("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/"),
+            timeout=float(env("GEMINI_TIMEOUT", "30")),
+            pool_max_connections=int(env("GEMINI_POOL_MAX_CONNECTIONS", "100")),
+            pool_max_keepalive=int(env("GEMINI_POOL_MAX_KEEPALIVE", "20")),
+            pool_keepalive_seconds=float(env("GEMINI_POOL_KEEPALIVE_SECONDS", "60")),
+            max_concurrent_requests=int(env("GEMINI_MAX_CONCURRENT_REQUESTS", "64")),
+            rate_limit_rpm=float(env("GEMINI_RATE_LIMIT_RPM", "0")),
+            rate_limit_burst=int(env("GEMINI_RATE_LIMIT_BURST", "10")),
+            retry_max_attempts=int(env("GEMINI_RETRY_MAX_ATTEMPTS", "3")),
+            retry_base_delay=float(env("GEMINI_RETRY_BASE_DELAY", "1.0")),
+            retry_max_delay=float(env("GEMINI_RETRY_MAX_DELAY", "20")),
+            retry_budget_ratio=float(env("GEMINI_RETRY_BUDGET_RATIO", "0.2")),
+            breaker_failure_threshold=int(env("GEMINI_BREAKER_FAILURE_THRESHOLD", "5")),
+            breaker_reset_seconds=float(env("GEMINI_BREAKER_RESET_SECONDS", "30")),
+        ),
+        routing=RoutingSettings(
+            opener_models=env("GEMINI_OPENER_MODELS", "gemini-2.5-flash-lite,gemini-2.5-flash"),
+            mentoring_models=env("GEMINI_MENTORING_MODELS", "gemini-2.5-flash,gemini-2.5-flash-lite"),
+            summary_models=env("GEMINI_SUMMARY_MODELS", "gemini-2.5-flash-lite,gemini-2.5-flash"),
+            hedge_enabled=env("GEMINI_HEDGE", "1") != "0",
+            hedge_percentile=float(env("GEMINI_HEDGE_PERCENTILE", "0.95")),
+            hedge_min_samples=int(env("GEMINI_HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay=float(env("GEMINI_HEDGE_MIN_DELAY", "1.0")),
+        ),
+        replies=ReplySettings(
+            structured_output=env("GEMINI_STRUCTURED_OUTPUT", "1") != "0",
+            history_token_budget=int(env("GEMINI_HISTORY_TOKEN_BUDGET", "4000")),
+            history_keep_recent=int(env("GEMINI_HISTORY_KEEP_RECENT", "6")),
+            history_summary_segment=max(1, int(env("GEMINI_HISTORY_SUMMARY_SEGMENT", "6"))),
+            context_cache=env("GEMINI_CONTEXT_CACHE", "0") == "1",
+            context_cache_ttl_seconds=int(env("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600")),
+            response_cache=env("GEMINI_RESPONSE_CACHE", "1") != "0",
+            response_cache_ttl_seconds=float(env("GEMINI_RESPONSE_CACHE_TTL_SECONDS", "86400")),
+            response_cache_max_entries=int(env("GEMINI_RESPONSE_CACHE_MAX_ENTRIES", "256")),
+            response_cache_variants=int(env("GEMINI_RESPONSE_CACHE_VARIANTS", "1")),
+            response_cache_path=env("GEMINI_RESPONSE_CACHE_PATH", ""),
+            semantic_cache=env("GEMINI_SEMANTIC_CACHE", "0") == "1",
+            semantic_cache_threshold=float(env("GEMINI_SEMANTIC_CACHE_THRESHOLD", "0.9")),
+            semantic_cache_max_entries=int(env("GEMINI_SEMANTIC_CACHE_MAX_ENTRIES", "2000")),
+            semantic_cache_ttl_seconds=float(env("GEMINI_SEMANTIC_CACHE_TTL_SECONDS", "86400")),
+            semantic_cache_max_stage=int(env("GEMINI_SEMANTIC_CACHE_MAX_STAGE", "4")),
+            speculation=env("GEMINI_SPECULATION", "1") != "0",
+            speculation_max_per_session=int(env("GEMINI_SPECULATION_MAX_PER_SESSION", "3")),
+        ),
+        storage=StorageSettings(
+            conversation_store=env("CONVERSATION_STORE", "sqlite"),
+            conversation_db_path=env("CONVERSATION_DB_PATH", "conversations.db"),
+            shared_backend_url=env("SHARED_BACKEND_URL", ""),
+        ),
+        telemetry=TelemetrySettings(
+            trace_path=env("GEMINI_TRACE_PATH", ""),
+            metrics_port=int(env("GEMINI_METRICS_PORT", "0")),
+            samples=int(env("GEMINI_TELEMETRY_SAMPLES", "5000")),
+        ),
+        chat_api=ChatApiSettings(
+            max_turns=int(env("CHAT_API_MAX_TURNS", "64")),
+            max_message_chars=int(env("CHAT_API_MAX_MESSAGE_CHARS", "2000")),
+            session_cache_size=int(env("CHAT_API_SESSION_CACHE", "512")),
+            allowed_origins=split_list(env("CHAT_API_ALLOWED_ORIGINS", "")),
+        ),
+    )
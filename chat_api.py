@@ -0,0 +1,297 @@
+"""
+창업 멘토링 채팅 API: 정적 화면(gemini_chatbot.html)이 Streamlit 앱과 같은 요청 엔진으로 대화하게 하는 작은 비동기 서버.
+
+    python chat_api.py --port 8502            # http://localhost:8502/ 에서 gemini_chatbot.html
+    uvicorn chat_api:app --port 8502          # 같은 앱을 uvicorn으로 직접
+
+브라우저는 학생 메시지만 보내고, 시스템 프롬프트·대화 기록 압축·첫 답변 캐시·분당 제한·재시도·모델 전환·
+학교 키 나눠 주기는 모두 서버의 gemini_client / gemini_engine / key_manager가 맡습니다. (API 키는 브라우저로 가지 않음)
+대화는 앱과 같은 대화 저장소에 저장되므로 선생님 대시보드·상담 일지 내보내기에도 그대로 나옵니다.
+
+- GET  /                        gemini_chatbot.html
+- GET  /api/topics              탐구 주제 목록
+- POST /api/chat                {"conversation": 대화 번호 또는 null, "topic": 주제, "message": 학생 메시지, "stream": true}
+                                stream이면 SSE(conversation → queue* → delta* → done | error), 아니면 JSON 한 번
+- GET  /api/conversations/{id}  최근 대화 (새로고침 뒤 이어 가기)
+
+HTTP 쪽은 비동기(uvicorn)로 연결 수천 개를 스레드 없이 들고 있고, 답변 한 턴은 앱과 똑같이 stream_gemini/call_gemini를
+턴 전용 스레드에서 돌립니다. 실제 Gemini 요청은 어느 쪽이든 엔진의 이벤트 루프 하나와 연결 풀 하나로 나갑니다.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app_config import get_service_settings, get_settings
+from conversation_store import get_conversation_store
+from gemini_client import TOPICS, GeminiConversation, call_gemini, stream_gemini
+from key_manager import get_key_manager
+
+APP_DIR = Path(__file__).resolve().parent
+
+logger = logging.getLogger(__name__)
+
+# 턴 수·메시지 길이·대화 캐시 크기·허용 출처 (app_config.ChatApiSettings 참고)
+CONFIG = get_service_settings().chat_api
+
+
+@dataclass
+class ChatSession:
+    """
+    대화 하나의 서버 쪽 상태. Streamlit 세션 상태(messages, message_offset, gemini_conversation)와 같은 역할로,
+    최근 대화 창을 그대로 이어 붙여 GeminiConversation이 매 턴 새 메시지만 변환하게 합니다.
+    """
+
+    conversation_id: str
+    category: str
+    messages: list[dict]  # 최근 대화 창
+    offset: int  # 창 앞에서 빠진(저장소에만 있는) 메시지 수
+    conversation: GeminiConversation = field(default_factory=GeminiConversation)
+    busy: bool = False  # 답변을 받는 중 (같은 대화에 질문이 겹치지 않게)
+
+
+class ChatSessions:
+    """대화 번호 → ChatSession. 최근에 쓴 CHAT_API_SESSION_CACHE개만 들고 있고, 없으면 저장소에서 이어 받습니다."""
+
+    def __init__(self, size: int = CONFIG.session_cache_size) -> None:
+        self.size = size
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()
+
+    def acquire(self, conversation_id: str | None, category: str) -> ChatSession | None:
+        """
+        이번 턴에 쓸 대화를 잡습니다. 번호가 없거나 저장소에 없으면 새 대화를 만듭니다.
+        같은 대화가 이미 답변을 받는 중이면 None.
+        """
+        store = get_conversation_store()
+        with self._lock:
+            session = self._sessions.get(conversation_id) if conversation_id else None
+            if session is not None:
+                self._sessions.move_to_end(conversation_id)
+                if session.busy:
+                    return None
+                session.busy = True
+                return session
+        info = store.get_session(conversation_id) if conversation_id else None
+        if info is None:
+            session = ChatSession(store.create_session(category), category, [], 0)
+        else:
+            # 재시작 뒤이거나 밀려난 대화: 최근 창만 읽고, 창 앞부분은 한 번만 변환 (요약 뒤 버려짐)
+            offset, window = store.tail(conversation_id, get_settings().conversation_window)
+            session = ChatSession(conversation_id, info["category"], window, offset)
+            if offset:
+                session.conversation.sync(store.page(conversation_id, 0, offset))
+        with self._lock:
+            current = self._sessions.setdefault(session.conversation_id, session)
+            if current.busy:
+                return None
+            current.busy = True
+            self._sessions.move_to_end(current.conversation_id)
+            # 오래된 대화부터 밀어 냄. 답변을 받는 중인 대화는 건너뜀 (턴이 끝나면 다음 정리 때 밀려남)
+            excess = len(self._sessions) - self.size
+            if excess > 0:
+                idle = [key for key, cached in self._sessions.items() if not cached.busy]
+                for key in idle[:excess]:
+                    del self._sessions[key]
+            return current
+
+    def release(self, session: ChatSession) -> None:
+        with self._lock:
+            session.busy = False
+
+
+sessions = ChatSessions()
+turn_executor = ThreadPoolExecutor(max_workers=CONFIG.max_turns, thread_name_prefix="chat-turn")
+
+
+def add_message(session: ChatSession, role: str, content: str, evaluation: dict | None = None) -> None:
+    """메시지를 저장소에 저장하고 최근 대화 창에 붙입니다. 창이 넘치면 앞부분을 잘라 냅니다. (앱의 add_message·trim_window)"""
+    get_conversation_store().append(session.conversation_id, role, content, evaluation)
+    message = {"role": role, "content": content}
+    if evaluation:
+        message["evaluation"] = evaluation
+    session.messages.append(message)
+    drop = len(session.messages) - get_settings().conversation_window
+    if drop > 0:
+        del session.messages[:drop]
+        session.offset += drop
+
+
+def error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# -------------------------------------------------------------------
+# 엔드포인트
+# -------------------------------------------------------------------
+async def index(request: Request) -> Response:
+    return FileResponse(APP_DIR / "gemini_chatbot.html", media_type="text/html; charset=utf-8")
+
+
+async def topics(request: Request) -> Response:
+    return JSONResponse({"topics": list(TOPICS)})
+
+
+async def conversation(request: Request) -> Response:
+    """저장된 대화의 주제와 최근 메시지 (새로고침 뒤 화면을 다시 그릴 때)."""
+    conversation_id = request.path_params["conversation_id"]
+    store = get_conversation_store()
+    info = await asyncio.to_thread(store.get_session, conversation_id)
+    if info is None:
+        return error(404, "저장된 대화가 없습니다.")
+    offset, window = await asyncio.to_thread(store.tail, conversation_id, get_settings().conversation_window)
+    return JSONResponse({"conversation": conversation_id, "topic": info["category"], "offset": offset, "messages": window})
+
+
+async def chat(request: Request) -> Response:
+    """학생 메시지 하나를 저장하고 선생님 답변을 받습니다. stream이면 SSE로 조각마다 보냅니다."""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return error(400, "요청 본문이 JSON 객체가 아닙니다.")
+    message = str(body.get("message") or "").strip()
+    topic = body.get("topic") or TOPICS[0]
+    if not message:
+        return error(400, "메시지를 입력해 주세요.")
+    if len(message) > CONFIG.max_message_chars:
+        return error(413, f"메시지는 {CONFIG.max_message_chars}자까지 보낼 수 있습니다.")
+    if topic not in TOPICS:
+        return error(400, f"알 수 없는 탐구 주제입니다: {topic}")
+    api_key = get_key_manager().pick()
+    if api_key is None:
+        return error(503, "서버에 Gemini API 키가 설정되지 않았습니다. (GOOGLE_API_KEY 또는 GEMINI_API_KEYS)")
+    session = await asyncio.to_thread(sessions.acquire, body.get("conversation"), topic)
+    if session is None:
+        return error(409, "이전 질문의 답변을 아직 받는 중입니다.")
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.to_thread(add_message, session, "user", message)
+        # 턴을 응답보다 먼저 턴 스레드에 맡김: 턴이 시작되면 대화를 놓는 것(release)은 턴이 맡음
+        if body.get("stream", True):
+            events = start_stream_turn(session, api_key)
+        else:
+            future = loop.run_in_executor(turn_executor, blocking_turn, session, api_key)
+    except BaseException:
+        sessions.release(session)
+        raise
+    if body.get("stream", True):
+        return StreamingResponse(
+            events, media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    try:
+        # 요청이 취소돼도 턴은 끝까지 받아 저장하고 대화를 놓음 (shield가 없으면 시작 전 턴이 취소돼 대화가 잠김)
+        reply, evaluation = await asyncio.shield(future)
+    except RuntimeError as e:
+        return error(502, str(e))
+    return JSONResponse({"conversation": session.conversation_id, "reply": reply, "evaluation": evaluation})
+
+
+def blocking_turn(session: ChatSession, api_key: str) -> tuple[str, dict | None]:
+    """call_gemini로 답변을 한 번에 받아 저장합니다. (턴 스레드에서 실행)"""
+    evaluation: dict = {}
+    try:
+        reply = call_gemini(
+            session.messages, session.category, api_key, conversation=session.conversation,
+            session=session.conversation_id, offset=session.offset, evaluation=evaluation,
+        )
+        add_message(session, "assistant", reply, evaluation or None)
+    finally:
+        sessions.release(session)
+    return reply, evaluation or None
+
+
+def start_stream_turn(session: ChatSession, api_key: str) -> AsyncIterator[bytes]:
+    """
+    턴 스레드에서 stream_gemini를 바로 돌리기 시작하고, 나오는 조각과 대기 순서를 SSE 이벤트로 바꿔 보낼 이터레이터를 돌려줍니다.
+    응답을 보내기 전이든 중간이든 브라우저가 끊어도 턴은 끝까지 받아 저장하고 대화를 놓으므로,
+    다시 열면 답변이 대화에 들어 있고 다음 질문도 받습니다.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+
+    def emit(event: str, data: dict) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def turn() -> None:
+        evaluation: dict = {}
+        chunks: list[str] = []
+        try:
+            for chunk in stream_gemini(
+                session.messages, session.category, api_key, conversation=session.conversation,
+                session=session.conversation_id, on_queue=lambda position: emit("queue", {"position": position}),
+                offset=session.offset, evaluation=evaluation,
+            ):
+                chunks.append(chunk)
+                emit("delta", {"text": chunk})
+            reply = "".join(chunks)
+            add_message(session, "assistant", reply, evaluation or None)
+            emit("done", {"reply": reply, "evaluation": evaluation or None})
+        except RuntimeError as e:
+            emit("error", {"message": str(e)})
+        except Exception:
+            logger.exception("대화 %s의 답변을 받는 중 오류가 발생했습니다.", session.conversation_id)
+            emit("error", {"message": "답변을 받는 중 서버 오류가 발생했습니다."})
+        finally:
+            sessions.release(session)
+
+    future = loop.run_in_executor(turn_executor, turn)
+
+    async def relay() -> AsyncIterator[bytes]:
+        yield sse("conversation", {"conversation": session.conversation_id, "topic": session.category})
+        while True:
+            event, data = await events.get()
+            if event in ("done", "error"):
+                # 대화를 놓은 뒤에 마지막 이벤트를 보냄 (바로 다음 질문을 보내도 409가 나지 않게)
+                await asyncio.shield(future)
+                yield sse(event, data)
+                return
+            yield sse(event, data)
+
+    return relay()
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/api/topics", topics),
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/conversations/{conversation_id}", conversation),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=list(CONFIG.allowed_origins), allow_methods=["GET", "POST"], allow_headers=["Content-Type"])
+    ] if CONFIG.allowed_origins else [],
+)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+학생 상담 대화를 저장하는 대화 저장소.
+
+대화는 턴마다 바로 저장소에 추가되고, 화면(세션 상태)에는 최근 몇 개만 남겨 둡니다.
+그래서 대화가 길어져도 세션마다 쓰는 메모리는 늘지 않고, 서버를 다시 시작해도
+주소창의 대화 번호(?s=...)로 학생의 대화를 그대로 이어 갈 수 있습니다.
+
+저장소는 ConversationStore 인터페이스만 지키면 바꿔 끼울 수 있습니다.
+기본은 SQLite(WAL) 파일이고, CONVERSATION_STORE=memory이면 프로세스 메모리에만 둡니다.
+CONVERSATION_STORE=shared이면 여러 앱 복제본이 함께 쓰는 공유 저장소(shared_state, Redis 등)에 둡니다.
+여러 세션(스크립트 스레드)이 함께 쓰므로 모든 접근은 잠금 안에서 이루어집니다.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+
+import streamlit as st
+
+from app_config import get_service_settings
+from shared_state import SharedBackend, get_shared_backend
+
+
+class ConversationStore(ABC):
+    """
+    대화 저장소 인터페이스.
+
+    대화(세션)마다 번호를 매기고, 메시지는 0번부터 차례로 붙기만 합니다.
+    메시지는 {"role": "user" | "assistant", "content": 텍스트} 형식이며 system 메시지는 저장하지 않습니다.
+    (시스템 프롬프트는 카테고리로 다시 만들 수 있음) 선생님 답변에 평가(루브릭)가 함께 왔으면
+    "evaluation" 키로 같이 저장됩니다. (evaluation.normalize_evaluation 형식)
+    """
+
+    @abstractmethod
+    def create_session(self, category: str) -> str:
+        """새 대화를 만들고 대화 번호를 돌려줍니다."""
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> dict | None:
+        """대화 정보(id, category, created_at, updated_at, messages). 없으면 None."""
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, content: str, evaluation: dict | None = None) -> int:
+        """메시지 하나를 대화 끝에 붙이고 그 메시지의 순번(0부터)을 돌려줍니다."""
+
+    @abstractmethod
+    def count(self, session_id: str) -> int:
+        """대화에 저장된 메시지 수."""
+
+    @abstractmethod
+    def page(self, session_id: str, start: int, end: int) -> list[dict]:
+        """순번이 start 이상 end 미만인 메시지들 (오래된 순)."""
+
+    @abstractmethod
+    def list_sessions(
+        self, categories: list[str] | None = None, start: float | None = None, end: float | None = None
+    ) -> list[dict]:
+        """
+        메시지가 하나 이상 있는 대화들의 정보(get_session 형식)를 시작 시각 순으로 돌려줍니다.
+
+        Args:
+            categories: 이 주제들의 대화만 (None이면 전부)
+            start: 이 시각(UNIX 초) 이후에 시작한 대화만
+            end: 이 시각(UNIX 초) 전에 시작한 대화만
+        """
+
+    def iter_messages(self, session_id: str, batch: int = 200) -> Iterator[dict]:
+        """대화 전체를 batch개씩 나눠 읽으며 차례로 내보냅니다. (한꺼번에 메모리에 올리지 않음)"""
+        start = 0
+        while True:
+            messages = self.page(session_id, start, start + batch)
+            yield from messages
+            if len(messages) < batch:
+                return
+            start += batch
+
+    def tail(self, session_id: str, limit: int) -> tuple[int, list[dict]]:
+        """(앞에서 빠진 메시지 수, 최근 limit개 메시지)."""
+        total = self.count(session_id)
+        start = max(0, total - limit)
+        return start, self.page(session_id, start, total)
+
+
+class MemoryConversationStore(ConversationStore):
+    """프로세스 메모리에만 두는 저장소. 재시작하면 사라지므로 개발·시험용입니다."""
+
+    def __init__(self) -> None:
+        self._sessions: dict[str, dict] = {}
+        self._messages: dict[str, list[dict]] = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, category: str) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = {"id": session_id, "category": category, "created_at": now, "updated_at": now}
+            self._messages[session_id] = []
+        return session_id
+
+    def get_session(self, session_id: str) -> dict | None:
+        with self._lock:
+            info = self._sessions.get(session_id)
+            return None if info is None else {**info, "messages": len(self._messages[session_id])}
+
+    def append(self, session_id: str, role: str, content: str, evaluation: dict | None = None) -> int:
+        with self._lock:
+            messages = self._messages[session_id]
+            message = {"role": role, "content": content}
+            if evaluation:
+                message["evaluation"] = evaluation
+            messages.append(message)
+            self._sessions[session_id]["updated_at"] = time.time()
+            return len(messages) - 1
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return len(self._messages.get(session_id, ()))
+
+    def list_sessions(
+        self, categories: list[str] | None = None, start: float | None = None, end: float | None = None
+    ) -> list[dict]:
+        with self._lock:
+            sessions = [
+                {**info, "messages": len(self._messages[info["id"]])}
+                for info in self._sessions.values()
+                if self._messages[info["id"]]
+                and (categories is None or info["category"] in categories)
+                and (start is None or info["created_at"] >= start)
+                and (end is None or info["created_at"] < end)
+            ]
+        return sorted(sessions, key=lambda info: info["created_at"])
+
+    def page(self, session_id: str, start: int, end: int) -> list[dict]:
+        with self._lock:
+            return [dict(m) for m in self._messages.get(session_id, [])[max(0, start):max(0, end)]]
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    SQLite 파일 저장소. WAL 모드라 한 학생이 쓰는 동안에도 다른 학생(다른 프로세스 포함)이 읽을 수 있고,
+    메시지는 (대화 번호, 순번)으로 바로 찾으므로 긴 대화의 일부만 읽어도 빠릅니다.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, category TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, messages INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, created_at REAL NOT NULL, evaluation TEXT, "
+                "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+            # 평가 열이 생기기 전에 만든 파일이면 열을 덧붙임
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(messages)")}
+            if "evaluation" not in columns:
+                self._db.execute("ALTER TABLE messages ADD COLUMN evaluation TEXT")
+            self._db.commit()
+
+    def create_session(self, category: str) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, category, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, category, now, now),
+            )
+            self._db.commit()
+        return session_id
+
+    def get_session(self, session_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, category, created_at, updated_at, messages FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "category", "created_at", "updated_at", "messages"), row))
+
+    def append(self, session_id: str, role: str, content: str, evaluation: dict | None = None) -> int:
+        now = time.time()
+        evaluation_json = json.dumps(evaluation, ensure_ascii=False) if evaluation else None
+        with self._lock:
+            # 메시지 수를 세션 행에 함께 두어 순번을 매길 때 메시지 테이블을 세지 않음
+            row = self._db.execute(
+                "UPDATE sessions SET messages = messages + 1, updated_at = ? WHERE id = ? RETURNING messages - 1",
+                (now, session_id),
+            ).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            (seq,) = row
+            self._db.execute(
+                "INSERT INTO messages (session_id, seq, role, content, created_at, evaluation) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, now, evaluation_json),
+            )
+            self._db.commit()
+        return seq
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT messages FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def list_sessions(
+        self, categories: list[str] | None = None, start: float | None = None, end: float | None = None
+    ) -> list[dict]:
+        query = "SELECT id, category, created_at, updated_at, messages FROM sessions WHERE messages > 0"
+        params: list = []
+        if categories is not None:
+            query += f" AND category IN ({', '.join('?' * len(categories))})"
+            params += categories
+        if start is not None:
+            query += " AND created_at >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND created_at < ?"
+            params.append(end)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created_at", params).fetchall()
+        return [dict(zip(("id", "category", "created_at", "updated_at", "messages"), row)) for row in rows]
+
+    def page(self, session_id: str, start: int, end: int) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, evaluation FROM messages "
+                "WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, end),
+            ).fetchall()
+        messages = []
+        for role, content, evaluation in rows:
+            message = {"role": role, "content": content}
+            if evaluation:
+                message["evaluation"] = json.loads(evaluation)
+            messages.append(message)
+        return messages
+
+
+class SharedConversationStore(ConversationStore):
+    """
+    공유 저장소(shared_state.SharedBackend) 위의 대화 저장소. 로드 밸런서 뒤의 어느 복제본에서든
+    같은 대화 번호로 대화를 이어 쓸 수 있습니다.
+
+    대화 정보는 해시(conv:<번호>), 메시지는 리스트(conv:<번호>:messages)에 JSON 한 줄씩,
+    시작 시각 순 목록은 정렬 집합(conv:index)에 둡니다. 순번은 RPUSH가 돌려주는 길이로 정하므로
+    여러 복제본이 같은 대화에 동시에 붙여도 순번이 겹치지 않습니다.
+    """
+
+    INDEX_KEY = "conv:index"
+
+    def __init__(self, backend: SharedBackend) -> None:
+        self._backend = backend
+
+    @staticmethod
+    def _info_key(session_id: str) -> str:
+        return f"conv:{session_id}"
+
+    @staticmethod
+    def _messages_key(session_id: str) -> str:
+        return f"conv:{session_id}:messages"
+
+    def create_session(self, category: str) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        self._backend.hset(
+            self._info_key(session_id), {"category": category, "created_at": repr(now), "updated_at": repr(now)}
+        )
+        self._backend.zadd(self.INDEX_KEY, {session_id: now})
+        return session_id
+
+    def get_session(self, session_id: str) -> dict | None:
+        info = self._backend.hgetall(self._info_key(session_id))
+        if not info:
+            return None
+        return {
+            "id": session_id,
+            "category": info["category"],
+            "created_at": float(info["created_at"]),
+            "updated_at": float(info["updated_at"]),
+            "messages": self.count(session_id),
+        }
+
+    def append(self, session_id: str, role: str, content: str, evaluation: dict | None = None) -> int:
+        if not self._backend.hgetall(self._info_key(session_id)):
+            raise KeyError(session_id)
+        message = {"role": role, "content": content}
+        if evaluation:
+            message["evaluation"] = evaluation
+        seq = self._backend.rpush(self._messages_key(session_id), json.dumps(message, ensure_ascii=False)) - 1
+        self._backend.hset(self._info_key(session_id), {"updated_at": repr(time.time())})
+        return seq
+
+    def count(self, session_id: str) -> int:
+        return self._backend.llen(self._messages_key(session_id))
+
+    def list_sessions(
+        self, categories: list[str] | None = None, start: float | None = None, end: float | None = None
+    ) -> list[dict]:
+        ids = self._backend.zrangebyscore(
+            self.INDEX_KEY, float("-inf") if start is None else start, float("inf") if end is None else end
+        )
+        sessions = []
+        for session_id in ids:
+            info = self.get_session(session_id)
+            if (
+                info is None
+                or not info["messages"]
+                or (end is not None and info["created_at"] >= end)
+                or (categories is not None and info["category"] not in categories)
+            ):
+                continue
+            sessions.append(info)
+        return sessions
+
+    def page(self, session_id: str, start: int, end: int) -> list[dict]:
+        start, end = max(0, start), max(0, end)
+        if end <= start:
+            return []
+        return [json.loads(raw) for raw in self._backend.lrange(self._messages_key(session_id), start, end - 1)]
+
+
+def create_store(backend: str | None = None, path: str | None = None) -> ConversationStore:
+    """설정한 종류의 대화 저장소를 만듭니다. 인자를 비우면 CONVERSATION_STORE·CONVERSATION_DB_PATH 설정을 씁니다."""
+    config = get_service_settings().storage
+    backend = backend or config.conversation_store
+    path = path or config.conversation_db_path
+    if backend == "memory":
+        return MemoryConversationStore()
+    if backend == "sqlite":
+        return SQLiteConversationStore(path)
+    if backend == "shared":
+        # 첫 답변 캐시·분당 요청 수 제한과 같은 연결을 씀 (복제본마다 연결 하나)
+        shared = get_shared_backend()
+        if shared is None:
+            raise ValueError("CONVERSATION_STORE=shared이면 SHARED_BACKEND_URL을 설정해야 합니다.")
+        return SharedConversationStore(shared)
+    raise ValueError(f"알 수 없는 대화 저장소 종류입니다: {backend}")
+
+
+@st.cache_resource
+def get_conversation_store() -> ConversationStore:
+    """프로세스 전체에서 공유하는 대화 저장소를 반환합니다."""
+    return create_store()
@@ -0,0 +1,215 @@
+"""
+선생님 답변과 함께 받는 구조화된 평가(루브릭).
+
+Gemini에 JSON 형식(responseSchema)으로 답하게 해서, 학생에게 보여 줄 답변(reply)과 함께
+시스템 프롬프트의 지도 기준(실현 가능성·예산·안전성·윤리) 점수, 이번 답변에서 파고든 기준(focus),
+학생이 지적받은 점을 고쳐 통과했는지(verdict)를 한 번의 호출로 받습니다.
+채점을 위해 따로 평가 요청을 보내지 않아도 되고, 칭찬 여부를 답변 글자에서 찾지 않아도 됩니다.
+
+스트리밍에서는 JSON이 조각으로 오므로 ReplyStreamParser가 "reply" 문자열만 도착하는 대로 풀어 내보내고,
+끝까지 받은 뒤 한 번에 전체를 읽어 평가를 꺼냅니다. 모델이 JSON이 아닌 보통 글로 답하면 글을 그대로 답변으로 씁니다.
+"""
+import json
+import re
+
+from app_config import get_service_settings
+
+# 구조화된 평가 받기 (GEMINI_STRUCTURED_OUTPUT=0이면 끔: 보통 글로 답하고 평가는 남지 않음)
+STRUCTURED_OUTPUT_ENABLED = get_service_settings().replies.structured_output
+
+# 평가 기준 (시스템 프롬프트의 지도 방식 2번과 같은 네 가지)
+RUBRIC_CRITERIA = {
+    "feasibility": "실현 가능성",
+    "budget": "예산(가격)",
+    "safety": "안전성",
+    "ethics": "윤리",
+}
+# 점수 범위
+SCORE_MIN, SCORE_MAX = 1, 5
+# verdict: 학생이 지적받은 점을 구체적으로 고쳐 통과(pass)했는지, 아직 보완 중(revise)인지
+VERDICTS = ("revise", "pass")
+
+# 시스템 프롬프트 뒤에 붙이는 평가 안내
+evaluation_prompt = f"""
+[평가 기록]
+답변은 정해진 JSON 형식으로 합니다.
+1. reply: 학생에게 할 말만 씁니다. 점수나 평가 항목 이름은 reply에 쓰지 않습니다.
+2. rubric: 지금까지 대화에서 드러난 학생 아이디어를 실현 가능성(feasibility), 예산·가격(budget), 안전성(safety),
+   윤리(ethics) 기준으로 {SCORE_MIN}~{SCORE_MAX}점으로 매깁니다. ({SCORE_MIN}: 크게 보완해야 함, {SCORE_MAX}: 충분히 생각함)
+   아직 아이디어가 나오지 않았으면 모두 3점으로 둡니다.
+3. focus: 이번 답변에서 질문하거나 짚은 기준 하나 (없으면 "none").
+4. verdict: 학생이 지적받은 내용을 구체적으로 수정해서 이번 답변에서 칭찬했다면 "pass", 아니면 "revise".
+"""
+
+# Gemini responseSchema (OpenAPI 부분 집합). reply를 맨 앞에 두어 스트리밍 때 답변부터 도착하게 함
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "reply": {"type": "STRING", "description": "학생에게 보여 줄 선생님의 답변"},
+        "rubric": {
+            "type": "OBJECT",
+            "properties": {
+                name: {"type": "INTEGER", "description": f"{label} 점수 ({SCORE_MIN}~{SCORE_MAX})"}
+                for name, label in RUBRIC_CRITERIA.items()
+            },
+            "required": list(RUBRIC_CRITERIA),
+            "propertyOrdering": list(RUBRIC_CRITERIA),
+        },
+        "focus": {"type": "STRING", "enum": [*RUBRIC_CRITERIA, "none"]},
+        "verdict": {"type": "STRING", "enum": list(VERDICTS)},
+    },
+    "required": ["reply", "rubric", "focus", "verdict"],
+    "propertyOrdering": ["reply", "rubric", "focus", "verdict"],
+}
+
+# 대화 요청에 붙이는 generationConfig
+GENERATION_CONFIG = {"responseMimeType": "application/json", "responseSchema": RESPONSE_SCHEMA}
+
+
+def normalize_evaluation(data: dict) -> dict:
+    """
+    모델이 돌려준 평가를 정리합니다. 점수는 정수로 바꿔 범위 안으로 자르고,
+    모르는 기준·판정은 "none"/"revise"로 둡니다.
+
+    Returns:
+        {"rubric": {기준: 점수}, "focus": 기준 또는 "none", "verdict": "pass" 또는 "revise"}
+    """
+    raw_rubric = data.get("rubric") if isinstance(data.get("rubric"), dict) else {}
+    rubric = {}
+    for name in RUBRIC_CRITERIA:
+        try:
+            rubric[name] = min(SCORE_MAX, max(SCORE_MIN, int(raw_rubric.get(name))))
+        except (TypeError, ValueError):
+            continue
+    focus = data.get("focus")
+    verdict = data.get("verdict")
+    return {
+        "rubric": rubric,
+        "focus": focus if focus in RUBRIC_CRITERIA else "none",
+        "verdict": verdict if verdict in VERDICTS else "revise",
+    }
+
+
+def parse_reply(text: str) -> tuple[str, dict | None]:
+    """
+    완성된 모델 출력에서 (답변, 평가)를 꺼냅니다.
+    JSON이 아니거나 reply가 없으면 글 전체를 답변으로 쓰고 평가는 None입니다.
+    """
+    parser = ReplyStreamParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+def rubric_caption(evaluation: dict) -> str:
+    """'실현 가능성 4 · 예산(가격) 2 · …' 한 줄."""
+    return " · ".join(f"{RUBRIC_CRITERIA[name]} {score}" for name, score in evaluation.get("rubric", {}).items())
+
+
+class ReplyStreamParser:
+    """
+    조각으로 오는 JSON 출력에서 맨 앞 "reply" 문자열을 도착하는 대로 풀어 내는 파서.
+
+    feed()는 새로 풀린 답변 글자만 돌려주고, 끝나면 finish()로 (전체 답변, 평가)를 받습니다.
+    이스케이프(\\n, \\uXXXX 등)가 조각 경계에서 잘리면 다음 조각이 올 때까지 기다립니다.
+    출력이 '{'로 시작하지 않으면 보통 글로 보고 받은 그대로 내보냅니다.
+    """
+
+    _KEY = re.compile(r'\{\s*"reply"\s*:\s*"')
+    _PLAIN_RUN = re.compile(r'[^"\\]+')
+    _HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+    _LONE_SURROGATE = re.compile("[\ud800-\udfff]")
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos = 0  # 다음에 읽을 버퍼 위치
+        self._state = "start"  # start → key → string → done / plain
+        self._reply: list[str] = []
+
+    def feed(self, chunk: str) -> str:
+        """조각 하나를 받아 새로 풀린 답변 글자를 돌려줍니다. (없으면 빈 문자열)"""
+        self._buffer += chunk
+        if self._state == "start":
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return ""
+            self._state = "key" if stripped.startswith("{") else "plain"
+        if self._state == "plain":
+            text = self._buffer[self._pos:]
+            self._pos = len(self._buffer)
+            self._reply.append(text)
+            return text
+        if self._state == "key":
+            match = self._KEY.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+            self._state = "string"
+        if self._state == "string":
+            return self._read_string()
+        return ""
+
+    def _read_string(self) -> str:
+        out: list[str] = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            run = self._PLAIN_RUN.match(buffer, self._pos)
+            if run:
+                out.append(run.group())
+                self._pos = run.end()
+                continue
+            if buffer[self._pos] == '"':
+                self._pos += 1
+                self._state = "done"
+                break
+            # 백슬래시 이스케이프
+            escape = self._decode_escape(buffer, self._pos)
+            if escape is None:
+                break  # 조각 경계에서 잘림: 다음 조각을 기다림
+            text, self._pos = escape
+            out.append(text)
+        decoded = "".join(out)
+        self._reply.append(decoded)
+        return decoded
+
+    def _decode_escape(self, buffer: str, pos: int) -> tuple[str, int] | None:
+        """pos의 이스케이프를 풀어 (글자, 다음 위치)를 돌려줍니다. 아직 덜 왔으면 None."""
+        if pos + 1 >= len(buffer):
+            return None
+        kind = buffer[pos + 1]
+        if kind != "u":
+            return self._ESCAPES.get(kind, kind), pos + 2
+        if pos + 6 > len(buffer):
+            return None
+        if not self._HEX4.fullmatch(buffer, pos + 2, pos + 6):
+            # 잘못된 \uXXXX는 풀지 않고 글자 그대로 씀 (모델 출력이 가끔 깨져 옴)
+            return buffer[pos:pos + 2], pos + 2
+        code = int(buffer[pos + 2:pos + 6], 16)
+        if 0xD800 <= code < 0xDC00:
+            # 서로게이트 쌍(이모지 등)은 뒤의 \uXXXX까지 함께 풀어야 함
+            if pos + 12 > len(buffer):
+                return None
+            if buffer[pos + 6:pos + 8] == "\\u" and self._HEX4.fullmatch(buffer, pos + 8, pos + 12):
+                low = int(buffer[pos + 8:pos + 12], 16)
+                if 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), pos + 12
+        if 0xD800 <= code < 0xE000:
+            # 짝이 없는 서로게이트는 UTF-8로 저장할 수 없으므로 대체 문자로
+            return "\ufffd", pos + 6
+        return chr(code), pos + 6
+
+    def finish(self) -> tuple[str, dict | None]:
+        """(전체 답변, 평가). JSON으로 읽지 못하면 평가는 None이고 지금까지 푼 답변(없으면 받은 글 전체)을 씁니다."""
+        if self._state == "plain":
+            return self._buffer, None
+        try:
+            data = json.loads(self._buffer)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("reply"), str):
+            if self._state == "done":
+                # 스트리밍으로 내보낸 답변과 같은 글자를 저장 (짝이 없는 서로게이트도 같은 대체 문자로)
+                return "".join(self._reply), normalize_evaluation(data)
+            return self._LONE_SURROGATE.sub("\ufffd", data["reply"]), normalize_evaluation(data)
+        streamed = "".join(self._reply)
+        return (streamed or self._buffer), None
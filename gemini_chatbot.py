@@ -1,12 +1,26 @@
 import streamlit as st
-import requests
 import time
 import datetime
-import os
-from dotenv import load_dotenv
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+from app_config import get_service_settings, get_settings
+from conversation_store import get_conversation_store
+from gemini_client import (
+    TOPICS,
+    GeminiConversation,
+    call_gemini,
+    get_prefetcher,
+    get_response_cache,
+    get_semantic_cache,
+    stream_gemini,
+)
+from gemini_engine import get_engine
+from key_manager import get_key_manager
 
-# .env 파일에서 API 키 로드
-load_dotenv()
+# .env·st.secrets·환경 변수 설정은 프로세스에서 한 번만 읽음 (app_config 참고)
+settings = get_settings()
 
 # -------------------------------------------------------------------
 # [TPACK - TK] 교육적 환경 구성을 위한 UI/UX 설정
@@ -20,113 +34,26 @@ st.set_page_config(
 
 # [커스텀 CSS] 아기자기하지만 가독성 좋은 디자인
 # 파스텔 톤 배경 + 진한 글씨 색상으로 대비 확보
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@400;700&display=swap');
-    
-    html, body, [class*="css"] {
-        font-family: 'Noto Sans KR', sans-serif;
-        color: #000000;
-    }
-    
-    .stApp {
-        background: radial-gradient(circle at top left, #FFE5F0 0%, #FFF8E1 35%, #E3F2FD 100%);
-    }
-
-    h1, h2, h3, h4, h5, h6, p, span, label {
-        color: #000000 !important;
-    }
-
-    /* 메인 영역 카드 느낌 */
-    .main > div {
-        background-color: rgba(255, 255, 255, 0.9);
-        border-radius: 16px;
-        padding: 24px 20px;
-        box-shadow: 0 8px 24px rgba(0, 0, 0, 0.08);
-    }
-
-    /* 버튼: 파스텔 톤 */
-    .stButton>button {
-        background: linear-gradient(135deg, #FFB6C1, #FFCC80);
-        color: #000000;
-        border-radius: 999px;
-        font-weight: 700;
-        border: none;
-        padding: 0.4rem 1.2rem;
-    }
-    .stButton>button:hover {
-        opacity: 0.95;
-        box-shadow: 0 4px 10px rgba(255, 182, 193, 0.6);
-    }
-
-    /* 정보 박스 */
-    .stInfo {
-        background-color: #FFF3E0;
-        color: #000000;
-        border-radius: 12px;
-    }
-
-    /* 사이드바 배경 */
-    section[data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #FFF3E0 0%, #F3E5F5 100%);
-    }
-
-    /* 채팅 말풍선 느낌 (기본 텍스트 대비 강화용) */
-    .stChatMessage p,
-    .stChatMessage div,
-    .stChatMessage span,
-    .stChatMessage * {
-        color: #000000 !important;
-    }
-    
-    /* Expander 내부 텍스트 색상 (검정색) */
-    [data-testid="stExpander"] p,
-    [data-testid="stExpander"] h3,
-    [data-testid="stExpander"] h4,
-    [data-testid="stExpander"] li,
-    [data-testid="stExpander"] strong {
-        color: #000000 !important;
-    }
-    
-    /* 모든 텍스트 요소를 검정색으로 강제 설정 */
-    * {
-        color: #000000 !important;
-    }
-    
-    /* 배경색과 테두리는 제외 */
-    [style*="background"],
-    [style*="border"],
-    .stApp,
-    section[data-testid="stSidebar"],
-    .main > div,
-    .stInfo,
-    .stButton>button {
-        color: #000000 !important;
-    }
-    
-    /* 사이드바의 API key 입력 부분과 탐구주제 선택 부분만 흰색 */
-    section[data-testid="stSidebar"] [data-testid="stTextInput"] input,
-    section[data-testid="stSidebar"] [data-testid="stTextInput"] label,
-    section[data-testid="stSidebar"] [data-testid="stSelectbox"] label,
-    section[data-testid="stSidebar"] [data-testid="stSelectbox"] select,
-    section[data-testid="stSidebar"] [data-testid="stSelectbox"] div {
-        color: #FFFFFF !important;
-    }
-    
-    </style>
-    """, unsafe_allow_html=True)
+# CSS는 static/style.css에 두고 Streamlit 정적 파일로 제공 (.streamlit/config.toml에서 켬).
+# rerun마다 긴 <style> 블록 대신 링크 한 줄만 보내고, 파일은 브라우저가 캐시합니다.
+st.markdown('<link rel="stylesheet" href="app/static/style.css">', unsafe_allow_html=True)
+
+APP_DIR = Path(__file__).resolve().parent
+
+
+@st.cache_data(show_spinner=False)
+def load_markdown(path: str) -> str:
+    """앱 폴더 기준 마크다운 파일을 읽습니다. 프로세스에서 한 번만 읽고 rerun마다 재사용합니다."""
+    return (APP_DIR / path).read_text(encoding="utf-8")
 
 # -------------------------------------------------------------------
 # [TPACK - TK] API 키 보안 설정 (Google Gemini)
 # -------------------------------------------------------------------
-# Streamlit secrets 또는 .env 파일에서 Gemini API 키 로드
-gemini_api_key: str | None = None
-
-if "GOOGLE_API_KEY" in st.secrets:
-    gemini_api_key = st.secrets["GOOGLE_API_KEY"]
-elif os.getenv("GOOGLE_API_KEY"):
-    gemini_api_key = os.getenv("GOOGLE_API_KEY")
-else:
+# 학교 키(secrets/.env의 GOOGLE_API_KEY·GEMINI_API_KEYS)가 있으면 요청마다 키 관리자가 하나씩 나눠 줌.
+# 없으면 학생이 사이드바에 자기 키를 입력하고, 그 키는 이 세션에서만 씀
+personal_api_key: str | None = None
+
+if not settings.api_keys:
     # 사이드바에서 API 키 입력 받기
     with st.sidebar:
         st.header("⚙️ 설정")
@@ -137,22 +64,89 @@ else:
             placeholder="예: AIxxx..."
         )
 
-    if api_key_input:
-        # API 키가 변경되었는지 확인
-        if "previous_api_key" not in st.session_state:
-            st.session_state.previous_api_key = api_key_input
-        elif st.session_state.previous_api_key != api_key_input:
-            # API 키가 변경되었으면 세션 상태 완전 초기화
-            st.session_state.clear()
-            st.session_state.previous_api_key = api_key_input
-            st.rerun()
-        
-        gemini_api_key = api_key_input
-    else:
+    if not api_key_input:
         st.error("🚨 선생님이 칠판을 준비하지 못했어요. (Gemini API 키를 설정해주세요)")
         st.info("💡 .env 파일에 GOOGLE_API_KEY를 설정하거나, 사이드바에서 직접 입력하세요.")
         st.stop()
 
+    # 키 확인은 한 번만 (결과는 키 관리자가 기억). 확인할 수 없을 때(할당량·통신 오류)는 일단 써 봄
+    if get_key_manager().validate(api_key_input) is False:
+        st.error("🚨 입력한 Gemini API 키를 쓸 수 없어요. 키를 다시 확인해 주세요.")
+        st.stop()
+
+    # 키를 바꿔도 대화는 그대로 이어 감 (다음 요청부터 새 키로 보냄)
+    if st.session_state.get("previous_api_key") not in (None, api_key_input):
+        st.toast("🔑 새 API 키로 바꿨어요. 대화는 그대로 이어집니다.")
+    st.session_state.previous_api_key = api_key_input
+    personal_api_key = api_key_input
+
+
+def api_key_for_request() -> str:
+    """이번 요청에 쓸 키: 학생이 입력한 키, 없으면 학교 키 묶음에서 하나."""
+    return personal_api_key or get_key_manager().pick()
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 대화 저장소: 턴마다 저장하고 화면에는 최근 대화만 유지
+# -------------------------------------------------------------------
+# 세션 상태에 남겨 두는 최근 메시지 수. 그보다 오래된 대화는 저장소에서 필요할 때만 읽음
+CONVERSATION_WINDOW = settings.conversation_window
+# '이전 대화 더 보기'를 누를 때마다 저장소에서 더 읽어 오는 메시지 수
+HISTORY_PAGE_SIZE = settings.history_page_size
+# 응답 속도 기록을 남길 최근 턴 수
+TURN_TIMING_SAMPLES = 50
+
+store = get_conversation_store()
+
+
+def restore_conversation(conversation_id: str) -> bool:
+    """
+    주소창의 대화 번호로 저장된 대화를 이어 갑니다. (서버 재시작이나 새로고침 뒤)
+    최근 CONVERSATION_WINDOW개만 세션 상태로 읽어 옵니다. 저장된 대화가 없으면 False.
+    """
+    info = store.get_session(conversation_id)
+    if info is None or not info["messages"]:
+        return False
+    offset, window = store.tail(conversation_id, CONVERSATION_WINDOW)
+    st.session_state.conversation_id = conversation_id
+    st.session_state.messages = window
+    st.session_state.message_offset = offset
+    st.session_state.idea_selected = True
+    st.session_state.custom_idea = ""
+    st.session_state.topic = info["category"]
+    # 학생 질문만 저장되고 답변 전에 끊겼다면 답변부터 다시 받음
+    st.session_state.awaiting_reply = window[-1]["role"] == "user"
+    return True
+
+
+def add_message(role: str, content: str, evaluation: dict | None = None) -> None:
+    """
+    메시지를 저장소에 저장하고 세션 상태의 최근 대화에 붙입니다. 첫 메시지면 대화를 새로 만듭니다.
+    선생님 답변과 함께 온 평가(루브릭)가 있으면 그 턴에 같이 저장합니다.
+    """
+    if "conversation_id" not in st.session_state:
+        st.session_state.conversation_id = store.create_session(category)
+        st.query_params["s"] = st.session_state.conversation_id
+    store.append(st.session_state.conversation_id, role, content, evaluation)
+    message = {"role": role, "content": content}
+    if evaluation:
+        message["evaluation"] = evaluation
+    st.session_state.messages.append(message)
+
+
+def trim_window() -> None:
+    """세션 상태의 대화를 최근 CONVERSATION_WINDOW개로 줄입니다. (잘라 낸 앞부분은 저장소에 있음)"""
+    messages = st.session_state.messages
+    drop = len(messages) - CONVERSATION_WINDOW
+    if drop > 0:
+        del messages[:drop]
+        st.session_state.message_offset = st.session_state.get("message_offset", 0) + drop
+
+
+# 새로 연 탭(또는 서버 재시작 뒤)이면 주소창의 대화 번호로 저장된 대화를 이어 감
+if "messages" not in st.session_state and (saved_conversation := st.query_params.get("s")):
+    if not restore_conversation(saved_conversation):
+        st.query_params.clear()
+
 # -------------------------------------------------------------------
 # [TPACK - PK] 스캐폴딩(Scaffolding) & 학습 목표 제시
 # -------------------------------------------------------------------
@@ -167,7 +161,8 @@ with st.sidebar:
     # [설정] 창업 분야 선택
     category = st.selectbox(
         "탐구 주제 선택",
-        ["🏫 학교 생활 개선", "🌍 환경 보호", "🤖 미래 기술 활용", "🏠 안전한 우리 집"]
+        TOPICS,
+        key="topic",
     )
     
     st.divider()
@@ -176,190 +171,233 @@ with st.sidebar:
     
     # [과정 중심 평가] 포트폴리오 저장
     if st.button("📝 상담 일지 저장하기"):
-        chat_log = ""
-        if "messages" in st.session_state:
-            for msg in st.session_state.messages:
-                role = "선생님" if msg["role"] == "assistant" else "학생"
-                if msg["role"] != "system":
-                    chat_log += f"[{role}] {msg['content']}\n"
-        
-        if chat_log:
+        # 세션 상태에는 최근 대화만 있으므로 저장소에서 전체 대화를 읽어 씀
+        if "conversation_id" in st.session_state:
+            # 내보내기 모듈(zipfile·csv)은 일지를 저장할 때만 가져옴
+            from log_export import log_lines, spool
+
             st.download_button(
                 label="💾 파일로 내려받기",
-                data=chat_log,
+                data=spool(
+                    line.encode("utf-8") for line in log_lines(store.iter_messages(st.session_state.conversation_id))
+                ),
                 file_name=f"창업멘토링_{datetime.datetime.now().strftime('%Y%m%d')}.txt",
                 mime="text/plain"
             )
         else:
             st.warning("저장할 대화 내용이 없습니다.")
 
+    # 응답 속도 기록: 첫 글자까지 걸린 시간(TTFT)을 스트리밍/일괄 방식별로 비교
+    if st.session_state.get("turn_timings"):
+        with st.expander("⏱️ 응답 속도"):
+            for mode, label in (("stream", "스트리밍"), ("blocking", "한 번에 받기")):
+                timings = [t for t in st.session_state.turn_timings if t["mode"] == mode]
+                if timings:
+                    avg_ttft = sum(t["ttft"] for t in timings) / len(timings)
+                    avg_total = sum(t["total"] for t in timings) / len(timings)
+                    st.caption(
+                        f"{label} ({len(timings)}회): 첫 글자 평균 {avg_ttft:.2f}초 · 전체 평균 {avg_total:.2f}초"
+                    )
+            last = st.session_state.turn_timings[-1]
+            if "payload_bytes" in last:
+                st.caption(
+                    f"마지막 요청 크기: {last['payload_bytes'] / 1024:.1f}KB "
+                    f"(압축 전 {last['payload_bytes_full'] / 1024:.1f}KB · 요약된 메시지 {last['summarized_messages']}개)"
+                )
+            if last.get("context_cache"):
+                st.caption("시스템 프롬프트: 컨텍스트 캐시 사용 중")
+            if last.get("model"):
+                route = {"opener": "첫 답변", "mentoring": "멘토링"}.get(last["route"], last["route"])
+                detail = f" · 과부하로 다른 모델로 {last['failovers']}번 넘어감" if last["failovers"] else ""
+                if last["hedge"] == "won":
+                    detail += " · 늦어서 다시 보낸 요청(헤지)이 먼저 도착"
+                st.caption(f"마지막 답변: {route} 경로 → {last['model']}{detail}")
+            cache = get_response_cache().stats()
+            if cache["hits"] + cache["misses"]:
+                st.caption(
+                    f"첫 답변 캐시: 적중 {cache['hits']}/{cache['hits'] + cache['misses']}회 ({cache['hit_rate']:.0%}) · "
+                    f"아낀 시간 {cache['saved_seconds']:.1f}초 · 보관 {cache['entries']}개"
+                )
+            if get_service_settings().replies.semantic_cache:
+                semantic = get_semantic_cache().stats()
+                if semantic["hits"] + semantic["misses"]:
+                    st.caption(
+                        f"비슷한 질문 재사용: 적중 {semantic['hits']}/{semantic['hits'] + semantic['misses']}회 "
+                        f"({semantic['hit_rate']:.0%}) · 아낀 시간 {semantic['saved_seconds']:.1f}초 · 보관 {semantic['entries']}개"
+                    )
+            prefetch = get_prefetcher().stats()
+            if prefetch["started"]:
+                st.caption(
+                    f"첫 답변 미리 요청: 적중 {prefetch['used']}/{prefetch['started']}회 ({prefetch['hit_rate']:.0%}) · "
+                    f"취소 {prefetch['cancelled']}회 · 아낀 대기 {prefetch['saved_seconds']:.1f}초"
+                )
+            engine = get_engine().stats()
+            st.caption(
+                f"연결 재사용: {engine['reused']}/{engine['requests']}회 ({engine['reuse_rate']:.0%}) · 새 연결 {engine['new_connections']}회"
+            )
+            st.caption(
+                f"동시 요청: 현재 {engine['in_flight']}건 · 최대 {engine['peak_in_flight']}건 · "
+                f"대기 {engine['waiting']}건 (학생 {engine['waiting_sessions']}명)"
+            )
+            st.caption(
+                f"대기 시간: p50 {engine['wait_p50']:.2f}초 · p95 {engine['wait_p95']:.2f}초 · "
+                f"최대 {engine['wait_max']:.2f}초 · 분당 한도에 걸림 {engine['rate_limited']}회"
+            )
+            circuit = {"closed": "정상", "open": "차단 중", "half_open": "복구 확인 중"}[engine["circuit_state"]]
+            st.caption(
+                f"모델 전환: {engine['failovers']}회 · 헤지 요청 {engine['hedges']}회 (먼저 도착 {engine['hedges_won']}회)"
+            )
+            st.caption(
+                f"재시도: {engine['retries']}회 (예산 부족 {engine['retry_budget_exhausted']}회) · "
+                f"연결 상태: {circuit} (차단 {engine['circuit_opens']}회, 바로 거절 {engine['circuit_rejections']}건)"
+            )
+
 # -------------------------------------------------------------------
-# [TPACK - CK/PK] 페르소나: 카리스마 있는 5년 차 선생님
+# [TPACK - TK] 선생님 답변 표시 (스트리밍 + 최소 체감 지연)
 # -------------------------------------------------------------------
-# 시스템 프롬프트 템플릿 (category 변수를 사용하기 전에 정의)
-system_prompt_template = """
-당신은 친절하지만 카리스마 있는 5년 차 초등학교 선생님입니다.
-현재 수업 주제: {category}
-
-[성격 및 말투]
-1. 말투: 기본적으로 존댓말을 쓰되, 단호하고 명확하게 말합니다. (예: "그 부분은 다시 생각해볼까요?", "좋습니다.")
-2. 태도: 학생을 존중하지만, 만만하게 보이지 않습니다. 다만, 어떤 의견이든 먼저 긍정적인 부분을 찾아주고, 그 다음에 보완점을 설명합니다.
-3. 이모지: 교육적 강조가 필요할 때가 아니면 거의 사용하지 않습니다.
-
-[다양한 의견 수용 방식]
-1. 학생의 아이디어가 비현실적이거나 엉뚱해 보여도 바로 '틀렸다'고 말하지 않습니다.
-2. "그 생각도 의미가 있어요. 다만, 이런 점을 조금 더 생각해보면 좋겠어요."처럼, 먼저 이해와 공감을 표현한 뒤에 수정 방향을 제시합니다.
-3. 학생이 하고 싶은 말의 의도를 최대한 선하게 해석하고, 판단하거나 비난하기보다 '함께 수정해 나가는 파트너'처럼 대화합니다.
-
-[지도 방식 (소크라테스식 문답법 + 예시 제시)]
-1. 정답을 바로 주지 않습니다.
-2. 학생의 아이디어에서 '실현 가능성', '예산(가격)', '안전성', '윤리적 문제' 중 취약해 보이는 부분을 골라, 생각을 더 깊이 하게 만드는 질문을 합니다.
-   (예: "취지는 좋지만, 초등학생이 감당하기엔 제작 비용이 너무 비싸지 않을까요?")
-3. 학생이 지적받은 내용을 구체적으로 수정하면, 그때 비로소 "아주 훌륭합니다. 정확하게 문제를 해결했군요."라고 칭찬해주세요.
-4. 여러 방향의 해결책이 있을 수 있음을 인정하고, "이렇게도 할 수 있고, 저렇게도 할 수 있어요."처럼 다양한 선택지를 제시합니다.
-5. 학생이 많이 막혀 있거나 아이디어를 내기 어려워하면, 먼저 예시 발명품(창업 아이템)을 하나 제시해서 아래 항목을 함께 짚어 봅니다.
-   - 어떤 문제를 해결하려고 만든 발명품인지
-   - **어떤 부분들을 고려했는지** (사용자, 장소, 시간, 필요한 재료 등)
-   - **어떤 것을 중점으로 생각했는지** (편리함, 안전, 환경 보호, 재미 등)
-   - **어떤 주의점이 있는지** (위험 요소, 관리 방법, 규칙 등)
-   - **가격은 어느 정도로 예상하는지** (선택 사항이며, 너무 비싸지 않게 조심해야 한다는 점을 알려줍니다.)
-   - **어떤 교육적 이점이 있는지** (협동심, 책임감, 창의성, 문제 해결 능력 등)
-6. 처음부터 예시를 들 때에도, 예시만 설명하고 끝내지 말고,
-   "지금 선생님 예시처럼, 너도 문제·중점·주의점·가격(선택)·교육적 이점을 차근차근 정리해 볼까요?"라고 말하며 학생이 따라 할 수 있도록 도와줍니다.
-"""
-
-# 시스템 프롬프트 생성 함수
-def get_system_prompt(category: str) -> str:
-    """카테고리에 맞는 시스템 프롬프트를 생성합니다."""
-    return system_prompt_template.format(category=category)
-
-# 현재 카테고리에 맞는 시스템 프롬프트 생성
-system_prompt = get_system_prompt(category)
-
-
-def call_gemini(messages: list[dict], category: str) -> str:
+# 스트리밍 모드 (GEMINI_STREAMING=0 이면 기존처럼 응답이 완성된 뒤 한 번에 표시)
+STREAM_RESPONSES = settings.stream_responses
+
+# '선생님이 생각 중' 연출을 위한 최소 체감 지연(초). 요청과 동시에 흐르므로
+# 응답이 이 시간보다 늦게 오면 추가 대기는 0이 됩니다. (기본 0 = 연출 없음)
+MIN_THINKING_SECONDS = settings.min_thinking_seconds
+
+
+def wait_for_min_thinking(started: float) -> None:
+    """요청 시작 시각(started) 기준으로 최소 체감 지연 중 남은 시간만큼만 기다립니다."""
+    remaining = MIN_THINKING_SECONDS - (time.perf_counter() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def queue_session() -> str:
+    """요청 대기열에서 이 학생(세션)의 요청끼리 한 줄에 세우기 위한 구분값."""
+    if "queue_session" not in st.session_state:
+        st.session_state.queue_session = uuid.uuid4().hex
+    return st.session_state.queue_session
+
+
+def opener_message(idea: str) -> str:
+    """아이디어 선택지(또는 직접 입력한 종류)로 첫 학생 메시지를 만듭니다."""
+    return f"저는 {idea} 관련 아이디어를 생각해보고 싶어요."
+
+
+def prefetch_opener(user_input: str | None) -> None:
     """
-    현재 대화 내용을 바탕으로 Gemini 2.5 Flash에 요청을 보내고,
-    선생님 AI의 응답 텍스트를 반환합니다.
-    
-    Args:
-        messages: 대화 메시지 리스트
-        category: 현재 선택된 카테고리
+    학생이 선택지를 고르는 동안 그 선택지의 첫 답변을 백그라운드에서 미리 요청해 둡니다.
+    선택을 바꾸면 이전 요청은 취소되고, user_input이 None이면 진행 중인 요청만 취소합니다.
     """
-    url = (
-        "https://generativelanguage.googleapis.com/v1beta/"
-        "models/gemini-2.5-flash:generateContent"
-        f"?key={gemini_api_key}"
+    current = st.session_state.get("speculation")
+    messages = [{"role": "user", "content": user_input}] if user_input else None
+    speculation = get_prefetcher().switch(
+        current, messages, category, api_key_for_request(), queue_session(), st.session_state.get("speculation_spent", 0)
     )
+    if speculation is not None and speculation is not current:
+        st.session_state.speculation_spent = st.session_state.get("speculation_spent", 0) + 1
+    st.session_state.speculation = speculation
 
-    # Streamlit용 메시지 포맷을 Gemini 포맷으로 변환
-    contents: list[dict] = []
-    for msg in messages:
-        role = msg.get("role")
-        if role == "user":
-            g_role = "user"
-        elif role == "assistant":
-            g_role = "model"
+
+def render_teacher_reply(messages: list[dict], category: str, offset: int = 0) -> tuple[str, dict | None]:
+    """
+    현재 chat_message 블록 안에 선생님 답변을 그리고, (완성된 답변 텍스트, 평가)를 반환합니다.
+    평가는 답변과 함께 온 루브릭 점수와 통과 판정이며, 모델이 보통 글로 답했으면 None입니다.
+    첫 글자가 보이기까지의 시간(TTFT)과 전체 시간을 기록해 두 방식을 비교할 수 있게 하고,
+    대화 기록 압축 전/후 요청 크기도 함께 남깁니다.
+    질문이 몰려 요청 대기열에서 기다리는 동안에는 '검토 중' 안내 대신 대기 순서를 보여줍니다.
+    messages는 최근 대화 창이고, offset은 그 앞에서 빠진(저장소에만 있는) 메시지 수입니다.
+    """
+    started = time.perf_counter()
+    first_token_at: float | None = None
+    payload_stats: dict = {}
+    evaluation: dict = {}
+    # 이미 변환해 둔 대화는 재사용하고 새 메시지만 Gemini 형식으로 변환
+    if "gemini_conversation" not in st.session_state:
+        st.session_state.gemini_conversation = GeminiConversation()
+        if offset:
+            # 이어 가는 대화: 창 앞부분을 저장소에서 한 번만 읽어 변환 (오래된 부분은 요약 뒤 버려짐)
+            st.session_state.gemini_conversation.sync(
+                store.page(st.session_state.conversation_id, 0, offset)
+            )
+    conversation = st.session_state.gemini_conversation
+    session = queue_session()
+    # 턴마다 키를 고름: 학교 키 묶음이면 지금 가장 한가한(또는 차례인) 키
+    api_key = api_key_for_request()
+    # 선택 화면에서 첫 답변을 미리 요청해 두었다면 그 결과를 씀
+    speculation = st.session_state.pop("speculation", None)
+
+    # 답변이 보이기 전까지 '검토 중' 안내(또는 대기 순서)를 보여줌
+    status = st.empty()
+
+    def show_queue(position: int | None) -> None:
+        if position is None:
+            status.caption("⏳ 선생님이 아이디어를 검토하고 있습니다...")
         else:
-            # system 등은 systemInstruction으로 따로 전달
-            continue
-
-        contents.append(
-            {
-                "role": g_role,
-                "parts": [{"text": msg.get("content", "")}],
-            }
-        )
+            status.caption(f"🙋 질문이 몰려서 순서를 기다리고 있어요. 대기 {position + 1}번째 (앞에 {position}명)")
 
-    # 현재 카테고리에 맞는 시스템 프롬프트 가져오기
-    current_system_prompt = get_system_prompt(category)
-    
-    payload = {
-        "contents": contents,
-        "systemInstruction": {
-            "parts": [{"text": current_system_prompt}],
-        },
-    }
-
-    # 재시도 로직 (503 오류 대응)
-    max_retries = 3
-    retry_delay = 2
-    
-    for attempt in range(max_retries):
+    show_queue(None)
+
+    if STREAM_RESPONSES:
+
+        def chunks() -> Iterator[str]:
+            nonlocal first_token_at
+            for chunk in stream_gemini(
+                messages, category, api_key, payload_stats, conversation, session, show_queue, speculation,
+                offset, evaluation,
+            ):
+                if first_token_at is None:
+                    wait_for_min_thinking(started)
+                    first_token_at = time.perf_counter()
+                    status.empty()
+                yield chunk
+
+        try:
+            ai_reply = st.write_stream(chunks())
+        finally:
+            status.empty()
+    else:
         try:
-            resp = requests.post(
-                url,
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=30,
+            ai_reply = call_gemini(
+                messages, category, api_key, payload_stats, conversation, session, show_queue, speculation,
+                offset, evaluation,
             )
-            
-            if resp.status_code == 401:
-                raise RuntimeError(
-                    "Gemini API 인증 오류입니다. GOOGLE_API_KEY 값을 다시 확인해 주세요."
-                )
-            
-            if resp.status_code == 503:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                else:
-                    raise RuntimeError(
-                        "Gemini API 서버가 일시적으로 사용할 수 없습니다. 잠시 후 다시 시도해주세요. (503 Service Unavailable)"
-                    )
-            
-            resp.raise_for_status()
-            break
-            
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            else:
-                raise RuntimeError("Gemini API 요청 시간이 초과되었습니다. 네트워크 연결을 확인해주세요.")
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            else:
-                raise RuntimeError(f"Gemini API 통신 오류: {e}")
-        except requests.exceptions.HTTPError as e:
-            if resp.status_code == 503 and attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            else:
-                raise RuntimeError(f"Gemini API 응답 오류: {e}")
-
-    data = resp.json()
-    try:
-        return data["candidates"][0]["content"]["parts"][0]["text"]
-    except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+            wait_for_min_thinking(started)
+        finally:
+            status.empty()
+        first_token_at = time.perf_counter()
+        st.markdown(ai_reply)
+
+    finished = time.perf_counter()
+    timings = st.session_state.setdefault("turn_timings", [])
+    timings.append(
+        {
+            "mode": "stream" if STREAM_RESPONSES else "blocking",
+            "ttft": (first_token_at or finished) - started,
+            "total": finished - started,
+            **payload_stats,
+        }
+    )
+    del timings[:-TURN_TIMING_SAMPLES]
+    return (ai_reply if isinstance(ai_reply, str) else "".join(map(str, ai_reply))), evaluation or None
+
 
 # -------------------------------------------------------------------
 # 채팅 인터페이스 초기화
 # -------------------------------------------------------------------
 # 세션 상태 초기화 (처음 실행 시)
+# messages는 최근 대화 창(system 프롬프트는 카테고리로 매번 만들므로 넣지 않음),
+# message_offset은 창 앞에서 빠져 저장소에만 있는 메시지 수
 if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "system", "content": get_system_prompt(category)}]
+    st.session_state.messages = []
+    st.session_state.message_offset = 0
     st.session_state.idea_selected = False
     st.session_state.custom_idea = ""
 
-# idea_selected가 없거나 초기화가 필요한 경우 - 확실하게 False로 설정
-if "idea_selected" not in st.session_state:
+# 상태 규칙: 메시지는 뒤에 붙기만 하므로
+# '아이디어를 골랐다(idea_selected)' == '대화에 메시지가 있다'를 길이만으로 확인 (매 rerun O(1))
+st.session_state.setdefault("message_offset", 0)
+if st.session_state.get("idea_selected") and not st.session_state.messages and not st.session_state.message_offset:
     st.session_state.idea_selected = False
-
-# idea_selected가 True인데 실제로 선택된 메시지가 없으면 다시 False로
-if st.session_state.idea_selected:
-    user_messages = [m for m in st.session_state.messages if m.get("role") == "user"]
-    if len(user_messages) == 0:
-        st.session_state.idea_selected = False
-
-# 강제 초기화: messages에 system만 있으면 idea_selected를 False로
-if "messages" in st.session_state:
-    non_system_messages = [m for m in st.session_state.messages if m.get("role") != "system"]
-    if len(non_system_messages) == 0:
-        st.session_state.idea_selected = False
+st.session_state.setdefault("idea_selected", False)
 
 st.title("👩‍🏫 창업 아이디어 멘토링")
 st.write(f"### 주제: **{category}** 프로젝트")
@@ -368,18 +406,7 @@ st.markdown("---")
 # -------------------------------------------------------------------
 # [교육적 빌드업] 시작 화면 - 아이디어 선택
 # -------------------------------------------------------------------
-# 선택지가 아직 선택되지 않았으면 선택지 화면 표시
-# system 메시지만 있으면 무조건 선택지 화면 표시
-if "messages" in st.session_state:
-    if len([m for m in st.session_state.messages if m.get("role") != "system"]) == 0:
-        st.session_state.idea_selected = False
-
-# 선택지 화면 표시 보장 - system 메시지만 있으면 무조건 False
-if "messages" in st.session_state:
-    non_system_count = len([m for m in st.session_state.messages if m.get("role") != "system"])
-    if non_system_count == 0:
-        st.session_state.idea_selected = False
-
+# 선택지가 아직 선택되지 않았으면 선택지 화면 표시 (대화가 비어 있으면 위에서 False로 맞춰 둠)
 if not st.session_state.idea_selected:
     st.markdown("""
     <div style='background-color: #E8EAF6; padding: 25px; border-radius: 15px; margin: 20px 0; border-left: 5px solid #3949AB;'>
@@ -421,116 +448,18 @@ if not st.session_state.idea_selected:
         idea_options,
         key="idea_selection"
     )
+
+    # 학생이 고르는 동안 이 선택지의 첫 답변을 미리 요청해 둠 ('기타'는 입력 전이라 미리 요청하지 않음)
+    if selected_option == "기타 (직접 입력)":
+        prefetch_opener(None)
+    else:
+        prefetch_opener(opener_message(selected_option.split("(")[0].strip()))
     
     # 예시 발명품 안내 섹션
     st.markdown("---")
     with st.expander("💡 창업(발명품)에 어려움을 느끼는 학생이 있나요? 선생님이 생각해 낸 아이디어를 참고해 보세요!", expanded=False):
-        st.markdown("### 📋 선생님의 예시 발명품들")
-        
-        # 예시 1: 환경 개선 관련
-        st.markdown("""
-        #### 🌱 예시 1: 친환경 재사용 물병 스티커 키트
-        
-        **해결하려는 문제:**
-        - 일회용 플라스틱 병 사용이 많아 환경 오염이 심각해요.
-        - 학생들이 물병을 자주 잃어버려서 새로 사야 하는 상황이 반복돼요.
-        
-        **고려한 부분:**
-        - 사용자: 초등학생들이 쉽게 사용할 수 있어야 함
-        - 장소: 학교, 학원 등에서 휴대하기 편해야 함
-        - 재료: 친환경 재료 사용 (재활용 종이, 식물성 접착제)
-        - 시간: 5분 이내로 스티커를 붙일 수 있어야 함
-        
-        **중점으로 생각한 것:**
-        - 환경 보호 의식 함양 (재사용 습관 만들기)
-        - 개성 표현 (나만의 디자인)
-        - 경제적 이점 (물병을 오래 사용)
-        
-        **주의점:**
-        - 스티커가 물에 젖어도 떨어지지 않아야 함
-        - 아이들이 안전하게 사용할 수 있는 재료여야 함
-        - 너무 비싸지 않아야 함 (학생들이 부담 없이 구매 가능)
-        
-        **가격:**
-        - 세트당 3,000원~5,000원 (스티커 10장 + 안내 책자 포함)
-        
-        **교육적 이점:**
-        - 환경 감수성 향상
-        - 책임감 배양 (물건을 소중히 다루는 습관)
-        - 창의성 발휘 (나만의 디자인 만들기)
-        """)
-        
-        st.markdown("---")
-        
-        # 예시 2: 학습 도구 관련
-        st.markdown("""
-        #### 📚 예시 2: 시간 관리 스마트 노트
-        
-        **해결하려는 문제:**
-        - 숙제나 공부 계획을 세워도 자꾸 미루게 돼요.
-        - 시간을 어떻게 쓰는지 스스로 파악하기 어려워요.
-        
-        **고려한 부분:**
-        - 사용자: 초등학생이 스스로 체크할 수 있어야 함
-        - 장소: 집, 학교 어디서나 사용 가능
-        - 재료: 일반 노트보다 조금 두꺼운 종이, 색연필/스티커 포함
-        - 시간: 하루 5분씩 체크하는 습관 형성
-        
-        **중점으로 생각한 것:**
-        - 자기주도 학습 능력 향상
-        - 시간 관리 습관 형성
-        - 성취감 부여 (체크리스트 완성)
-        
-        **주의점:**
-        - 너무 복잡하지 않아야 함 (아이들이 지루해하지 않도록)
-        - 부모님의 지나친 간섭 없이 스스로 할 수 있어야 함
-        - 가격이 너무 비싸면 학생들이 부담스러워함
-        
-        **가격:**
-        - 노트 1권당 4,000원~6,000원 (체크 스티커 30장 포함)
-        
-        **교육적 이점:**
-        - 자기주도 학습 능력 향상
-        - 시간 관리 능력 배양
-        - 목표 설정 및 달성 경험
-        - 책임감 향상
-        """)
-        
-        st.markdown("---")
-        
-        # 예시 3: 건강/안전 관련
-        st.markdown("""
-        #### 🩺 예시 3: 응급 상황 대처 가이드 스티커북
-        
-        **해결하려는 문제:**
-        - 응급 상황에서 어떻게 해야 할지 몰라 당황해요.
-        - 119에 전화할 때 뭐라고 말해야 할지 기억이 안 나요.
-        
-        **고려한 부분:**
-        - 사용자: 초등학생이 쉽게 이해할 수 있어야 함
-        - 장소: 집, 학교, 놀이터 등 어디서나 참고 가능
-        - 재료: 방수 스티커, 그림이 많은 가이드북
-        - 시간: 5분 안에 읽고 이해할 수 있어야 함
-        
-        **중점으로 생각한 것:**
-        - 안전 의식 향상
-        - 응급 상황 대처 능력
-        - 생명을 소중히 여기는 마음
-        
-        **주의점:**
-        - 너무 무서운 내용이면 아이들이 두려워할 수 있음
-        - 실제로 도움이 되는 정확한 정보여야 함
-        - 부모님과 함께 읽을 수 있는 구성
-        
-        **가격:**
-        - 스티커북 1권당 5,000원~7,000원 (가이드북 + 응급 전화 스티커 포함)
-        
-        **교육적 이점:**
-        - 안전 의식 향상
-        - 문제 해결 능력 향상
-        - 책임감 배양
-        - 생명 존중 의식 함양
-        """)
+        # 예시 1~3 (환경 개선 / 학습 도구 / 건강·안전)은 static/example_inventions.md에 있음
+        st.markdown(load_markdown("static/example_inventions.md"))
         
         st.info("💡 위 예시들을 참고해서, 여러분만의 창의적인 아이디어를 생각해보세요!")
     
@@ -544,73 +473,103 @@ if not st.session_state.idea_selected:
         
         if st.button("선택 완료", type="primary", use_container_width=True, disabled=not custom_input):
             if custom_input:
-                user_input = f"저는 {custom_input} 관련 아이디어를 생각해보고 싶어요."
+                user_input = opener_message(custom_input)
                 st.session_state.idea_selected = True
-                st.session_state.messages.append({"role": "user", "content": user_input})
+                add_message("user", user_input)
                 
-                # 즉시 Gemini 응답 생성
-                with st.spinner("선생님이 아이디어를 검토하고 있습니다..."):
-                    time.sleep(1.2)
-                    try:
-                        ai_reply = call_gemini(st.session_state.messages, category)
-                        st.session_state.messages.append({"role": "assistant", "content": ai_reply})
-                    except RuntimeError as e:
-                        st.error(str(e))
-                        st.stop()
+                # 선생님 답변은 대화 화면에서 바로 스트리밍으로 생성
+                st.session_state.awaiting_reply = True
                 st.rerun()
     else:
         if st.button("선택 완료", type="primary", use_container_width=True):
             # 선택지에서 이모지와 설명 제거하고 핵심 키워드만 추출
             clean_option = selected_option.split("(")[0].strip()
-            user_input = f"저는 {clean_option} 관련 아이디어를 생각해보고 싶어요."
+            user_input = opener_message(clean_option)
             st.session_state.idea_selected = True
-            st.session_state.messages.append({"role": "user", "content": user_input})
+            add_message("user", user_input)
             
-            # 즉시 Gemini 응답 생성
-            with st.spinner("선생님이 아이디어를 검토하고 있습니다..."):
-                time.sleep(1.2)
-                try:
-                    ai_reply = call_gemini(st.session_state.messages, category)
-                    st.session_state.messages.append({"role": "assistant", "content": ai_reply})
-                except RuntimeError as e:
-                    st.error(str(e))
-                    st.stop()
-                st.rerun()
+            # 선생님 답변은 대화 화면에서 바로 스트리밍으로 생성
+            st.session_state.awaiting_reply = True
+            st.rerun()
+
+# 질문 fragment가 다시 그리는 말풍선이 이 수를 넘으면 전체 rerun 한 번으로 대화 기록에 합침
+FRAGMENT_TAIL_MESSAGES = 20
+
+
+def render_message(message: dict) -> None:
+    """대화 메시지 하나를 말풍선으로 그립니다."""
+    avatar = "👩‍🏫" if message["role"] == "assistant" else "🧒"
+    with st.chat_message(message["role"], avatar=avatar):
+        st.markdown(message["content"])
+
 
-# 대화 기록 시각화는 선택지가 선택된 후에만
+# 대화 기록 시각화는 선택지가 선택된 후에만 (전체 rerun 때만 그림)
 if st.session_state.idea_selected:
+    trim_window()
+    offset = st.session_state.message_offset
+
+    # 창 앞의 오래된 대화는 저장소에서 누른 만큼만 읽어 그림 (세션 상태에는 남기지 않음)
+    if offset:
+        shown = min(offset, st.session_state.get("older_shown", 0))
+        if shown < offset and st.button(f"⬆️ 이전 대화 더 보기 ({offset - shown}개)", use_container_width=True):
+            shown = min(offset, shown + HISTORY_PAGE_SIZE)
+            st.session_state.older_shown = shown
+        for message in store.page(st.session_state.conversation_id, offset - shown, offset):
+            render_message(message)
+
     for message in st.session_state.messages:
-        if message["role"] != "system":
-            avatar = "👩‍🏫" if message["role"] == "assistant" else "🧒"
-            with st.chat_message(message["role"], avatar=avatar):
-                st.markdown(message["content"])
+        render_message(message)
+
+    # 아이디어 선택 직후: 첫 번째 선생님 답변을 바로 스트리밍
+    if st.session_state.pop("awaiting_reply", False):
+        with st.chat_message("assistant", avatar="👩‍🏫"):
+            try:
+                ai_reply, evaluation = render_teacher_reply(st.session_state.messages, category, offset)
+            except RuntimeError as e:
+                st.error(str(e))
+                st.stop()
+        add_message("assistant", ai_reply, evaluation)
+
+    # 여기까지 그린 메시지 수. 질문 fragment는 이 뒤에 생긴 메시지만 다시 그림
+    st.session_state.rendered_messages = len(st.session_state.messages)
 
 # -------------------------------------------------------------------
 # [TPACK - TK] 실시간 상호작용
 # -------------------------------------------------------------------
-if st.session_state.idea_selected:
+@st.fragment
+def chat_turn() -> None:
+    """
+    채팅 입력과 그 뒤의 대화. 학생이 질문하면 스크립트 전체가 아니라 이 fragment만 다시 실행되어,
+    마지막 전체 rerun 이후에 생긴 말풍선만 다시 그립니다.
+    """
+    messages = st.session_state.messages
+    for message in messages[st.session_state.rendered_messages:]:
+        render_message(message)
+
     if user_input := st.chat_input("아이디어를 구체적으로 설명해주세요 (예: 칠판 지우개 청소 로봇)"):
         
         # 1. 학생 입력 표시
         st.chat_message("user", avatar="🧒").markdown(user_input)
-        st.session_state.messages.append({"role": "user", "content": user_input})
+        add_message("user", user_input)
 
-        # 2. AI 생각 효과 (진지한 검토 느낌)
-        with st.spinner("선생님이 아이디어를 검토하고 있습니다..."):
-            time.sleep(1.2)
+        # 2. AI 생각 효과 (진지한 검토 느낌) + 3. AI 답변을 도착하는 대로 표시
+        with st.chat_message("assistant", avatar="👩‍🏫"):
             try:
-                ai_reply = call_gemini(st.session_state.messages, category)
+                ai_reply, evaluation = render_teacher_reply(messages, category, st.session_state.message_offset)
             except RuntimeError as e:
                 st.error(str(e))
                 st.stop()
-
-        # 3. AI 답변 표시
-        st.chat_message("assistant", avatar="👩‍🏫").markdown(ai_reply)
-        st.session_state.messages.append({"role": "assistant", "content": ai_reply})
+        add_message("assistant", ai_reply, evaluation)
 
         # 4. [보상 시스템] 성취감 부여
-        # 선생님의 칭찬 키워드가 있을 때만 축하 효과
-        positive_keywords = ["훌륭합니다", "정확합니다", "통과", "잘했습니다", "탁월합니다"]
-        if any(keyword in ai_reply for keyword in positive_keywords):
+        # 답변과 함께 온 평가에서 학생이 지적받은 점을 고쳐 통과했다고 판정했을 때만 축하 효과
+        if evaluation and evaluation["verdict"] == "pass":
             st.balloons()
             st.success("🎉 통과! 아주 논리적인 수정이었습니다. 상담 일지를 저장하세요.")
+        elif len(messages) - st.session_state.rendered_messages > FRAGMENT_TAIL_MESSAGES:
+            # fragment가 다시 그릴 말풍선이 많아지면 전체 rerun으로 대화 기록에 합침
+            st.rerun()
+
+
+if st.session_state.idea_selected:
+    chat_turn()
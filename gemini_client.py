@@ -0,0 +1,887 @@
+"""
+창업 멘토링 챗봇의 Gemini API 클라이언트.
+
+Streamlit 화면(gemini_chatbot.py)과 분리해 두어, 매 rerun마다 다시 실행되지 않고
+벤치마크/도구 스크립트에서도 그대로 가져다 쓸 수 있습니다.
+실제 네트워크 요청은 gemini_engine의 공유 비동기 엔진이 처리합니다.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import CancelledError, Future
+
+import streamlit as st
+
+from app_config import get_service_settings
+from evaluation import GENERATION_CONFIG, STRUCTURED_OUTPUT_ENABLED, ReplyStreamParser, evaluation_prompt, parse_reply
+from gemini_engine import GeminiHTTPError, get_engine
+from model_router import MENTORING_ROUTE, OPENER_ROUTE, SUMMARY_ROUTE, Route
+from response_cache import ResponseCache, SharedResponseCache, history_key
+from semantic_cache import Fingerprint, SemanticCache, fingerprint, reusable
+from shared_state import get_shared_backend
+from telemetry import CallTrace
+
+# -------------------------------------------------------------------
+# 모델 및 대화 설정 (환경 변수로 조정, app_config.ReplySettings 참고)
+# -------------------------------------------------------------------
+# 턴 종류별 모델은 model_router의 경로(GEMINI_OPENER_MODELS 등)로 정함. 이 값은 멘토링 대화의 기본 모델
+GEMINI_MODEL = MENTORING_ROUTE.primary
+
+# 대화 기록 압축·컨텍스트 캐시·응답 캐시·의미 캐시·첫 답변 미리 요청 설정
+REPLIES = get_service_settings().replies
+
+
+# -------------------------------------------------------------------
+# [TPACK - CK/PK] 페르소나: 카리스마 있는 5년 차 선생님
+# -------------------------------------------------------------------
+# 탐구 주제 (Streamlit 사이드바와 채팅 API가 같은 목록을 씀). 시스템 프롬프트의 {category}에 들어감
+TOPICS = ("🏫 학교 생활 개선", "🌍 환경 보호", "🤖 미래 기술 활용", "🏠 안전한 우리 집")
+
+# 시스템 프롬프트 템플릿
+system_prompt_template = """
+당신은 친절하지만 카리스마 있는 5년 차 초등학교 선생님입니다.
+현재 수업 주제: {category}
+
+[성격 및 말투]
+1. 말투: 기본적으로 존댓말을 쓰되, 단호하고 명확하게 말합니다. (예: "그 부분은 다시 생각해볼까요?", "좋습니다.")
+2. 태도: 학생을 존중하지만, 만만하게 보이지 않습니다. 다만, 어떤 의견이든 먼저 긍정적인 부분을 찾아주고, 그 다음에 보완점을 설명합니다.
+3. 이모지: 교육적 강조가 필요할 때가 아니면 거의 사용하지 않습니다.
+
+[다양한 의견 수용 방식]
+1. 학생의 아이디어가 비현실적이거나 엉뚱해 보여도 바로 '틀렸다'고 말하지 않습니다.
+2. "그 생각도 의미가 있어요. 다만, 이런 점을 조금 더 생각해보면 좋겠어요."처럼, 먼저 이해와 공감을 표현한 뒤에 수정 방향을 제시합니다.
+3. 학생이 하고 싶은 말의 의도를 최대한 선하게 해석하고, 판단하거나 비난하기보다 '함께 수정해 나가는 파트너'처럼 대화합니다.
+
+[지도 방식 (소크라테스식 문답법 + 예시 제시)]
+1. 정답을 바로 주지 않습니다.
+2. 학생의 아이디어에서 '실현 가능성', '예산(가격)', '안전성', '윤리적 문제' 중 취약해 보이는 부분을 골라, 생각을 더 깊이 하게 만드는 질문을 합니다.
+   (예: "취지는 좋지만, 초등학생이 감당하기엔 제작 비용이 너무 비싸지 않을까요?")
+3. 학생이 지적받은 내용을 구체적으로 수정하면, 그때 비로소 "아주 훌륭합니다. 정확하게 문제를 해결했군요."라고 칭찬해주세요.
+4. 여러 방향의 해결책이 있을 수 있음을 인정하고, "이렇게도 할 수 있고, 저렇게도 할 수 있어요."처럼 다양한 선택지를 제시합니다.
+5. 학생이 많이 막혀 있거나 아이디어를 내기 어려워하면, 먼저 예시 발명품(창업 아이템)을 하나 제시해서 아래 항목을 함께 짚어 봅니다.
+   - 어떤 문제를 해결하려고 만든 발명품인지
+   - **어떤 부분들을 고려했는지** (사용자, 장소, 시간, 필요한 재료 등)
+   - **어떤 것을 중점으로 생각했는지** (편리함, 안전, 환경 보호, 재미 등)
+   - **어떤 주의점이 있는지** (위험 요소, 관리 방법, 규칙 등)
+   - **가격은 어느 정도로 예상하는지** (선택 사항이며, 너무 비싸지 않게 조심해야 한다는 점을 알려줍니다.)
+   - **어떤 교육적 이점이 있는지** (협동심, 책임감, 창의성, 문제 해결 능력 등)
+6. 처음부터 예시를 들 때에도, 예시만 설명하고 끝내지 말고,
+   "지금 선생님 예시처럼, 너도 문제·중점·주의점·가격(선택)·교육적 이점을 차근차근 정리해 볼까요?"라고 말하며 학생이 따라 할 수 있도록 도와줍니다.
+"""
+
+# 구조화된 평가를 켜면 시스템 프롬프트 뒤에 평가 안내를 붙이고 JSON 형식으로 답하게 함 (evaluation 참고)
+if STRUCTURED_OUTPUT_ENABLED:
+    system_prompt_template += evaluation_prompt
+
+# 프롬프트 버전: 템플릿이나 답변 형식을 고치면 바뀌어 예전 프롬프트로 만든 캐시 답변을 쓰지 않게 함
+PROMPT_VERSION = hashlib.sha256(
+    (system_prompt_template + (json.dumps(GENERATION_CONFIG) if STRUCTURED_OUTPUT_ENABLED else "")).encode("utf-8")
+).hexdigest()[:12]
+
+# 시스템 프롬프트 생성 함수 (카테고리별로 한 번만 만들어 재사용)
+@functools.lru_cache(maxsize=None)
+def get_system_prompt(category: str) -> str:
+    """카테고리에 맞는 시스템 프롬프트를 생성합니다."""
+    return system_prompt_template.format(category=category)
+
+
+def to_gemini_role(role: str | None) -> str | None:
+    """Streamlit 메시지 역할을 Gemini 역할로 바꿉니다. system 등은 None (systemInstruction으로 따로 전달)."""
+    if role == "user":
+        return "user"
+    if role == "assistant":
+        return "model"
+    return None
+
+
+def build_gemini_payload(messages: list[dict], category: str) -> dict:
+    """Streamlit용 메시지 리스트 전체를 Gemini 요청 본문(payload)으로 변환합니다."""
+    # Streamlit용 메시지 포맷을 Gemini 포맷으로 변환
+    contents: list[dict] = []
+    for msg in messages:
+        g_role = to_gemini_role(msg.get("role"))
+        if g_role is None:
+            continue
+
+        contents.append(
+            {
+                "role": g_role,
+                "parts": [{"text": msg.get("content", "")}],
+            }
+        )
+
+    # 현재 카테고리에 맞는 시스템 프롬프트 가져오기
+    current_system_prompt = get_system_prompt(category)
+
+    payload = {
+        "contents": contents,
+        "systemInstruction": {
+            "parts": [{"text": current_system_prompt}],
+        },
+    }
+    if STRUCTURED_OUTPUT_ENABLED:
+        payload["generationConfig"] = GENERATION_CONFIG
+    return payload
+
+
+def encode_payload(payload: dict) -> bytes:
+    """
+    요청 본문을 JSON으로 직렬화합니다.
+    한글을 \\uXXXX로 늘리지 않도록 UTF-8 그대로, 공백 없는 구분자로 보냅니다.
+    """
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 대화 기록 압축: 긴 상담에서도 요청 크기를 일정하게 유지
+# -------------------------------------------------------------------
+summary_system_prompt = """
+당신은 초등학교 창업 멘토링 수업의 기록 담당입니다.
+주어지는 선생님과 학생의 대화 일부를 5줄 이내의 한국어로 요약하세요.
+학생의 아이디어, 선생님이 짚은 보완점(실현 가능성·예산·안전성·윤리), 학생이 수정한 내용,
+아직 답하지 않은 질문을 빠짐없이 남기고 인사말이나 감탄사는 생략합니다.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    텍스트의 토큰 수를 대략 추정합니다.
+    한글은 글자당 약 1토큰(UTF-8 3바이트), 영문은 3~4글자당 1토큰이므로 바이트 수 / 3을 씁니다.
+    """
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
+@st.cache_data(show_spinner=False, max_entries=2000)
+def summarize_segment(
+    category: str, segment: tuple[tuple[str, str], ...], _api_key: str, _session: str | None = None
+) -> str:
+    """
+    오래된 대화 묶음 하나를 요약합니다. 같은 묶음은 프로세스 전체에서 한 번만 요약됩니다.
+
+    Args:
+        category: 현재 선택된 카테고리
+        segment: (Gemini 역할, 텍스트) 묶음
+        _api_key: Gemini API 키 (캐시 키에서 제외)
+        _session: 요청 대기열에서 쓰는 세션 구분값 (캐시 키에서 제외)
+    """
+    transcript = "\n".join(
+        f"[{'선생님' if role == 'model' else '학생'}] {content}" for role, content in segment
+    )
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": f"수업 주제: {category}\n\n{transcript}"}]}],
+        "systemInstruction": {"parts": [{"text": summary_system_prompt}]},
+    }
+    path, *fallbacks = SUMMARY_ROUTE.paths("generateContent")
+    data = get_engine().request_json(
+        path, encode_payload(payload), _api_key, _session,
+        call=CallTrace(kind="summary", category=category, route=SUMMARY_ROUTE.name),
+        fallbacks=fallbacks,
+    )
+    try:
+        return data["candidates"][0]["content"]["parts"][0]["text"].strip()
+    except (KeyError, IndexError) as e:
+        raise RuntimeError(f"대화 요약 응답 파싱 중 오류가 발생했습니다: {e}") from e
+
+
+@functools.lru_cache(maxsize=None)
+def system_instruction_fragment(category: str) -> bytes:
+    """카테고리별 systemInstruction JSON 조각. 카테고리마다 한 번만 직렬화합니다."""
+    return encode_payload({"systemInstruction": {"parts": [{"text": get_system_prompt(category)}]}})[1:-1]
+
+
+@functools.lru_cache(maxsize=None)
+def generation_config_fragment() -> bytes:
+    """대화 요청에 붙이는 ',"generationConfig":{…}' 조각 (구조화된 평가를 끄면 빈 바이트). 한 번만 직렬화합니다."""
+    if not STRUCTURED_OUTPUT_ENABLED:
+        return b""
+    return b"," + encode_payload({"generationConfig": GENERATION_CONFIG})[1:-1]
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 추가 전용 대화 객체: 매 턴 새 메시지만 변환
+# -------------------------------------------------------------------
+class GeminiConversation:
+    """
+    Streamlit 메시지 리스트를 Gemini 형식으로 바꾼 결과를 쌓아 두는 추가 전용(append-only) 캐시.
+
+    세션 상태에 하나씩 두고 매 턴 sync()를 부르면 새로 추가된 메시지만 변환·직렬화하므로,
+    대화가 길어져도 턴마다 하는 일은 늘어나지 않습니다. 메시지가 지워지거나 바뀐 경우에는
+    처음부터 다시 변환합니다. 요약을 마친 오래된 turn은 다시 쓸 일이 없으므로 버려서
+    긴 대화에서도 들고 있는 양이 늘지 않게 합니다.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._synced = 0  # 지금까지 변환한 원본 메시지 수 (system 포함, 대화 처음부터)
+        self._last_source: dict | None = None  # 마지막으로 변환한 원본 메시지
+        self.base = 0  # 요약을 마치고 버린 앞쪽 turn 수
+        self.turns: list[tuple[str, str]] = []  # base번째부터의 (Gemini 역할, 텍스트)
+        self.fragments: list[bytes] = []  # turn별로 미리 직렬화한 JSON 조각
+        self.tokens = 0  # 전체 추정 토큰 수 (버린 turn 포함)
+        self.fragment_bytes = 0  # 전체 JSON 조각 크기 (버린 turn 포함)
+        self.summaries: list[str] = []  # 요약을 마친 오래된 대화 묶음들
+
+    def sync(self, messages: list[dict], offset: int = 0) -> None:
+        """
+        원본 메시지 리스트에서 아직 변환하지 않은 메시지만 반영합니다.
+
+        Args:
+            messages: 원본 메시지 리스트. 대화 전체가 아니라 최근 일부(창)여도 됨
+            offset: messages 앞에서 빠진 메시지 수 (messages[0]이 대화 처음부터 몇 번째인지)
+        """
+        last = self._synced - 1 - offset  # 마지막으로 변환한 메시지의 messages 안 위치
+        if (
+            offset + len(messages) < self._synced
+            or self._synced < offset
+            or (last >= 0 and messages[last] is not self._last_source)
+        ):
+            # 세션 초기화 등으로 기록이 바뀐 경우. 창 앞쪽을 모르면 창부터 변환
+            self.reset()
+            self._synced = offset
+        for msg in messages[self._synced - offset:]:
+            g_role = to_gemini_role(msg.get("role"))
+            if g_role is None:
+                continue
+            text = msg.get("content", "")
+            fragment = encode_payload({"role": g_role, "parts": [{"text": text}]})
+            self.turns.append((g_role, text))
+            self.fragments.append(fragment)
+            self.tokens += estimate_tokens(text)
+            self.fragment_bytes += len(fragment)
+        self._synced = offset + len(messages)
+        if messages:
+            self._last_source = messages[-1]
+
+    def compact(self, category: str, api_key: str, session: str | None = None) -> tuple[int, str | None]:
+        """
+        추정 토큰 수가 예산을 넘는 긴 대화라면 최근 메시지만 그대로 남기고,
+        그 이전 대화는 묶음별 요약으로 바꿉니다. 이미 요약한 묶음은 다시 요약하지 않고,
+        요약에 들어간 turn은 버립니다.
+
+        Returns:
+            (요약으로 대체되는 앞쪽 turn 수, 오래된 대화 요약 또는 None)
+        """
+        if REPLIES.history_token_budget <= 0 or self.tokens <= REPLIES.history_token_budget:
+            return 0, None
+
+        # 묶음 경계를 대화 처음부터 고정해 두어야 같은 묶음이 계속 재사용됨
+        cut = self.base + len(self.turns) - REPLIES.history_keep_recent
+        cut -= cut % REPLIES.history_summary_segment
+
+        try:
+            while len(self.summaries) * REPLIES.history_summary_segment < cut:
+                start = len(self.summaries) * REPLIES.history_summary_segment - self.base
+                segment = tuple(self.turns[start:start + REPLIES.history_summary_segment])
+                self.summaries.append(summarize_segment(category, segment, api_key, session))
+        except RuntimeError:
+            # 요약에 실패하면 이번 턴은 아직 버리지 않은 기록을 그대로 보냄
+            cut = self.base
+        if cut <= 0:
+            return 0, None
+        # 요약에 들어간 turn은 다시 보낼 일이 없으므로 버림
+        del self.turns[:cut - self.base]
+        del self.fragments[:cut - self.base]
+        self.base = cut
+        return cut, "\n".join(self.summaries[:cut // REPLIES.history_summary_segment])
+
+    def build_body(
+        self,
+        category: str,
+        cut: int = 0,
+        summary: str | None = None,
+        cached_content: str | None = None,
+    ) -> bytes:
+        """
+        미리 직렬화해 둔 조각을 이어 붙여 요청 본문(JSON 바이트)을 만듭니다.
+        cached_content가 있으면 시스템 프롬프트 대신 컨텍스트 캐시 이름을 보냅니다.
+        """
+        skip = max(0, cut - self.base)
+        fragments = self.fragments[skip:]
+        if summary and fragments:
+            # 요약은 남는 첫 메시지 앞부분에 넣어 user/model 순서를 그대로 유지
+            role, text = self.turns[skip]
+            fragments[0] = encode_payload(
+                {
+                    "role": role,
+                    "parts": [
+                        {"text": f"[지금까지의 상담 요약]\n{summary}\n[이어지는 대화]"},
+                        {"text": text},
+                    ],
+                }
+            )
+        if cached_content:
+            system_fragment = b'"cachedContent":' + encode_payload(cached_content)
+        else:
+            system_fragment = system_instruction_fragment(category)
+        return (
+            b'{"contents":[' + b",".join(fragments) + b"]," + system_fragment + generation_config_fragment() + b"}"
+        )
+
+    def full_body_size(self, category: str) -> int:
+        """압축하지 않았을 때의 요청 본문 크기(바이트)."""
+        commas = max(0, self.base + len(self.fragments) - 1)
+        return len(b'{"contents":[],}') + self.fragment_bytes + commas + len(
+            system_instruction_fragment(category)
+        ) + len(generation_config_fragment())
+
+
+def prepare_payload(
+    messages: list[dict],
+    category: str,
+    api_key: str,
+    stats: dict | None = None,
+    conversation: GeminiConversation | None = None,
+    cached_content: str | None = None,
+    session: str | None = None,
+    offset: int = 0,
+) -> bytes:
+    """
+    대화 기록을 (필요하면 압축해서) 요청 본문으로 만듭니다.
+
+    Args:
+        conversation: 세션별 GeminiConversation. 없으면 이번 요청만을 위해 새로 변환
+        stats: 넘기면 압축 전/후 요청 크기(바이트)와 요약된 메시지 수를 기록
+        cached_content: 시스템 프롬프트 대신 참조할 컨텍스트 캐시 이름
+        session: 요약 요청을 세울 요청 대기열의 세션 구분값
+        offset: messages가 최근 메시지 창일 때 앞에서 빠진 메시지 수 (GeminiConversation.sync 참고)
+    """
+    if conversation is None:
+        conversation = GeminiConversation()
+    conversation.sync(messages, offset)
+    cut, summary = conversation.compact(category, api_key, session)
+    body = conversation.build_body(category, cut, summary, cached_content)
+    if stats is not None:
+        stats["payload_bytes"] = len(body)
+        stats["payload_bytes_full"] = conversation.full_body_size(category)
+        stats["summarized_messages"] = cut
+        stats["context_cache"] = cached_content
+    return body
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 컨텍스트 캐시: 카테고리별 시스템 프롬프트를 Gemini 쪽에 캐시
+# -------------------------------------------------------------------
+class ContextCacheRegistry:
+    """
+    (모델, API 키, 시스템 프롬프트) 해시별로 Gemini cachedContents 리소스를 관리합니다.
+
+    만료가 가까워지면 TTL을 연장하고, 연장에 실패하면 새로 만듭니다. 캐시를 만들 수 없으면
+    (프롬프트가 최소 토큰 수보다 짧거나, 키에 권한이 없는 등) 잠시 시도를 멈추고 None을 돌려주어
+    호출한 쪽이 시스템 프롬프트를 그대로 보내게 합니다.
+    """
+
+    # 만료까지 이 시간(초)보다 적게 남으면 미리 갱신
+    refresh_margin = 60
+    # 만들기에 실패한 뒤 다시 시도하기까지 기다리는 시간(초)
+    failure_cooldown = 300
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[str, float, float]] = {}  # 키 -> (캐시 이름, 만료 시각, 생성 시각)
+        self._failed_until: dict[str, float] = {}
+        self._key_locks: dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def cache_key(category: str, api_key: str, model: str) -> str:
+        prompt = get_system_prompt(category)
+        return hashlib.sha256(f"{model}\0{api_key}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, category: str, api_key: str, model: str = GEMINI_MODEL) -> str | None:
+        """
+        사용할 수 있는 캐시 이름을 돌려주고, 없거나 만료가 가까우면 만들거나 연장합니다.
+        컨텍스트 캐시는 만든 모델에서만 쓸 수 있으므로 모델마다 따로 둡니다.
+        """
+        key = self.cache_key(category, api_key, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - time.time() > self.refresh_margin:
+                return entry[0]
+            if self._failed_until.get(key, 0) > time.time():
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 같은 프롬프트의 캐시를 여러 세션이 동시에 만들지 않도록 키별로 한 번만 진행
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[1] - time.time() > self.refresh_margin:
+                    return entry[0]
+            name = None
+            if entry:
+                name = self._extend(entry[0], api_key)
+            if name is None:
+                name = self._create(category, api_key, model)
+            with self._lock:
+                if name is None:
+                    self._entries.pop(key, None)
+                    self._failed_until[key] = time.time() + self.failure_cooldown
+                else:
+                    created = entry[2] if entry and entry[0] == name else time.time()
+                    self._entries[key] = (name, time.time() + REPLIES.context_cache_ttl_seconds, created)
+            return name
+
+    def invalidate(self, category: str, api_key: str, model: str = GEMINI_MODEL) -> None:
+        """
+        요청에서 거부된(만료·삭제된) 캐시를 잊어서 다음 요청에 다시 만들게 합니다.
+        만든 지 얼마 안 된 캐시가 거부되었다면 일시적인 문제가 아니므로 잠시 시도를 멈춥니다.
+        """
+        key = self.cache_key(category, api_key, model)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry and time.time() - entry[2] < self.failure_cooldown:
+                self._failed_until[key] = time.time() + self.failure_cooldown
+
+    def _create(self, category: str, api_key: str, model: str) -> str | None:
+        body = encode_payload(
+            {
+                "model": f"models/{model}",
+                "systemInstruction": {"parts": [{"text": get_system_prompt(category)}]},
+                "ttl": f"{REPLIES.context_cache_ttl_seconds}s",
+            }
+        )
+        engine = get_engine()
+        try:
+            return engine.run(engine.call_json("POST", "cachedContents", api_key, body))["name"]
+        except (RuntimeError, KeyError):
+            return None
+
+    def _extend(self, name: str, api_key: str) -> str | None:
+        body = encode_payload({"ttl": f"{REPLIES.context_cache_ttl_seconds}s"})
+        engine = get_engine()
+        try:
+            engine.run(engine.call_json("PATCH", name, api_key, body, params={"updateMask": "ttl"}))
+            return name
+        except RuntimeError:
+            return None
+
+
+@st.cache_resource
+def get_context_cache() -> ContextCacheRegistry:
+    """프로세스 전체에서 공유하는 컨텍스트 캐시 목록을 반환합니다."""
+    return ContextCacheRegistry()
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 응답 캐시: 아이디어 선택 직후 첫 답변 재사용
+# -------------------------------------------------------------------
+@st.cache_resource
+def get_response_cache() -> ResponseCache | SharedResponseCache:
+    """
+    프로세스 전체에서 공유하는 응답 캐시를 반환합니다.
+    공유 저장소(SHARED_BACKEND_URL)를 설정했으면 모든 복제본이 함께 쓰는 캐시를 씁니다.
+    """
+    backend = get_shared_backend()
+    if backend is not None:
+        return SharedResponseCache(backend, REPLIES.response_cache_ttl_seconds, REPLIES.response_cache_variants)
+    return ResponseCache(
+        REPLIES.response_cache_ttl_seconds,
+        REPLIES.response_cache_max_entries,
+        REPLIES.response_cache_variants,
+        REPLIES.response_cache_path or None,
+    )
+
+
+def opener_key(messages: list[dict], category: str, offset: int = 0) -> str | None:
+    """첫 턴(학생 메시지 하나뿐인 대화)이면 응답 캐시/미리 요청에 쓰는 키를, 아니면 None을 돌려줍니다."""
+    history = [m for m in messages if m.get("role") != "system"]
+    if offset or len(history) != 1 or history[0].get("role") != "user":
+        return None
+    return history_key(messages, category, OPENER_ROUTE.primary, PROMPT_VERSION)
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 의미 캐시: 여러 학생의 비슷한 후속 질문에 답변 재사용
+# -------------------------------------------------------------------
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """프로세스 전체에서 공유하는 의미 캐시를 반환합니다."""
+    return SemanticCache(
+        REPLIES.semantic_cache_threshold, REPLIES.semantic_cache_max_entries, REPLIES.semantic_cache_ttl_seconds
+    )
+
+
+def semantic_probe(messages: list[dict], category: str, offset: int = 0) -> tuple[tuple, Fingerprint] | None:
+    """
+    의미 캐시를 쓸 수 있는 턴이면 (칸, 지문)을, 아니면 None을 돌려줍니다.
+    첫 턴은 응답 캐시가 맡고, 창 앞부분이 잘린 긴 대화(offset)는 그 학생만의 내용이 많아 쓰지 않습니다.
+    """
+    if not REPLIES.semantic_cache or offset:
+        return None
+    probe = fingerprint(messages, REPLIES.semantic_cache_max_stage)
+    if probe is None:
+        return None
+    return (MENTORING_ROUTE.primary, PROMPT_VERSION, category, probe.stage), probe
+
+
+def reuse_similar(probe: tuple[tuple, Fingerprint] | None, stats: dict | None) -> str | None:
+    """비슷한 질문에 대한 예전 답변(모델 출력). 없으면 None. stats에는 적중 여부("semantic_cache")를 남깁니다."""
+    if probe is None:
+        return None
+    found = get_semantic_cache().lookup(*probe)
+    if stats is not None:
+        stats["semantic_cache"] = "hit" if found is not None else "miss"
+    return found[0] if found is not None else None
+
+
+def remember_similar(probe: tuple[tuple, Fingerprint] | None, text: str, latency: float) -> None:
+    """끝까지 받은 답변을 의미 캐시에 보탭니다. (통과 판정이 난 답변은 넣지 않음)"""
+    if probe is None:
+        return
+    reply, evaluation = parse_reply(text)
+    if reusable(evaluation):
+        get_semantic_cache().put(*probe, text, reply, latency)
+
+
+# -------------------------------------------------------------------
+# [TPACK - TK] 첫 답변 미리 요청: 학생이 선택지를 고르는 동안 백그라운드에서 준비
+# -------------------------------------------------------------------
+class Speculation:
+    """선택지 하나에 대해 미리 보내 둔 첫 답변 요청."""
+
+    def __init__(self, key: str, future: Future) -> None:
+        self.key = key
+        self.future = future
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        future.add_done_callback(self._done)
+
+    def _done(self, _: Future) -> None:
+        self.finished = time.perf_counter()
+
+    def text(self) -> str:
+        """끝날 때까지 기다려 답변 텍스트를 돌려줍니다."""
+        data = self.future.result()
+        try:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError) as e:
+            raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+
+
+class OpenerPrefetcher:
+    """
+    학생이 라디오 선택지를 바꿀 때마다 그 선택지의 첫 답변을 미리 요청해 두고,
+    '선택 완료'를 누르면 이미 받았거나 받는 중인 답변을 씁니다.
+
+    선택을 바꾸면 이전 요청은 취소하고(이미 끝났다면 응답 캐시에 보탬), 세션마다 미리 보내는
+    요청 수를 SPECULATION_MAX_PER_SESSION개로 제한합니다. 응답 캐시에 이미 답변이 있거나
+    엔진 대기열에 기다리는 요청이 있으면 미리 보내지 않습니다.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "used": 0, "cancelled": 0, "unused": 0, "failed": 0, "saved_seconds": 0.0}
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def switch(
+        self,
+        current: Speculation | None,
+        messages: list[dict] | None,
+        category: str,
+        api_key: str,
+        session: str | None = None,
+        spent: int = 0,
+    ) -> Speculation | None:
+        """
+        지금 고른 선택지의 미리 요청을 돌려줍니다. 선택이 그대로면 current를 그대로,
+        바뀌었으면 current를 버리고 새로 보냅니다. (보내지 않기로 했으면 None)
+
+        Args:
+            current: 이 세션에서 진행 중인 미리 요청
+            messages: 선택지를 고르면 보낼 대화 (None이면 진행 중인 요청만 버림)
+            spent: 이 세션에서 이미 미리 보낸 요청 수
+        """
+        key = opener_key(messages, category) if messages else None
+        if current is not None:
+            if current.key == key:
+                return current
+            self.discard(current)
+        if key is None or not REPLIES.speculation or spent >= REPLIES.speculation_max_per_session:
+            return None
+        if REPLIES.response_cache and get_response_cache().ready(key):
+            return None
+        engine = get_engine()
+        if engine.stats()["waiting"]:
+            # 이미 질문이 몰려 있으면 실제 질문의 차례를 빼앗지 않음
+            return None
+        body = prepare_payload(messages, category, api_key, session=session)
+        path, *fallbacks = OPENER_ROUTE.paths("generateContent")
+        future = engine.submit_json(
+            path, body, api_key, session, CallTrace(kind="prefetch", category=category, route=OPENER_ROUTE.name),
+            fallbacks,
+        )
+        self._count("started")
+        return Speculation(key, future)
+
+    def discard(self, speculation: Speculation) -> None:
+        """쓰지 않을 미리 요청을 정리합니다. 진행 중이면 취소하고, 끝났으면 답변을 응답 캐시에 보탭니다."""
+        if speculation.future.cancel():
+            self._count("cancelled")
+            return
+        self._count("unused")
+        self._store(speculation)
+
+    def claim(self, speculation: Speculation, key: str) -> str | None:
+        """
+        학생이 확정한 첫 턴(key)이 미리 요청한 것과 같으면 그 답변을(진행 중이면 끝날 때까지 기다려) 돌려줍니다.
+        다르거나 실패했으면 None을 돌려주어 평소처럼 요청하게 합니다.
+        """
+        if speculation.key != key:
+            self.discard(speculation)
+            return None
+        claimed_at = time.perf_counter()
+        try:
+            text = speculation.text()
+        except (RuntimeError, CancelledError):
+            self._count("failed")
+            return None
+        # 학생이 확정하기 전에 이미 흘러간 요청 시간만큼 기다림을 줄임
+        self._count("used")
+        self._count("saved_seconds", min(speculation.finished or claimed_at, claimed_at) - speculation.started)
+        self._store(speculation)
+        return text
+
+    @staticmethod
+    def _store(speculation: Speculation) -> None:
+        if not REPLIES.response_cache:
+            return
+        try:
+            text = speculation.text()
+        except (RuntimeError, CancelledError):
+            return
+        get_response_cache().put(speculation.key, text, (speculation.finished or speculation.started) - speculation.started)
+
+    def stats(self) -> dict:
+        """보낸/쓴/취소한/쓰지 않은/실패한 미리 요청 수, 적중률(쓴 수 / 보낸 수), 아낀 대기 시간(초)."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["used"] / stats["started"] if stats["started"] else 0.0
+        return stats
+
+
+@st.cache_resource
+def get_prefetcher() -> OpenerPrefetcher:
+    """프로세스 전체에서 공유하는 첫 답변 미리 요청 관리자를 반환합니다."""
+    return OpenerPrefetcher()
+
+
+def reuse_opener(key: str | None, stats: dict | None, speculation: Speculation | None) -> str | None:
+    """
+    첫 턴이면 응답 캐시나 미리 보낸 요청에서 답변을 찾습니다. 없으면 None.
+    stats에는 응답 캐시("response_cache")와 미리 요청("speculation")의 적중 여부를 남깁니다.
+    """
+    if key is not None and REPLIES.response_cache:
+        cached = get_response_cache().get(key)
+        if stats is not None:
+            stats["response_cache"] = "hit" if cached is not None else "miss"
+        if cached is not None:
+            if speculation is not None:
+                get_prefetcher().discard(speculation)
+            return cached
+    if speculation is None:
+        return None
+    if key is None:
+        get_prefetcher().discard(speculation)
+        return None
+    text = get_prefetcher().claim(speculation, key)
+    if stats is not None:
+        stats["speculation"] = "hit" if text is not None else "miss"
+    return text
+
+
+def send_conversation(
+    method: str,
+    messages: list[dict],
+    category: str,
+    api_key: str,
+    stats: dict | None = None,
+    conversation: GeminiConversation | None = None,
+    stream: bool = False,
+    session: str | None = None,
+    on_queue: Callable[[int | None], None] | None = None,
+    offset: int = 0,
+) -> dict | Iterator[dict]:
+    """
+    대화 요청을 엔진으로 보내고 JSON 응답(stream=True이면 SSE 이벤트 이터레이터)을 돌려줍니다.
+    컨텍스트 캐시를 켰다면 캐시 이름으로 시스템 프롬프트를 대신하고,
+    캐시가 만료·삭제되어 거부되면 시스템 프롬프트를 그대로 넣어 한 번 더 보냅니다.
+    요청은 session별 공정 대기열에 서고, 기다리는 동안 on_queue(앞에 남은 요청 수)가 불립니다.
+    보낸 요청마다 호출 시간과 토큰 수가 엔진의 계측기(telemetry)에 기록됩니다.
+
+    첫 턴은 OPENER_ROUTE, 그 뒤 멘토링 대화는 MENTORING_ROUTE의 모델로 보내고, 기본 모델이 과부하이면
+    다음 모델로 넘어갑니다. 컨텍스트 캐시는 만든 모델에서만 쓸 수 있으므로 캐시를 쓰는 요청은 기본 모델에 묶습니다.
+    stats에는 경로 이름("route"), 응답한 모델("model"), 다른 모델로 넘어간 횟수("failovers"),
+    헤지 요청 결과("hedge")를 남깁니다.
+    """
+    engine = get_engine()
+    route = OPENER_ROUTE if opener_key(messages, category, offset) else MENTORING_ROUTE
+
+    def send(body: bytes, route: Route) -> dict | Iterator[dict]:
+        request = engine.stream_events if stream else engine.request_json
+        path, *fallbacks = route.paths(method)
+        call = CallTrace(kind="stream" if stream else "generate", category=category, route=route.name)
+        result = request(path, body, api_key, session, on_queue, call, fallbacks)
+        # 응답 헤더를 받은 뒤라 어느 모델이 답했는지 정해져 있음
+        if stats is not None:
+            stats.update(route=route.name, model=call.model, failovers=call.failovers, hedge=call.hedge)
+        return result
+
+    cached_content = (
+        get_context_cache().lookup(category, api_key, route.primary) if REPLIES.context_cache else None
+    )
+    body = prepare_payload(messages, category, api_key, stats, conversation, cached_content, session, offset)
+    try:
+        return send(body, route.pinned() if cached_content else route)
+    except GeminiHTTPError as e:
+        if not cached_content or e.status_code not in (400, 403, 404):
+            raise
+    get_context_cache().invalidate(category, api_key, route.primary)
+    body = prepare_payload(messages, category, api_key, stats, conversation, session=session, offset=offset)
+    return send(body, route)
+
+
+def call_gemini(
+    messages: list[dict],
+    category: str,
+    api_key: str,
+    stats: dict | None = None,
+    conversation: GeminiConversation | None = None,
+    session: str | None = None,
+    on_queue: Callable[[int | None], None] | None = None,
+    speculation: Speculation | None = None,
+    offset: int = 0,
+    evaluation: dict | None = None,
+) -> str:
+    """
+    현재 대화 내용을 바탕으로 Gemini 2.5 Flash에 요청을 보내고,
+    선생님 AI의 응답 텍스트를 반환합니다. 첫 턴이면 응답 캐시나 미리 보낸 요청의 답변을 먼저 쓰고,
+    의미 캐시를 켰으면 다른 학생의 비슷한 후속 질문에 대한 답변도 재사용합니다.
+
+    Args:
+        messages: 대화 메시지 리스트
+        category: 현재 선택된 카테고리
+        api_key: Gemini API 키
+        stats: 넘기면 요청 크기 통계와 응답 캐시 적중 여부("hit"/"miss")를 채워 줌 (prepare_payload 참고)
+        conversation: 세션별 GeminiConversation (새 메시지만 변환하도록)
+        session: 요청 대기열에서 쓰는 세션 구분값 (학생마다 공평하게 차례를 나눔)
+        on_queue: 대기 순서가 바뀔 때마다 부를 함수 (앞에 남은 요청 수, 차례가 오면 None)
+        speculation: 이 세션에서 첫 답변을 미리 보내 둔 요청 (OpenerPrefetcher.switch 참고)
+        offset: messages가 최근 메시지 창일 때 앞에서 빠진 메시지 수 (대화 저장소에 나머지가 있음)
+        evaluation: 넘기면 답변과 함께 온 평가(루브릭, evaluation.normalize_evaluation 참고)를 채워 줌.
+            모델이 보통 글로 답했거나 의미 캐시에서 다른 학생의 답변을 재사용했으면 비어 있음
+    """
+    cache_key = opener_key(messages, category, offset)
+    reused = reuse_opener(cache_key, stats, speculation)
+    if reused is not None:
+        # 응답 캐시와 미리 요청에는 모델 출력(JSON)을 그대로 두므로 평가도 함께 나옴
+        return _unpack_reply(reused, evaluation)
+    probe = semantic_probe(messages, category, offset)
+    reused = reuse_similar(probe, stats)
+    if reused is not None:
+        # 다른 학생의 답변이므로 답변 글만 씀 (평가는 그 학생의 아이디어를 채점한 것이라 이 학생에게 남기지 않음)
+        return _unpack_reply(reused, None)
+
+    started = time.perf_counter()
+    data = send_conversation(
+        "generateContent", messages, category, api_key, stats, conversation,
+        session=session, on_queue=on_queue, offset=offset,
+    )
+    try:
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError) as e:
+        raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+    if cache_key is not None and REPLIES.response_cache:
+        get_response_cache().put(cache_key, text, time.perf_counter() - started)
+    remember_similar(probe, text, time.perf_counter() - started)
+    return _unpack_reply(text, evaluation)
+
+
+def _unpack_reply(text: str, evaluation: dict | None) -> str:
+    """모델 출력에서 답변을 꺼내고, evaluation을 넘겼으면 평가를 채웁니다."""
+    reply, parsed = parse_reply(text)
+    if evaluation is not None and parsed is not None:
+        evaluation.update(parsed)
+    return reply
+
+
+def stream_gemini(
+    messages: list[dict],
+    category: str,
+    api_key: str,
+    stats: dict | None = None,
+    conversation: GeminiConversation | None = None,
+    session: str | None = None,
+    on_queue: Callable[[int | None], None] | None = None,
+    speculation: Speculation | None = None,
+    offset: int = 0,
+    evaluation: dict | None = None,
+) -> Iterator[str]:
+    """
+    streamGenerateContent(SSE)로 요청을 보내고, 선생님 AI의 응답을
+    도착하는 대로 텍스트 청크 단위로 내보내는 제너레이터입니다.
+    첫 턴이면 응답 캐시나 미리 보낸 요청의 답변을, 의미 캐시에 비슷한 질문이 있으면 그 답변을 한 번에 내보냅니다.
+
+    Args:
+        messages: 대화 메시지 리스트
+        category: 현재 선택된 카테고리
+        api_key: Gemini API 키
+        stats: 넘기면 요청 크기 통계와 응답 캐시 적중 여부("hit"/"miss")를 채워 줌 (prepare_payload 참고)
+        conversation: 세션별 GeminiConversation (새 메시지만 변환하도록)
+        session: 요청 대기열에서 쓰는 세션 구분값 (학생마다 공평하게 차례를 나눔)
+        on_queue: 대기 순서가 바뀔 때마다 부를 함수 (앞에 남은 요청 수, 차례가 오면 None)
+        speculation: 이 세션에서 첫 답변을 미리 보내 둔 요청 (OpenerPrefetcher.switch 참고)
+        offset: messages가 최근 메시지 창일 때 앞에서 빠진 메시지 수 (대화 저장소에 나머지가 있음)
+        evaluation: 넘기면 답변을 끝까지 내보낸 뒤 함께 온 평가를 채워 줌 (call_gemini 참고)
+
+    JSON 형식 답변은 "reply" 문자열만 풀어서 내보내므로 받는 쪽은 보통 글처럼 이어 붙이면 됩니다.
+    """
+    cache_key = opener_key(messages, category, offset)
+    reused = reuse_opener(cache_key, stats, speculation)
+    if reused is not None:
+        yield _unpack_reply(reused, evaluation)
+        return
+    probe = semantic_probe(messages, category, offset)
+    reused = reuse_similar(probe, stats)
+    if reused is not None:
+        # 답변 글만 재사용하고 평가는 비워 둠 (call_gemini 참고)
+        yield _unpack_reply(reused, None)
+        return
+
+    started = time.perf_counter()
+    chunks: list[str] = []
+    parser = ReplyStreamParser()
+    streamed = False
+    events = send_conversation(
+        "streamGenerateContent", messages, category, api_key, stats, conversation,
+        stream=True, session=session, on_queue=on_queue, offset=offset,
+    )
+    for data in events:
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError):
+            # 마지막 청크 등 텍스트 없이 메타데이터만 오는 경우
+            continue
+        for part in parts:
+            if part.get("text"):
+                chunks.append(part["text"])
+                text = parser.feed(part["text"])
+                if text:
+                    streamed = True
+                    yield text
+    reply, parsed = parser.finish()
+    if not streamed and reply:
+        # reply를 찾지 못한 JSON이면 받은 글 전체라도 보여 줌
+        yield reply
+    if evaluation is not None and parsed is not None:
+        evaluation.update(parsed)
+    # 끝까지 받은 답변만 캐시에 보탬
+    if cache_key is not None and REPLIES.response_cache:
+        get_response_cache().put(cache_key, "".join(chunks), time.perf_counter() - started)
+    remember_similar(probe, "".join(chunks), time.perf_counter() - started)
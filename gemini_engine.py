@@ -0,0 +1,595 @@
+"""
+창업 멘토링 챗봇의 Gemini API 비동기 요청 엔진.
+
+프로세스에 하나뿐인 백그라운드 asyncio 이벤트 루프에서 httpx.AsyncClient로 요청을 보내고,
+Streamlit 스크립트 스레드에는 결과만 돌려줍니다. 연결 관리와 재시도 대기는 모두 루프 안에서
+이루어지고, 프로세스 전체의 동시 요청 수와 분당 요청 수는 세션별 공정 대기열(scheduler.py)로 제한됩니다.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterator, Sequence
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+import streamlit as st
+
+from app_config import EngineSettings, get_service_settings
+from model_router import LatencyTracker, model_of
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy, parse_retry_after
+from scheduler import FairScheduler, QueueTicket, SharedTokenBucket, TokenBucket
+from shared_state import get_shared_backend
+from telemetry import CallTrace, create_telemetry, key_label
+
+if TYPE_CHECKING:
+    import httpx
+
+# -------------------------------------------------------------------
+# 연결·재시도·분당 제한 설정은 app_config.EngineSettings (GEMINI_TIMEOUT, GEMINI_RATE_LIMIT_RPM 등)
+# -------------------------------------------------------------------
+# 대기 중인 스크립트 스레드가 대기 순서를 다시 확인하는 간격(초)
+QUEUE_POLL_SECONDS = 0.25
+
+# 상태 코드별로 학생 화면에 보여 줄 안내
+STATUS_MESSAGES = {
+    401: "Gemini API 인증 오류입니다. GOOGLE_API_KEY 값을 다시 확인해 주세요.",
+    403: "Gemini API 인증 오류입니다. GOOGLE_API_KEY 값을 다시 확인해 주세요.",
+    429: "지금 질문이 너무 많이 몰렸어요. 잠시 후 다시 시도해주세요. (429 Too Many Requests)",
+    503: "Gemini API 서버가 일시적으로 사용할 수 없습니다. 잠시 후 다시 시도해주세요. (503 Service Unavailable)",
+}
+
+
+class GeminiHTTPError(RuntimeError):
+    """Gemini API가 오류 상태 코드로 응답했을 때 발생합니다. 화면에서는 RuntimeError처럼 메시지만 보여 줍니다."""
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ConnectionTrace:
+    """httpx trace 확장으로 요청 하나가 새 연결을 맺었는지, 연결(TCP+TLS)과 응답 헤더에 걸린 시각을 기록합니다."""
+
+    def __init__(self) -> None:
+        self.new_connection = False
+        self.connect_started = 0.0
+        self.connect_finished = 0.0
+        self.headers_at: float | None = None
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+            self.connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            self.connect_finished = time.perf_counter()
+        elif event_name.endswith("receive_response_headers.complete"):
+            self.headers_at = time.perf_counter()
+
+    @property
+    def connect_seconds(self) -> float:
+        """새 연결을 맺는 데 걸린 시간(초). 연결을 재사용했으면 0."""
+        return max(0.0, self.connect_finished - self.connect_started) if self.new_connection else 0.0
+
+
+# 스트리밍 요청이 시작(응답 헤더 수신)되었음을 알리는 표시 / 끝났음을 알리는 표시
+_STREAM_STARTED = object()
+_STREAM_DONE = object()
+
+
+class GeminiEngine:
+    """
+    백그라운드 이벤트 루프 하나와 그 위의 httpx.AsyncClient를 소유하는 요청 엔진.
+
+    스크립트 스레드는 request_json()/stream_events()처럼 동기 함수로 부르고,
+    실제 네트워크 I/O와 재시도 대기는 루프에서 코루틴으로 처리됩니다.
+    """
+
+    def __init__(self) -> None:
+        self.config = config = get_service_settings().engine
+        self._hedge_enabled = get_service_settings().routing.hedge_enabled
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="gemini-engine", daemon=True
+        )
+        self._thread.start()
+        self.client: "httpx.AsyncClient" = self.run(self._make_client(config))
+        # 동시 요청 수/분당 요청 수 제한과 세션별 공정 대기열 (루프 스레드에서만 사용)
+        backend = get_shared_backend()
+        if backend is not None and config.rate_limit_rpm > 0:
+            bucket = SharedTokenBucket(backend, "rate:gemini", config.rate_limit_rpm, config.rate_limit_burst)
+        else:
+            bucket = TokenBucket(config.rate_limit_rpm, config.rate_limit_burst)
+        self.scheduler = FairScheduler(config.max_concurrent_requests, bucket)
+        # 재시도/서킷 브레이커는 모든 세션이 함께 씀 (루프 스레드에서만 사용)
+        self.retry_policy = RetryPolicy(config.retry_max_attempts, config.retry_base_delay, config.retry_max_delay)
+        self.retry_budget = RetryBudget(config.retry_budget_ratio)
+        self.breaker = CircuitBreaker(config.breaker_failure_threshold, config.breaker_reset_seconds)
+        # 모델별 응답 지연 (헤지 기준, 루프 스레드에서만 사용)
+        self.latency = LatencyTracker()
+        # 호출별 시간·시도·토큰 기록 (관리자 페이지, /metrics, JSONL 추적)
+        self.telemetry = create_telemetry()
+        # 통계는 루프 스레드에서만 갱신
+        self._stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "retries": 0,
+            "retry_budget_exhausted": 0,
+            "circuit_rejections": 0,
+            "failovers": 0,
+            "hedges": 0,
+            "hedges_won": 0,
+        }
+        # API 키 이름(key_label) → 지금 진행 중인(대기열 포함) 호출 수. 키 관리자가 덜 바쁜 키를 고를 때 읽음
+        self._key_load: dict[str, int] = {}
+
+    @staticmethod
+    async def _make_client(config: EngineSettings) -> "httpx.AsyncClient":
+        # httpx는 엔진을 처음 만들 때 가져옴: 엔진 없이 그리는 화면(시작 화면 윗부분, 선생님 대시보드)은 불러오지 않음
+        import httpx
+
+        limits = httpx.Limits(
+            max_connections=config.pool_max_connections,
+            max_keepalive_connections=config.pool_max_keepalive,
+            keepalive_expiry=config.pool_keepalive_seconds,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(config.timeout, connect=10),
+            headers={"Content-Type": "application/json"},
+        )
+
+    # ---------------------------------------------------------------
+    # 스크립트 스레드 → 루프
+    # ---------------------------------------------------------------
+    def submit(self, coro: Coroutine) -> Future:
+        """코루틴을 엔진 루프에 올리고 결과를 기다릴 수 있는 Future를 돌려줍니다."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine) -> Any:
+        """코루틴을 엔진 루프에서 실행하고 끝날 때까지 기다립니다."""
+        return self.submit(coro).result()
+
+    def stats(self) -> dict:
+        """
+        요청 수, 새 연결 수, 연결 재사용률, 재시도 수, 예산 부족으로 포기한 재시도 수,
+        다른 모델로 넘어간 수, 헤지 요청을 보낸/이긴 수,
+        서킷 브레이커 상태와 거절 수, 대기열 통계(FairScheduler.stats 참고).
+        """
+        stats = dict(self._stats)
+        stats.update(self.scheduler.stats())
+        stats["circuit_state"] = self.breaker.state
+        stats["circuit_opens"] = self.breaker.opens
+        stats["reused"] = stats["requests"] - stats["new_connections"]
+        stats["reuse_rate"] = stats["reused"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def key_load(self, label: str) -> int:
+        """이 키(key_label 이름)로 지금 진행 중인 호출 수 (대기열에서 기다리는 호출 포함)."""
+        return self._key_load.get(label, 0)
+
+    # ---------------------------------------------------------------
+    # 루프 안에서 쓰는 코루틴
+    # ---------------------------------------------------------------
+    @asynccontextmanager
+    async def _slot(self, ticket: QueueTicket | None = None, call: CallTrace | None = None) -> AsyncIterator[None]:
+        """
+        동시 요청 수/분당 요청 수 제한. 세션별 공정 대기열에서 차례가 올 때까지 루프 안에서 기다립니다.
+        call을 넘기면 기다린 시간을 기록하고, 차례가 온 시각부터 호출 시간을 잽니다.
+        """
+        enqueued = time.perf_counter()
+        await self.scheduler.acquire(ticket or QueueTicket())
+        if call is not None:
+            call.queue_wait = time.perf_counter() - enqueued
+        try:
+            yield
+        finally:
+            self.scheduler.release()
+
+    @asynccontextmanager
+    async def _traced(
+        self, path: str, body: bytes | None, call: CallTrace | None, api_key: str
+    ) -> AsyncIterator[CallTrace]:
+        """
+        호출 하나를 계측합니다. 블록이 끝나면(성공·실패·취소 모두) 전체 시간과 결과를 채워 telemetry에 기록합니다.
+        블록 안에 있는 동안은 그 키로 진행 중인 호출로 셉니다. (key_load 참고)
+        """
+        call = call or CallTrace()
+        call.model = call.model or model_of(path)
+        call.key = key_label(api_key)
+        call.request_bytes = len(body or b"")
+        self._key_load[call.key] = self._key_load.get(call.key, 0) + 1
+        started = time.perf_counter()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            call.outcome = "cancelled"
+            raise
+        except Exception as e:
+            call.outcome = "error"
+            call.error = str(e)
+            raise
+        finally:
+            # 대기열에서 기다린 시간은 queue_wait로 따로 셈
+            call.total = time.perf_counter() - started - call.queue_wait
+            self.telemetry.record(call)
+            self._key_load[call.key] -= 1
+
+    async def _send(
+        self,
+        http_method: str,
+        path: str,
+        api_key: str,
+        body: bytes | None = None,
+        params: dict | None = None,
+        stream: bool = False,
+        trace: ConnectionTrace | None = None,
+    ) -> "httpx.Response":
+        """
+        요청을 한 번 보내고 응답 헤더까지 받습니다. (stream=True이면 본문은 나중에 읽음)
+        API 키는 주소(?key=)가 아니라 x-goog-api-key 헤더로 보내므로 접속 기록·오류 메시지의 URL에 남지 않고,
+        인증이 연결이 아닌 요청마다 따라가므로 키가 달라도 같은 연결 풀을 함께 씁니다.
+        """
+        trace = trace or ConnectionTrace()
+        request = self.client.build_request(
+            http_method,
+            f"{self.config.base_url}/{path}",
+            params=params,
+            headers={"x-goog-api-key": api_key},
+            content=body,
+            extensions={"trace": trace},
+        )
+        resp = await self.client.send(request, stream=stream)
+        self._stats["requests"] += 1
+        if trace.new_connection:
+            self._stats["new_connections"] += 1
+        return resp
+
+    async def post(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        stream: bool = False,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> "httpx.Response":
+        """
+        Gemini API에 POST 요청을 보내고 정상 응답을 반환합니다.
+
+        429/5xx/타임아웃/연결 오류는 재시도 정책(지터를 준 지수 백오프, Retry-After)에 따라
+        재시도 예산이 남아 있는 동안 다시 보냅니다. 서킷 브레이커가 열려 있으면 보내지 않고 바로 실패합니다.
+        fallbacks가 있으면 과부하 때 같은 모델에서 기다리지 않고 바로 다음 경로(다른 모델)로 넘어가고,
+        마지막 경로에서부터는 백오프하며 재시도합니다.
+
+        Args:
+            path: "models/gemini-2.5-flash:generateContent" 같은 API 경로
+            body: JSON으로 직렬화된 요청 본문
+            api_key: Gemini API 키
+            stream: True이면 응답 본문을 한 번에 읽지 않고 스트리밍으로 받음
+                (이 경우 호출한 쪽에서 resp.aclose()로 연결을 풀에 돌려줘야 함)
+            call: 시도 횟수, 상태 코드, 연결·첫 응답 시간, 응답한 모델을 채울 계측 기록
+            fallbacks: path가 과부하일 때 차례로 넘어갈 API 경로 (model_router.Route.paths 참고)
+        """
+        import httpx
+
+        params = {"alt": "sse"} if stream else None
+        call = call or CallTrace()
+        began = time.perf_counter()
+        paths = [path, *fallbacks]
+        self.retry_budget.deposit()
+        attempt = 0
+
+        while True:
+            if not self.breaker.allow():
+                self._stats["circuit_rejections"] += 1
+                raise CircuitOpenError(
+                    "선생님이 잠시 자리를 비웠어요. Gemini API가 계속 응답하지 않아 "
+                    f"{self.breaker.retry_in():.0f}초 뒤에 다시 연결합니다."
+                )
+            attempt += 1
+            call.attempts = attempt
+            retry_after = None
+            trace = ConnectionTrace()
+            sent = time.perf_counter()
+            try:
+                resp = await self._send("POST", paths[0], api_key, body, params, stream, trace)
+            except httpx.TimeoutException:
+                error = RuntimeError("Gemini API 요청 시간이 초과되었습니다. 네트워크 연결을 확인해주세요.")
+            except httpx.RequestError as e:
+                error = RuntimeError(f"Gemini API 통신 오류: {e}")
+            except asyncio.CancelledError:
+                # 취소된 요청(버려진 미리 요청 등)은 성공도 실패도 아님
+                self.breaker.release_trial()
+                raise
+            else:
+                call.status = resp.status_code
+                call.connect += trace.connect_seconds
+                if not resp.is_error:
+                    self.breaker.record_success()
+                    call.model = model_of(paths[0])
+                    call.ttfb = (trace.headers_at or time.perf_counter()) - began
+                    self.latency.record(call.model, (trace.headers_at or time.perf_counter()) - sent)
+                    return resp
+                await resp.aclose()
+                status = resp.status_code
+                error = GeminiHTTPError(
+                    STATUS_MESSAGES.get(status, f"Gemini API 응답 오류: {status} {resp.reason_phrase}"),
+                    status,
+                )
+                if status not in self.retry_policy.retry_statuses:
+                    # 요청 자체의 문제(4xx)는 서버가 살아 있다는 뜻이므로 브레이커에는 성공으로 기록
+                    self.breaker.record_success()
+                    raise error
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+
+            self.breaker.record_failure()
+            if len(paths) > 1 and self.retry_budget.try_spend():
+                # 과부하인 모델에서 기다리지 않고 다음 모델로 바로 넘어감
+                paths.pop(0)
+                call.failovers += 1
+                self._stats["failovers"] += 1
+                await self.scheduler.throttle()
+                continue
+            delay = self.retry_policy.backoff(attempt, retry_after)
+            if delay is None:
+                raise error
+            if not self.retry_budget.try_spend():
+                self._stats["retry_budget_exhausted"] += 1
+                raise error
+            self._stats["retries"] += 1
+            await asyncio.sleep(delay)
+            await self.scheduler.throttle()
+
+    async def _hedged(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        stream: bool = False,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> "httpx.Response":
+        """
+        post()와 같지만, 응답 헤더가 이 모델의 평소 지연(p95)보다 늦으면 다음 경로(없으면 같은 경로)로
+        두 번째 요청(헤지)을 보내 먼저 성공한 응답을 쓰고 나머지 요청은 취소합니다.
+        대기열에 기다리는 요청이 있거나 재시도 예산이 없으면 헤지를 보내지 않습니다. (과부하를 키우지 않도록)
+        """
+        call = call or CallTrace()
+        delay = self.latency.hedge_delay(model_of(path)) if self._hedge_enabled else None
+        if delay is None:
+            return await self.post(path, body, api_key, stream, call, fallbacks)
+
+        began = time.perf_counter()
+        primary = asyncio.ensure_future(self.post(path, body, api_key, stream, call, fallbacks))
+        hedge_call = CallTrace()
+        hedge: asyncio.Future | None = None
+        pending: set[asyncio.Future] = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and not self.scheduler.stats()["waiting"] and self.retry_budget.try_spend():
+                await self.scheduler.throttle()
+                hedge = asyncio.ensure_future(
+                    self.post(fallbacks[0] if fallbacks else path, body, api_key, stream, hedge_call)
+                )
+                pending.add(hedge)
+                call.hedge = "sent"
+                self._stats["hedges"] += 1
+            while True:
+                done, pending = await asyncio.wait(done or pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.cancelled() and task.exception() is None]
+                if winners:
+                    break
+                if not pending:
+                    # 모두 실패: 재시도까지 마친 첫 요청의 오류를 알림
+                    raise primary.exception() if primary.done() and not primary.cancelled() else hedge.exception()
+                done = set()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        winner = primary if primary in winners else winners[0]
+        for task in winners:
+            if task is not winner:
+                # 거의 동시에 둘 다 성공한 경우: 쓰지 않는 응답의 연결을 돌려줌
+                await task.result().aclose()
+        if winner is hedge:
+            # 취소된 첫 요청은 지연이 기록되지 않으므로, 지금까지 걸린 시간을 하한으로 남겨 기준이 낮아지지 않게 함
+            self.latency.record(model_of(path), time.perf_counter() - began)
+            call.hedge = "won"
+            call.model = hedge_call.model
+            call.status = hedge_call.status
+            call.connect = hedge_call.connect
+            call.ttfb = time.perf_counter() - began
+            self._stats["hedges_won"] += 1
+        call.attempts += hedge_call.attempts
+        return winner.result()
+
+    async def post_json(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        ticket: QueueTicket | None = None,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> dict:
+        """
+        POST 요청을 보내고 JSON 응답 본문을 돌려줍니다. 호출 시간·시도·토큰은 call에 담아 기록합니다.
+        과부하 때는 fallbacks로 넘어가고, 늦으면 헤지 요청을 보냅니다. (post / _hedged 참고)
+        """
+        async with self._traced(path, body, call, api_key) as call:
+            async with self._slot(ticket, call):
+                resp = await self._hedged(path, body, api_key, call=call, fallbacks=fallbacks)
+            try:
+                data = resp.json()
+            except ValueError as e:
+                raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+            call.use_usage(data.get("usageMetadata"))
+            return data
+
+    async def call_json(
+        self,
+        http_method: str,
+        path: str,
+        api_key: str,
+        body: bytes | None = None,
+        params: dict | None = None,
+    ) -> dict:
+        """재시도 없이 요청을 한 번 보내고 JSON 응답을 돌려줍니다. (캐시 관리 같은 부가 요청용)"""
+        import httpx
+
+        async with self._traced(path, body, CallTrace(kind="other"), api_key) as call:
+            async with self._slot(call=call):
+                trace = ConnectionTrace()
+                began = time.perf_counter()
+                call.attempts = 1
+                try:
+                    resp = await self._send(http_method, path, api_key, body, params, trace=trace)
+                except httpx.RequestError as e:
+                    raise RuntimeError(f"Gemini API 통신 오류: {e}") from e
+                call.status = resp.status_code
+                call.connect = trace.connect_seconds
+                call.ttfb = (trace.headers_at or time.perf_counter()) - began
+            if resp.is_error:
+                raise GeminiHTTPError(f"Gemini API 응답 오류: {resp.status_code}", resp.status_code)
+            try:
+                return resp.json()
+            except ValueError as e:
+                raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+
+    # ---------------------------------------------------------------
+    # 스크립트 스레드에서 부르는 동기 함수
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _wait_turn(
+        get: Callable[[float | None], Any],
+        ticket: QueueTicket,
+        on_queue: Callable[[int | None], None] | None,
+    ) -> Any:
+        """
+        get(timeout)이 결과를 돌려줄 때까지 기다립니다. 그동안 대기 순서가 바뀌면
+        on_queue(앞에 남은 요청 수)를, 대기가 끝나 요청을 보내기 시작하면 on_queue(None)을 부릅니다.
+        """
+        if on_queue is None:
+            return get(None)
+        shown = None
+        while True:
+            try:
+                result = get(QUEUE_POLL_SECONDS)
+            except (queue.Empty, TimeoutError):
+                if ticket.position != shown:
+                    shown = ticket.position
+                    on_queue(shown)
+                continue
+            if shown is not None:
+                on_queue(None)
+            return result
+
+    def request_json(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        session: str | None = None,
+        on_queue: Callable[[int | None], None] | None = None,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> dict:
+        """
+        POST 요청을 엔진 루프에서 보내고, 끝날 때까지 기다려 JSON 응답을 돌려줍니다.
+
+        Args:
+            session: 공정 대기열에서 쓰는 세션 구분값 (같은 세션의 요청끼리 한 줄에 섬)
+            on_queue: 대기 순서가 바뀔 때마다 부를 함수 (_wait_turn 참고)
+            call: 호출 종류(kind)와 카테고리를 정해 둔 계측 기록. 나머지는 엔진이 채워 기록함
+            fallbacks: path가 과부하일 때 넘어갈 다른 모델의 API 경로
+        """
+        ticket = QueueTicket(session)
+        future = self.submit(self.post_json(path, body, api_key, ticket, call, fallbacks))
+        return self._wait_turn(future.result, ticket, on_queue)
+
+    def submit_json(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        session: str | None = None,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> Future:
+        """POST 요청을 엔진 루프에 올리고 기다리지 않습니다. 결과(JSON)는 돌려준 Future로 받습니다."""
+        return self.submit(self.post_json(path, body, api_key, QueueTicket(session), call, fallbacks))
+
+    def stream_events(
+        self,
+        path: str,
+        body: bytes,
+        api_key: str,
+        session: str | None = None,
+        on_queue: Callable[[int | None], None] | None = None,
+        call: CallTrace | None = None,
+        fallbacks: Sequence[str] = (),
+    ) -> Iterator[dict]:
+        """
+        SSE 스트리밍 요청을 엔진 루프에서 보내고, 도착한 이벤트(JSON)를 차례로 내보내는 이터레이터를 돌려줍니다.
+
+        대기열 차례와 응답 헤더를 받을 때까지(재시도 포함)는 이 함수 안에서 기다리므로,
+        상태 코드 오류는 이터레이터를 돌기 전에 바로 예외로 전달됩니다. (session/on_queue/call/fallbacks는 request_json 참고)
+        헤지는 응답 헤더가 먼저 온 요청을 쓰므로, 스트리밍 도중에는 모델이 바뀌지 않습니다.
+        """
+        events: queue.Queue = queue.Queue()
+        ticket = QueueTicket(session)
+
+        async def pump() -> None:
+            import httpx
+
+            try:
+                async with self._traced(path, body, call, api_key) as traced, self._slot(ticket, traced):
+                    resp = await self._hedged(path, body, api_key, stream=True, call=traced, fallbacks=fallbacks)
+                    try:
+                        events.put(_STREAM_STARTED)
+                        async for line in resp.aiter_lines():
+                            # SSE 이벤트 중 "data: {...}" 줄만 사용
+                            if line.startswith("data:"):
+                                event = json.loads(line[len("data:"):])
+                                traced.use_usage(event.get("usageMetadata"))
+                                events.put(event)
+                    finally:
+                        # 연결을 풀에 돌려줌
+                        await resp.aclose()
+                events.put(_STREAM_DONE)
+            except httpx.HTTPError as e:
+                events.put(RuntimeError(f"Gemini API 스트리밍 중 통신 오류: {e}"))
+            except ValueError as e:
+                events.put(RuntimeError(f"Gemini 스트리밍 응답 파싱 중 오류가 발생했습니다: {e}"))
+            except Exception as e:
+                events.put(e)
+
+        future = self.submit(pump())
+        first = self._wait_turn(lambda timeout: events.get(timeout=timeout), ticket, on_queue)
+        if isinstance(first, BaseException):
+            raise first
+
+        def iterate() -> Iterator[dict]:
+            try:
+                while True:
+                    item = events.get()
+                    if item is _STREAM_DONE:
+                        return
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+            finally:
+                # 읽다가 멈춘 경우 루프 쪽 요청도 정리
+                future.cancel()
+
+        return iterate()
+
+
+@st.cache_resource
+def get_engine() -> GeminiEngine:
+    """프로세스 전체에서 공유하는 요청 엔진(이벤트 루프 + 연결 풀)을 반환합니다."""
+    return GeminiEngine()
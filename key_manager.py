@@ -0,0 +1,120 @@
+"""
+Gemini API 키 관리: 학교 키 묶음을 요청마다 나눠 주고, 학생이 입력한 키는 가볍게 확인해 둡니다.
+
+학교가 키를 여러 개 가지고 있으면(GOOGLE_API_KEY + GEMINI_API_KEYS) 키마다 분당 할당량이 따로라서
+요청을 고르게 나눌수록 수업 시작에 몰리는 요청을 더 많이 받아 낼 수 있습니다.
+- least_loaded: 지금 진행 중인(대기열 포함) 호출이 가장 적은 키. 같으면 지금까지 덜 쓴 키
+- round_robin: 차례로 돌아가며
+
+키를 확인하는 요청(models.get)은 답변 생성 할당량을 쓰지 않는 가벼운 조회이고, 결과는 키 이름(key_label)별로
+잠시 기억해 두어 rerun마다 다시 묻지 않습니다. 확인에서 거부된 학교 키는 그동안 나눠 주지 않습니다.
+키 자체는 프로세스 메모리에만 있고, 기록·화면에는 key_label 이름만 남습니다.
+"""
+import itertools
+import threading
+import time
+
+import streamlit as st
+
+from app_config import get_settings
+from gemini_engine import GeminiHTTPError, get_engine
+from model_router import MENTORING_ROUTE
+from telemetry import key_label
+
+# 확인 결과를 기억하는 시간(초): 통과한 키 / 거부된 키
+VALID_KEY_TTL_SECONDS = 3600
+INVALID_KEY_TTL_SECONDS = 300
+# 이 상태 코드로 거부되면 잘못된 키 (429/5xx/통신 오류는 키 문제가 아니므로 판단을 미룸)
+INVALID_KEY_STATUSES = (400, 401, 403)
+ASSIGNMENT_STRATEGIES = ("least_loaded", "round_robin")
+
+
+class KeyManager:
+    """
+    학교 키 묶음 나눠 주기 + 키 확인 결과 캐시. 스크립트 스레드 여러 개가 함께 쓰므로 잠금 안에서 고칩니다.
+
+    키마다 따로 연결 풀을 두지 않고 엔진의 연결 풀 하나를 함께 씁니다. 키는 요청마다 x-goog-api-key 헤더로
+    따라가므로 연결을 나눌 이유가 없고, 나누면 키 수만큼 TLS 연결을 새로 맺어야 합니다.
+    """
+
+    def __init__(self, keys: tuple[str, ...], strategy: str = "least_loaded") -> None:
+        if strategy not in ASSIGNMENT_STRATEGIES:
+            raise ValueError(f"알 수 없는 키 배정 방식입니다: {strategy} ({', '.join(ASSIGNMENT_STRATEGIES)})")
+        self.keys = keys
+        self.strategy = strategy
+        self._labels = {key: key_label(key) for key in keys}
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._picks = dict.fromkeys(keys, 0)  # 키 → 나눠 준 횟수
+        self._checked: dict[str, tuple[bool, float]] = {}  # 키 이름 → (통과 여부, 확인한 시각)
+
+    def pick(self) -> str | None:
+        """요청 하나에 쓸 학교 키. 학교 키가 없으면 None. 모두 거부되었으면 그래도 하나를 돌려줌 (오류는 요청에서 보임)."""
+        usable = [key for key in self.keys if self._known(self._labels[key]) is not False] or list(self.keys)
+        if not usable:
+            return None
+        with self._lock:
+            if self.strategy == "round_robin":
+                key = usable[next(self._turn) % len(usable)]
+            else:
+                engine = get_engine()
+                key = min(usable, key=lambda k: (engine.key_load(self._labels[k]), self._picks[k]))
+            self._picks[key] += 1
+        return key
+
+    def validate(self, api_key: str) -> bool | None:
+        """
+        키를 쓸 수 있는지 확인합니다. 기억해 둔 결과가 있으면 요청하지 않습니다.
+
+        Returns:
+            True 통과 / False 거부된 키 / None 지금은 알 수 없음 (할당량 초과·서버 오류·통신 오류, 기억하지 않음)
+        """
+        label = key_label(api_key)
+        known = self._known(label)
+        if known is not None:
+            return known
+        engine = get_engine()
+        try:
+            engine.run(engine.call_json("GET", f"models/{MENTORING_ROUTE.primary}", api_key))
+            valid = True
+        except GeminiHTTPError as e:
+            if e.status_code not in INVALID_KEY_STATUSES:
+                return None
+            valid = False
+        except RuntimeError:
+            return None
+        with self._lock:
+            self._checked[label] = (valid, time.monotonic())
+        return valid
+
+    def _known(self, label: str) -> bool | None:
+        """기억해 둔 확인 결과 (없거나 오래되었으면 None)."""
+        with self._lock:
+            entry = self._checked.get(label)
+        if entry is None:
+            return None
+        valid, checked_at = entry
+        ttl = VALID_KEY_TTL_SECONDS if valid else INVALID_KEY_TTL_SECONDS
+        return valid if time.monotonic() - checked_at < ttl else None
+
+    def stats(self) -> list[dict]:
+        """학교 키마다 {"key": 키 이름, "picks": 나눠 준 횟수, "in_flight": 진행 중인 호출 수, "valid": 확인 결과}."""
+        engine = get_engine()
+        with self._lock:
+            picks = dict(self._picks)
+        return [
+            {
+                "key": self._labels[key],
+                "picks": picks[key],
+                "in_flight": engine.key_load(self._labels[key]),
+                "valid": self._known(self._labels[key]),
+            }
+            for key in self.keys
+        ]
+
+
+@st.cache_resource
+def get_key_manager() -> KeyManager:
+    """프로세스 전체에서 공유하는 키 관리자 (학교 키는 app_config 설정에서 읽음)."""
+    settings = get_settings()
+    return KeyManager(settings.api_keys, settings.key_assignment)
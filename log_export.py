@@ -0,0 +1,165 @@
+"""
+상담 일지 내보내기.
+
+학생 한 명의 일지(TXT)와 여러 대화를 한꺼번에 묶은 ZIP/JSONL/CSV를 만듭니다.
+모두 대화 저장소에서 대화를 하나씩 읽으며 조각(bytes)을 내보내는 제너레이터라서,
+반 전체(수백 개 대화)를 내보내도 한 번에 메모리에 올리지 않습니다.
+일지 형식은 사이드바의 '상담 일지 저장하기'와 같은 `[선생님] …` / `[학생] …` 줄입니다.
+"""
+import csv
+import datetime
+import io
+import json
+import tempfile
+import zipfile
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+from conversation_store import ConversationStore
+from evaluation import RUBRIC_CRITERIA
+
+# 내보내기 형식: 화면에 보여 줄 이름, 파일 확장자, MIME 형식
+EXPORT_FORMATS = {
+    "zip": ("학생별 TXT 묶음 (ZIP)", "zip", "application/zip"),
+    "jsonl": ("JSONL (대화마다 한 줄)", "jsonl", "application/x-ndjson"),
+    "csv": ("CSV (메시지마다 한 줄, 엑셀용)", "csv", "text/csv"),
+}
+
+
+def log_lines(messages: Iterable[dict]) -> Iterator[str]:
+    """메시지들을 상담 일지 줄(`[선생님] …` / `[학생] …`)로 바꿉니다. system 메시지는 뺍니다."""
+    for msg in messages:
+        if msg["role"] == "system":
+            continue
+        role = "선생님" if msg["role"] == "assistant" else "학생"
+        yield f"[{role}] {msg['content']}\n"
+
+
+def started_at(info: dict) -> str:
+    """대화 시작 시각 (서버 시간대, 'YYYY-MM-DD HH:MM')."""
+    return datetime.datetime.fromtimestamp(info["created_at"]).strftime("%Y-%m-%d %H:%M")
+
+
+def log_file_name(info: dict) -> str:
+    """ZIP 안의 학생별 일지 파일 이름: 시작 시각_(학생 이름_)주제_대화 번호 앞 8자리.txt"""
+    topic = info["category"].split(" ", 1)[-1].replace(" ", "_").replace("/", "_")
+    stamp = datetime.datetime.fromtimestamp(info["created_at"]).strftime("%Y%m%d-%H%M")
+    if info.get("student"):
+        # 일괄 피드백(tools/batch_feedback.py)처럼 학생 이름을 아는 대화
+        topic = info["student"].replace(" ", "_").replace("/", "_") + "_" + topic
+    return f"{stamp}_{topic}_{info['id'][:8]}.txt"
+
+
+class _ChunkSink(io.RawIOBase):
+    """zipfile이 쓴 바이트를 모아 두었다가 take()로 넘겨주는 쓰기 전용 스트림 (되감기 불가)."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.pending = 0  # 아직 넘겨주지 않은 바이트 수
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def iter_zip(store: ConversationStore, sessions: Iterable[dict], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """학생(대화)마다 일지 TXT 하나씩 담은 ZIP을 조각으로 내보냅니다."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for info in sessions:
+            with archive.open(log_file_name(info), "w") as log:
+                for line in log_lines(store.iter_messages(info["id"])):
+                    log.write(line.encode("utf-8"))
+                    if sink.pending >= chunk_size:
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_jsonl(store: ConversationStore, sessions: Iterable[dict]) -> Iterator[bytes]:
+    """
+    대화마다 한 줄씩 {"session_id", "category", "started_at", "messages": [...]} JSON을 내보냅니다.
+    평가가 있는 선생님 답변은 메시지에 "evaluation"(루브릭 점수·판정)이 함께 들어 있습니다.
+    대화 정보에 학생 이름이 있으면 "student"도 넣습니다.
+    """
+    for info in sessions:
+        record = {
+            "session_id": info["id"],
+            "category": info["category"],
+            "started_at": started_at(info),
+            "messages": list(store.iter_messages(info["id"])),
+        }
+        if info.get("student"):
+            record["student"] = info["student"]
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_csv(store: ConversationStore, sessions: Iterable[dict], with_student: bool = False) -> Iterator[bytes]:
+    """
+    메시지마다 한 줄씩 CSV를 내보냅니다. 엑셀에서 한글이 깨지지 않도록 BOM을 붙입니다.
+    선생님 답변 줄에는 그 턴의 루브릭 점수와 판정(통과/보완)도 적습니다. (평가가 없으면 빈 칸)
+    with_student이면 대화 번호 다음에 대화 정보의 학생 이름("student") 열을 둡니다.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    student_header = ["학생"] if with_student else []
+    writer.writerow(
+        ["대화 번호", *student_header, "주제", "시작 시각", "순번", "역할", "내용", *RUBRIC_CRITERIA.values(), "판정"]
+    )
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for info in sessions:
+        student = [info.get("student", "")] if with_student else []
+        for seq, msg in enumerate(store.iter_messages(info["id"])):
+            buffer.seek(0)
+            buffer.truncate()
+            role = "선생님" if msg["role"] == "assistant" else "학생"
+            evaluation = msg.get("evaluation") or {}
+            rubric = evaluation.get("rubric", {})
+            verdict = {"pass": "통과", "revise": "보완"}.get(evaluation.get("verdict"), "")
+            writer.writerow(
+                [
+                    info["id"], *student, info["category"], started_at(info), seq, role, msg["content"],
+                    *(rubric.get(name, "") for name in RUBRIC_CRITERIA), verdict,
+                ]
+            )
+            yield buffer.getvalue().encode("utf-8")
+
+
+def iter_export(
+    store: ConversationStore, sessions: Iterable[dict], fmt: str, with_student: bool = False
+) -> Iterator[bytes]:
+    """
+    fmt(EXPORT_FORMATS의 키) 형식으로 여러 대화를 묶어 조각으로 내보냅니다.
+    with_student이면 CSV에 학생 이름 열을 둡니다. (ZIP 파일 이름과 JSONL에는 이름이 있으면 늘 들어감)
+    """
+    if fmt == "zip":
+        return iter_zip(store, sessions)
+    if fmt == "jsonl":
+        return iter_jsonl(store, sessions)
+    if fmt == "csv":
+        return iter_csv(store, sessions, with_student)
+    raise ValueError(f"알 수 없는 내보내기 형식입니다: {fmt}")
+
+
+def spool(chunks: Iterable[bytes]) -> BinaryIO:
+    """조각들을 임시 파일에 차례로 쓰고 처음으로 되감아 돌려줍니다. (st.download_button에 바로 넘길 수 있음)"""
+    file = tempfile.TemporaryFile(buffering=0)
+    for chunk in chunks:
+        file.write(chunk)
+    file.seek(0)
+    return file
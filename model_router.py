@@ -0,0 +1,97 @@
+"""
+턴 종류별 모델 선택(라우팅)과 모델별 응답 지연 기록.
+
+첫 답변처럼 정해진 틀로 묻는 턴은 빠르고 싼 모델로, 멘토링 대화는 기본 모델로 보냅니다.
+턴 종류마다 모델 목록을 두고 첫 모델이 과부하(429/5xx/시간 초과)이면 엔진이 바로 다음 모델로 넘어가며,
+응답이 그 모델의 평소 p95보다 늦으면 다음 모델(없으면 같은 모델)로 두 번째 요청(헤지)을 보내
+먼저 온 응답을 씁니다. (gemini_engine.GeminiEngine.post / _hedged 참고)
+
+LatencyTracker는 엔진 이벤트 루프 스레드에서만 쓰도록 되어 있어 잠금을 쓰지 않습니다.
+"""
+from collections import deque
+from dataclasses import dataclass
+
+from app_config import get_service_settings
+
+# 턴 종류별 모델 목록과 헤지 설정 (app_config.RoutingSettings: GEMINI_OPENER_MODELS, GEMINI_HEDGE 등)
+ROUTING = get_service_settings().routing
+
+
+@dataclass(frozen=True)
+class Route:
+    """턴 종류 하나의 모델 목록. 첫 모델이 기본이고 나머지는 넘어갈 순서입니다."""
+
+    name: str
+    models: tuple[str, ...]
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def paths(self, method: str) -> list[str]:
+        """모델마다 "models/<모델>:<method>" API 경로 (기본 모델부터)."""
+        return [f"models/{model}:{method}" for model in self.models]
+
+    def pinned(self) -> "Route":
+        """기본 모델만 쓰는 경로. (컨텍스트 캐시처럼 한 모델에 묶인 요청용)"""
+        return Route(self.name, self.models[:1])
+
+
+def parse_models(value: str) -> tuple[str, ...]:
+    """'a, b,a' → ('a', 'b') (빈 칸과 중복 제거, 순서 유지)."""
+    models = tuple(dict.fromkeys(model.strip() for model in value.split(",") if model.strip()))
+    if not models:
+        raise ValueError(f"모델 목록이 비어 있습니다: {value!r}")
+    return models
+
+
+# 첫 답변(아이디어 선택 직후) / 멘토링 대화 / 오래된 대화 요약
+OPENER_ROUTE = Route("opener", parse_models(ROUTING.opener_models))
+MENTORING_ROUTE = Route("mentoring", parse_models(ROUTING.mentoring_models))
+SUMMARY_ROUTE = Route("summary", parse_models(ROUTING.summary_models))
+
+
+def model_of(path: str) -> str:
+    """"models/gemini-2.5-flash:generateContent" → "gemini-2.5-flash" (모델 경로가 아니면 빈 문자열)."""
+    return path[len("models/"):].split(":")[0] if path.startswith("models/") else ""
+
+
+class LatencyTracker:
+    """
+    모델별 최근 응답 헤더 지연(초)을 모아 헤지 기준(백분위)을 계산합니다.
+
+    정렬은 표본이 refresh개 쌓일 때마다 한 번만 다시 하므로 요청마다 드는 비용은 작습니다.
+    """
+
+    def __init__(
+        self,
+        percentile: float = ROUTING.hedge_percentile,
+        min_samples: int = ROUTING.hedge_min_samples,
+        min_delay: float = ROUTING.hedge_min_delay,
+        samples: int = 500,
+        refresh: int = 20,
+    ) -> None:
+        self.percentile = percentile
+        self.min_samples = max(1, min_samples)
+        self.min_delay = min_delay
+        self.refresh = max(1, refresh)
+        self._samples_per_model = samples
+        self._samples: dict[str, deque[float]] = {}
+        self._thresholds: dict[str, float] = {}
+        self._since_refresh: dict[str, int] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        samples = self._samples.setdefault(model, deque(maxlen=self._samples_per_model))
+        samples.append(seconds)
+        self._since_refresh[model] = self._since_refresh.get(model, 0) + 1
+        if len(samples) >= self.min_samples and (
+            model not in self._thresholds or self._since_refresh[model] >= self.refresh
+        ):
+            ordered = sorted(samples)
+            self._thresholds[model] = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+            self._since_refresh[model] = 0
+
+    def hedge_delay(self, model: str) -> float | None:
+        """이 모델로 보낸 요청에 헤지를 보낼 때까지 기다릴 시간(초). 표본이 모자라면 None."""
+        threshold = self._thresholds.get(model)
+        return None if threshold is None else max(self.min_delay, threshold)
@@ -0,0 +1,151 @@
+"""
+관리자 통계: Gemini 호출이 왜 느린지, 토큰을 어디에 쓰는지 봅니다.
+
+엔진의 계측기(telemetry)에 쌓인 최근 호출로 대기열 대기·연결·첫 응답·전체 시간의
+p50/p95/p99, 재시도·오류 수, 카테고리별 토큰 사용량을 보여 줍니다.
+같은 지표는 GEMINI_METRICS_PORT를 정하면 Prometheus 형식(/metrics)으로도 내보냅니다.
+"""
+import datetime
+from collections import defaultdict
+
+import streamlit as st
+
+from gemini_engine import get_engine
+from teacher_auth import require_teacher
+from telemetry import PHASES
+
+st.set_page_config(page_title="관리자 통계", page_icon="📈", layout="wide")
+
+st.title("📈 관리자 통계")
+
+require_teacher("⚠️ TEACHER_PASSWORD가 설정되지 않아 누구나 이 페이지에서 호출 통계를 볼 수 있습니다.")
+
+telemetry = get_engine().telemetry
+calls = telemetry.recent()
+if not calls:
+    st.info("아직 기록된 Gemini 호출이 없습니다.")
+    st.stop()
+
+# 화면에 보여 줄 시간 항목 이름
+PHASE_LABELS = {"queue_wait": "대기열", "connect": "연결", "ttfb": "첫 응답", "total": "전체"}
+# 경로(턴 종류) 이름
+ROUTE_LABELS = {"opener": "첫 답변", "mentoring": "멘토링", "summary": "대화 요약"}
+# 호출 종류 이름
+KIND_LABELS = {"generate": "답변", "stream": "답변(스트리밍)", "summary": "대화 요약", "prefetch": "미리 요청", "batch": "일괄 피드백", "other": "기타"}
+
+
+def latency_rows(groups: dict[str, list]) -> list[dict]:
+    """묶음마다 호출 수, 오류 수, 시간 항목별 p50/p95/p99(밀리초) 한 줄씩."""
+    rows = []
+    for name, group in groups.items():
+        summary = telemetry.summary(group)
+        row = {
+            "구분": name,
+            "호출": summary["calls"],
+            "오류": summary["errors"],
+            "재시도": summary["retried"],
+            "모델 전환": summary["failed_over"],
+            "헤지(이김)": f"{summary['hedged']} ({summary['hedge_won']})",
+        }
+        for phase in PHASES:
+            for p in (50, 95, 99):
+                row[f"{PHASE_LABELS[phase]} p{p}"] = round(summary[f"{phase}_p{p}"] * 1000)
+        rows.append(row)
+    return rows
+
+
+# -------------------------------------------------------------------
+# 전체 요약
+# -------------------------------------------------------------------
+overall = telemetry.summary(calls)
+since = datetime.datetime.fromtimestamp(calls[0].started_at).strftime("%m-%d %H:%M")
+st.caption(f"{since} 이후 최근 호출 {overall['calls']}개 기준 (시간은 밀리초, 성공한 호출만)")
+
+call_col, error_col, ttfb_col, total_col, token_col = st.columns(5)
+call_col.metric("호출 수", f"{overall['calls']}개")
+error_col.metric("오류 / 취소", f"{overall['errors']} / {overall['cancelled']}")
+ttfb_col.metric("첫 응답 p95", f"{overall['ttfb_p95'] * 1000:.0f}ms")
+total_col.metric("전체 p95", f"{overall['total_p95'] * 1000:.0f}ms")
+token_col.metric("토큰 합계", f"{overall['total_tokens']:,}")
+
+# -------------------------------------------------------------------
+# 호출 종류·카테고리별 시간
+# -------------------------------------------------------------------
+by_kind: defaultdict[str, list] = defaultdict(list)
+by_category: defaultdict[str, list] = defaultdict(list)
+by_model: defaultdict[str, list] = defaultdict(list)
+by_route: defaultdict[str, list] = defaultdict(list)
+by_key: defaultdict[str, list] = defaultdict(list)
+for call in calls:
+    by_kind[KIND_LABELS.get(call.kind, call.kind)].append(call)
+    by_category[call.category or "(없음)"].append(call)
+    by_model[call.model or "(없음)"].append(call)
+    by_route[ROUTE_LABELS.get(call.route, call.route or "(없음)")].append(call)
+    by_key[call.key or "(없음)"].append(call)
+
+st.subheader("⏱️ 호출 종류별 시간")
+st.dataframe(latency_rows(by_kind), use_container_width=True, hide_index=True)
+st.subheader("🧭 모델별 시간")
+st.caption("첫 답변은 빠른 모델, 멘토링은 기본 모델로 보내고 과부하이면 다음 모델로 넘어갑니다. (응답한 모델 기준)")
+st.dataframe(latency_rows(by_model), use_container_width=True, hide_index=True)
+st.subheader("🧭 경로별 시간")
+st.dataframe(latency_rows(by_route), use_container_width=True, hide_index=True)
+st.subheader("🔑 API 키별 시간")
+st.caption("키는 앞부분 해시 이름으로만 표시합니다. 학교 키가 여러 개면 요청을 나눠 보냅니다.")
+st.dataframe(latency_rows(by_key), use_container_width=True, hide_index=True)
+st.subheader("⏱️ 카테고리별 시간")
+st.dataframe(latency_rows(by_category), use_container_width=True, hide_index=True)
+
+# -------------------------------------------------------------------
+# 카테고리별 토큰 사용량
+# -------------------------------------------------------------------
+st.subheader("🪙 카테고리별 토큰 사용량")
+token_rows = []
+for category, group in sorted(by_category.items()):
+    summary = telemetry.summary(group)
+    token_rows.append(
+        {
+            "카테고리": category,
+            "호출": summary["calls"],
+            "프롬프트": summary["prompt_tokens"],
+            "응답": summary["response_tokens"],
+            "생각": summary["thoughts_tokens"],
+            "합계": summary["total_tokens"],
+            "호출당 평균": round(summary["total_tokens"] / summary["calls"]),
+        }
+    )
+st.dataframe(token_rows, use_container_width=True, hide_index=True)
+
+# -------------------------------------------------------------------
+# 최근 호출 기록
+# -------------------------------------------------------------------
+st.subheader("🧾 최근 호출")
+st.dataframe(
+    [
+        {
+            "시각": datetime.datetime.fromtimestamp(call.started_at).strftime("%H:%M:%S"),
+            "종류": KIND_LABELS.get(call.kind, call.kind),
+            "카테고리": call.category,
+            "경로": ROUTE_LABELS.get(call.route, call.route),
+            "모델": call.model,
+            "키": call.key,
+            "결과": call.outcome,
+            "상태": call.status,
+            "시도": call.attempts,
+            "모델 전환": call.failovers,
+            "헤지": {"sent": "보냄", "won": "이김"}.get(call.hedge, ""),
+            "요청 KB": round(call.request_bytes / 1024, 1),
+            **{f"{PHASE_LABELS[phase]}(ms)": None if (value := getattr(call, phase)) is None else round(value * 1000)
+               for phase in PHASES},
+            "프롬프트 토큰": call.prompt_tokens,
+            "응답 토큰": call.response_tokens,
+            "오류": call.error,
+        }
+        for call in reversed(calls[-200:])
+    ],
+    use_container_width=True,
+    hide_index=True,
+)
+
+with st.expander("Prometheus 지표 (/metrics와 같은 내용)"):
+    st.code(telemetry.prometheus_text(), language="text")
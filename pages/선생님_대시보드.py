@@ -0,0 +1,100 @@
+"""
+선생님 대시보드: 여러 반 학생들의 상담 대화를 한눈에 보고 한꺼번에 내보냅니다.
+
+대화 저장소(conversation_store)에 쌓인 대화를 주제·날짜로 골라 목록으로 보여 주고,
+학생별 TXT 묶음(ZIP), JSONL, CSV로 내려받을 수 있습니다. 내보내기 파일은 내려받기 버튼을
+누를 때에만 만들므로 목록을 고르는 동안(rerun마다)에는 서버 메모리를 쓰지 않습니다.
+다만 Streamlit은 내려받을 파일을 서버 메모리에 올려 두고 보내므로, 내려받는 동안에는 파일 크기만큼
+메모리를 씁니다. 학기 전체처럼 아주 큰 내보내기는 tools/export_logs.py로 파일에 바로 쓰세요.
+"""
+import datetime
+
+import streamlit as st
+
+from conversation_store import get_conversation_store
+from log_export import EXPORT_FORMATS, iter_export, spool
+from teacher_auth import require_teacher
+
+st.set_page_config(page_title="선생님 대시보드", page_icon="📋", layout="wide")
+
+st.title("📋 선생님 대시보드")
+
+# 선생님 확인: TEACHER_PASSWORD를 설정했다면 비밀번호를 입력해야 대화를 볼 수 있음
+require_teacher("⚠️ TEACHER_PASSWORD가 설정되지 않아 누구나 이 페이지에서 학생 대화를 볼 수 있습니다.")
+
+store = get_conversation_store()
+
+# -------------------------------------------------------------------
+# 주제·날짜로 대화 고르기
+# -------------------------------------------------------------------
+all_sessions = store.list_sessions()
+if not all_sessions:
+    st.info("아직 저장된 상담 대화가 없습니다.")
+    st.stop()
+
+first_day = datetime.date.fromtimestamp(all_sessions[0]["created_at"])
+today = datetime.date.today()
+
+filter_col, date_col = st.columns(2)
+with filter_col:
+    topics = sorted({info["category"] for info in all_sessions})
+    selected_topics = st.multiselect("탐구 주제", topics, default=topics)
+with date_col:
+    date_range = st.date_input("대화 시작 날짜", value=(first_day, today), max_value=today)
+
+# 날짜를 하나만 고른 상태(범위 선택 중)면 그날 하루만
+start_day, end_day = (date_range[0], date_range[-1]) if date_range else (first_day, today)
+sessions = store.list_sessions(
+    selected_topics,
+    datetime.datetime.combine(start_day, datetime.time.min).timestamp(),
+    datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time.min).timestamp(),
+)
+
+count_col, message_col = st.columns(2)
+count_col.metric("대화 수", f"{len(sessions)}개")
+message_col.metric("메시지 수", f"{sum(info['messages'] for info in sessions)}개")
+
+st.dataframe(
+    [
+        {
+            "시작 시각": datetime.datetime.fromtimestamp(info["created_at"]).strftime("%Y-%m-%d %H:%M"),
+            "마지막 대화": datetime.datetime.fromtimestamp(info["updated_at"]).strftime("%Y-%m-%d %H:%M"),
+            "주제": info["category"],
+            "메시지 수": info["messages"],
+            "대화 번호": info["id"],
+        }
+        for info in reversed(sessions)
+    ],
+    use_container_width=True,
+    hide_index=True,
+)
+
+# -------------------------------------------------------------------
+# 한꺼번에 내보내기
+# -------------------------------------------------------------------
+st.subheader("💾 상담 일지 한꺼번에 내보내기")
+fmt = st.radio(
+    "파일 형식",
+    list(EXPORT_FORMATS),
+    format_func=lambda key: EXPORT_FORMATS[key][0],
+    horizontal=True,
+)
+_, extension, mime = EXPORT_FORMATS[fmt]
+
+
+def build_export(sessions: list[dict] = sessions, fmt: str = fmt):
+    """
+    버튼을 누를 때 Streamlit이 부르는 내보내기 파일 만들기(data에 함수 주기는 Streamlit 1.52부터). 대화를 하나씩 읽어 임시 파일에 씁니다.
+    나중에 다른 스레드에서 불려도 이번 rerun에서 고른 대화·형식을 쓰도록 기본값으로 묶어 둡니다.
+    """
+    return spool(iter_export(store, sessions, fmt))
+
+
+st.download_button(
+    label=f"📥 파일로 내려받기 ({len(sessions)}개 대화)",
+    data=build_export,
+    file_name=f"창업멘토링_상담일지_{start_day:%Y%m%d}-{end_day:%Y%m%d}.{extension}",
+    mime=mime,
+    type="primary",
+    disabled=not sessions,
+)
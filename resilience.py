@@ -0,0 +1,139 @@
+"""
+Gemini 요청 엔진에서 쓰는 재시도 정책, 재시도 예산, 서킷 브레이커.
+
+반 전체가 한꺼번에 할당량에 걸렸을 때 모든 세션이 같은 박자로 재시도하지 않도록
+지터를 준 지수 백오프를 쓰고, 재시도 총량을 예산으로 묶고, 서버가 계속 실패하면
+잠시 요청을 보내지 않고 바로 실패시킵니다.
+
+모든 객체는 엔진 이벤트 루프 스레드에서만 쓰도록 되어 있어 잠금을 쓰지 않습니다.
+"""
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class RetryPolicy:
+    """
+    전체 지터(full jitter) 지수 백오프 재시도 정책.
+
+    n번째 재시도 전에는 0 ~ min(max_delay, base_delay * 2**(n-1)) 사이에서 무작위로 기다립니다.
+    서버가 Retry-After를 보냈다면 그 시간을 따르되, max_delay보다 길면 재시도하지 않습니다.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 20.0
+    # 재시도할 상태 코드 (할당량 초과 + 일시적인 서버 오류)
+    retry_statuses: tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """
+        attempt번째 시도가 실패한 뒤 기다릴 시간(초). 더 이상 재시도하지 않으면 None.
+
+        Args:
+            attempt: 방금 실패한 시도 번호 (1부터)
+            retry_after: 서버가 Retry-After로 알려 준 대기 시간(초)
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After 헤더(초 또는 HTTP 날짜)를 대기 시간(초)으로 바꿉니다."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryBudget:
+    """
+    프로세스 전체 재시도 예산 (토큰 버킷).
+
+    새 요청마다 ratio만큼 토큰이 쌓이고 재시도 한 번에 토큰 1개를 씁니다.
+    장애 중에 재시도가 원래 요청량의 ratio 비율(+ 최소 여유분)을 넘지 않게 합니다.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0) -> None:
+        self.ratio = ratio
+        self.max_tokens = max(max_tokens, min_tokens)
+        self.tokens = min_tokens
+
+    def deposit(self) -> None:
+        """새 요청 하나가 들어왔음을 기록합니다."""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """재시도 한 번을 위한 토큰이 있으면 쓰고 True, 없으면 False."""
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷 브레이커가 열려 있어 요청을 보내지 않고 바로 실패했을 때 발생합니다."""
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold번 쌓이면 열려서(open) reset_timeout초 동안 요청을 바로 거절합니다.
+    그 뒤 한 번의 시험 요청(half-open)이 성공하면 다시 닫히고, 실패하면 다시 열립니다.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """지금 요청을 보내도 되는지 확인합니다."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        """열려 있을 때 다시 시도할 수 있기까지 남은 시간(초)."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def release_trial(self) -> None:
+        """시험 요청이 결과 없이 취소되었을 때 다음 요청이 다시 시험할 수 있게 합니다."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
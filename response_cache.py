@@ -0,0 +1,215 @@
+"""
+같은 질문에 대한 선생님 답변을 재사용하는 응답 캐시.
+
+첫 턴은 카테고리 4개 × '저는 … 관련 아이디어를 생각해보고 싶어요.' 선택지 9개로 거의 정해져 있어서
+모든 학생이 같은 요청을 반복해서 보냅니다. (카테고리, 정규화한 대화 기록, 모델, 프롬프트 버전)을
+키로 답변을 TTL + LRU로 보관하고, 원하면 SQLite 파일에 저장해 재시작 뒤에도 씁니다.
+키마다 답변을 variants개까지 모아 두고 그중 하나를 골라 주어 학생들이 모두 똑같은 글을 보지 않게 합니다.
+
+여러 세션(스크립트 스레드)이 함께 쓰므로 모든 접근은 잠금 안에서 이루어집니다.
+여러 앱 복제본이 함께 쓰려면 공유 저장소(shared_state) 위의 SharedResponseCache를 씁니다.
+"""
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from shared_state import SharedBackend, SharedBackendError
+
+
+def history_key(messages: list[dict], category: str, model: str, prompt_version: str) -> str:
+    """
+    캐시 키. system 메시지는 빼고, 역할과 공백을 정리한 내용만으로 대화 기록을 해시합니다.
+    (시스템 프롬프트는 카테고리와 프롬프트 버전에 이미 반영됨)
+    """
+    history = [
+        [m.get("role"), " ".join(str(m.get("content", "")).split())]
+        for m in messages
+        if m.get("role") != "system"
+    ]
+    raw = json.dumps([model, prompt_version, category, history], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    답변 캐시 (TTL + LRU, 선택적으로 SQLite에 저장).
+
+    get()은 키의 답변이 variants개 모였을 때만 그중 하나를 돌려주고, 모자라면 None을 돌려주어
+    호출한 쪽이 새 답변을 만들어 put()으로 보태게 합니다.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        max_entries: int = 256,
+        variants: int = 1,
+        path: str | None = None,
+    ) -> None:
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.variants = max(1, variants)
+        # 키 → [(답변, 만드는 데 걸린 시간(초), 만든 시각)], 맨 뒤가 가장 최근에 쓴 키
+        self._entries: OrderedDict[str, list[tuple[str, float, float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "evictions": 0}
+        self._db: sqlite3.Connection | None = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT NOT NULL, text TEXT NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_key ON responses (key)")
+            self._load()
+
+    def _load(self) -> None:
+        """저장된 답변 중 만료되지 않은 것을 오래된 순서로 읽어 LRU 순서를 되살립니다."""
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        for key, text, latency, created_at in self._db.execute(
+            "SELECT key, text, latency, created_at FROM responses ORDER BY created_at"
+        ):
+            variants = self._entries.setdefault(key, [])
+            variants.append((text, latency, created_at))
+            del variants[:-self.variants]
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def get(self, key: str) -> str | None:
+        """키에 모인 답변 중 하나. 만료되었거나 variants개가 아직 안 모였으면 None."""
+        now = time.time()
+        with self._lock:
+            variants = [v for v in self._entries.get(key, ()) if now - v[2] < self.ttl]
+            if key in self._entries:
+                self._entries[key] = variants
+            if len(variants) < self.variants:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            text, latency, _ = random.choice(variants)
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += latency
+            return text
+
+    def ready(self, key: str) -> bool:
+        """get()이 지금 답변을 돌려줄 수 있는지 (통계에는 세지 않음)."""
+        now = time.time()
+        with self._lock:
+            return sum(now - v[2] < self.ttl for v in self._entries.get(key, ())) >= self.variants
+
+    def put(self, key: str, text: str, latency: float) -> None:
+        """
+        새 답변을 보탭니다.
+
+        Args:
+            key: history_key()로 만든 키
+            text: 선생님 답변
+            latency: 이 답변을 Gemini에서 받는 데 걸린 시간(초). 캐시로 아낀 시간 계산에 씀
+        """
+        if not text.strip():
+            return
+        created_at = time.time()
+        with self._lock:
+            variants = self._entries.setdefault(key, [])
+            if len(variants) >= self.variants:
+                return
+            variants.append((text, latency, created_at))
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO responses (key, text, latency, created_at) VALUES (?, ?, ?, ?)",
+                    (key, text, latency, created_at),
+                )
+            while len(self._entries) > self.max_entries:
+                self._evict()
+            if self._db is not None:
+                self._db.commit()
+
+    def _evict(self) -> None:
+        """가장 오래 쓰지 않은 키를 지웁니다. (잠금 안에서 부름)"""
+        key, _ = self._entries.popitem(last=False)
+        self._stats["evictions"] += 1
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        """적중/실패 수, 적중률, 캐시로 아낀 응답 시간(초), 보관 중인 키 수, 밀려난 키 수."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class SharedResponseCache:
+    """
+    여러 앱 복제본이 공유 저장소(shared_state.SharedBackend)로 함께 쓰는 답변 캐시. ResponseCache와 같은 인터페이스입니다.
+
+    키마다 답변을 리스트(resp:<키>)에 [답변, 걸린 시간, 만든 시각] JSON으로 모으고, 첫 답변을 넣을 때
+    TTL을 걸어 만료는 저장소가 맡습니다. (개수 제한은 Redis의 maxmemory 정책 등 저장소 설정으로 정함)
+    적중/실패 통계는 복제본마다 따로 셉니다. 저장소에 닿지 않으면 캐시가 없는 것처럼 동작해 답변은 계속 받습니다.
+    """
+
+    def __init__(self, backend: SharedBackend, ttl_seconds: float = 86400, variants: int = 1) -> None:
+        self._backend = backend
+        self.ttl = ttl_seconds
+        self.variants = max(1, variants)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "evictions": 0}
+        # 이 복제본이 답변을 넣었거나 찾은 키 (통계의 보관 수로만 씀)
+        self._seen: set[str] = set()
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"resp:{key}"
+
+    def get(self, key: str) -> str | None:
+        """키에 모인 답변 중 하나. 만료되었거나 variants개가 아직 안 모였으면 None."""
+        try:
+            variants = [json.loads(raw) for raw in self._backend.lrange(self._key(key), 0, self.variants - 1)]
+        except SharedBackendError:
+            variants = []
+        with self._lock:
+            if len(variants) < self.variants:
+                self._stats["misses"] += 1
+                return None
+            text, latency, _ = random.choice(variants)
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += latency
+            self._seen.add(key)
+            return text
+
+    def ready(self, key: str) -> bool:
+        """get()이 지금 답변을 돌려줄 수 있는지 (통계에는 세지 않음)."""
+        try:
+            return self._backend.llen(self._key(key)) >= self.variants
+        except SharedBackendError:
+            return False
+
+    def put(self, key: str, text: str, latency: float) -> None:
+        """새 답변을 보탭니다. (ResponseCache.put 참고) 여러 복제본이 동시에 넣어 variants개를 조금 넘겨도 앞의 것만 씁니다."""
+        if not text.strip() or self.ready(key):
+            return
+        try:
+            length = self._backend.rpush(self._key(key), json.dumps([text, latency, time.time()], ensure_ascii=False))
+            if length == 1:
+                self._backend.expire(self._key(key), self.ttl)
+        except SharedBackendError:
+            return
+        with self._lock:
+            self._seen.add(key)
+
+    def stats(self) -> dict:
+        """적중/실패 수, 적중률, 캐시로 아낀 응답 시간(초), 이 복제본이 본 키 수 (ResponseCache.stats와 같은 키)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._seen)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
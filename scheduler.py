@@ -0,0 +1,239 @@
+"""
+Gemini 요청 엔진에서 쓰는 프로세스 전체 속도 제한(토큰 버킷)과 세션별 공정 대기열.
+
+학교 전체가 API 키 하나를 함께 쓰므로 수업 시작에 '선택 완료'가 한꺼번에 눌려도
+분당 할당량을 넘지 않도록 요청을 대기열에 세우고, 한 학생이 여러 요청을 쌓아도
+다른 학생이 밀리지 않도록 세션마다 번갈아(round-robin) 내보냅니다.
+
+모든 객체는 엔진 이벤트 루프 스레드에서만 쓰도록 되어 있어 잠금을 쓰지 않습니다.
+(QueueTicket.position만 스크립트 스레드에서 읽습니다)
+앱을 여러 복제본으로 띄우면 분당 제한은 SharedTokenBucket으로 모든 복제본이 함께 셉니다.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from shared_state import SharedBackend, SharedBackendError
+
+
+class TokenBucket:
+    """
+    분당 rate_per_minute개씩 채워지고 최대 burst개까지 모이는 토큰 버킷.
+    rate_per_minute가 0 이하면 제한하지 않습니다.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int) -> None:
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """토큰 하나를 쓸 수 있을 때까지 남은 시간(초). 지금 쓸 수 있으면 0."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """
+        토큰 하나를 가져가고, 실제로 쓸 수 있기까지 기다려야 할 시간(초)을 돌려줍니다.
+        토큰이 없으면 빚을 지므로 뒤에 오는 요청이 그만큼 더 기다립니다.
+        """
+        if self.rate <= 0:
+            return 0.0
+        wait = self.delay()
+        self.tokens -= 1
+        return wait
+
+
+class SharedTokenBucket:
+    """
+    여러 앱 복제본이 공유 저장소(shared_state.SharedBackend)로 함께 쓰는 토큰 버킷. TokenBucket과 같은 인터페이스입니다.
+    학교 전체가 API 키 하나를 쓰므로 복제본이 몇 개든 분당 요청 수를 합쳐서 제한합니다.
+
+    delay()는 지금 보낼 수 있으면 그 자리에서 자리를 잡아 두었다가 다음 reserve()에 넘겨, 요청마다
+    저장소 왕복을 한 번으로 줄입니다. 저장소 호출은 이벤트 루프에서 바로 하므로 가까운 저장소
+    (같은 서버의 SQLite 파일, 같은 망의 Redis)를 전제로 하고, 저장소에 닿지 않으면 이 복제본만의
+    TokenBucket으로 대신 제한합니다.
+    """
+
+    def __init__(self, backend: SharedBackend, key: str, rate_per_minute: float, burst: int) -> None:
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self._backend = backend
+        self._key = key
+        self._held = False  # delay()에서 미리 잡아 둔 자리
+        self._fallback = TokenBucket(rate_per_minute, burst)
+
+    def _reserve(self, debt: bool) -> float:
+        try:
+            return self._backend.rate_reserve(self._key, 1 / self.rate, self.capacity, debt)
+        except SharedBackendError:
+            if debt:
+                return self._fallback.reserve()
+            wait = self._fallback.delay()
+            if wait == 0:
+                self._fallback.reserve()
+            return wait
+
+    def delay(self) -> float:
+        """토큰 하나를 쓸 수 있을 때까지 남은 시간(초). 지금 쓸 수 있으면 자리를 잡아 두고 0."""
+        if self.rate <= 0 or self._held:
+            return 0.0
+        wait = self._reserve(debt=False)
+        self._held = wait == 0
+        return wait
+
+    def reserve(self) -> float:
+        """토큰 하나를 가져가고 기다려야 할 시간(초)을 돌려줍니다. (TokenBucket.reserve 참고)"""
+        if self.rate <= 0:
+            return 0.0
+        if self._held:
+            self._held = False
+            return 0.0
+        return self._reserve(debt=True)
+
+
+class QueueTicket:
+    """
+    요청 하나의 대기표. 스크립트 스레드는 position을 읽어 대기 순서를 보여 줍니다.
+
+    position은 앞에 남은 요청 수(0이면 다음 차례)이고, 차례가 와서 요청을 보내기 시작하면 None입니다.
+    """
+
+    def __init__(self, session: str | None = None) -> None:
+        self.session = session or ""
+        self.position: int | None = None
+        self.enqueued_at = 0.0
+        self._granted: asyncio.Future | None = None
+
+
+class FairScheduler:
+    """
+    동시 요청 수 제한 + 토큰 버킷 속도 제한 + 세션별 공정 대기열.
+
+    자리가 나고 토큰이 있으면 대기 중인 세션을 돌아가며 한 요청씩 내보냅니다.
+    같은 세션의 요청끼리는 들어온 순서를 지킵니다.
+    """
+
+    def __init__(self, max_concurrent: int, bucket: TokenBucket | SharedTokenBucket, wait_samples: int = 1000) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.bucket = bucket
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rate_limited = 0
+        # 세션 → 그 세션의 대기표 목록. 맨 앞 세션이 다음 차례
+        self._queues: OrderedDict[str, deque[QueueTicket]] = OrderedDict()
+        self._waiting = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._waits: deque[float] = deque(maxlen=wait_samples)
+
+    async def acquire(self, ticket: QueueTicket) -> None:
+        """차례가 올 때까지 기다립니다. 끝나면 반드시 release()를 불러야 합니다."""
+        ticket.enqueued_at = time.monotonic()
+        ticket._granted = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(ticket.session, deque()).append(ticket)
+        self._waiting += 1
+        self._dispatch()
+        if ticket._granted.done():
+            return
+        self._renumber()
+        try:
+            await ticket._granted
+        except asyncio.CancelledError:
+            if ticket._granted.done() and not ticket._granted.cancelled():
+                # 차례를 받은 직후 취소됨: 자리를 돌려줌
+                self.release()
+            else:
+                self._remove(ticket)
+            raise
+
+    def release(self) -> None:
+        """요청이 끝났음을 알리고 다음 차례를 내보냅니다."""
+        self.in_flight -= 1
+        self._dispatch()
+
+    async def throttle(self) -> None:
+        """이미 자리를 가진 요청이 재시도할 때 속도 제한만 따릅니다."""
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self.rate_limited += 1
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        """현재/최대 동시 요청 수, 대기열 길이와 대기 세션 수, 대기 시간 p50/p95/최대(초), 속도 제한에 걸린 횟수."""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else 0.0
+
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": self._waiting,
+            "waiting_sessions": len(self._queues),
+            "wait_p50": percentile(0.50),
+            "wait_p95": percentile(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+            "rate_limited": self.rate_limited,
+        }
+
+    # ---------------------------------------------------------------
+    def _dispatch(self) -> None:
+        stalled = self._timer is not None
+        if stalled:
+            self._timer.cancel()
+            self._timer = None
+        granted = False
+        while self._queues and self.in_flight < self.max_concurrent:
+            delay = self.bucket.delay()
+            if delay > 0:
+                if not stalled:
+                    self.rate_limited += 1
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                break
+            session, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self._queues.move_to_end(session)
+            else:
+                del self._queues[session]
+            self._waiting -= 1
+            if ticket._granted.cancelled():
+                # 기다리다 취소된 요청 (취소 처리가 아직 돌기 전)
+                continue
+            self.bucket.reserve()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self._waits.append(time.monotonic() - ticket.enqueued_at)
+            ticket.position = None
+            ticket._granted.set_result(None)
+            granted = True
+        if granted:
+            self._renumber()
+
+    def _remove(self, ticket: QueueTicket) -> None:
+        tickets = self._queues.get(ticket.session)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[ticket.session]
+        self._waiting -= 1
+        self._renumber()
+
+    def _renumber(self) -> None:
+        """돌아가며 내보내는 순서대로 각 대기표의 position을 다시 매깁니다."""
+        lanes = [list(tickets) for tickets in self._queues.values()]
+        position = 0
+        for depth in range(max(map(len, lanes), default=0)):
+            for lane in lanes:
+                if depth < len(lane):
+                    lane[depth].position = position
+                    position += 1
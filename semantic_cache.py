@@ -0,0 +1,244 @@
+"""
+비슷한 학생 질문에 대한 선생님 답변을 재사용하는 의미 캐시 (켜야 동작: GEMINI_SEMANTIC_CACHE=1).
+
+한 반에서는 "가격은 얼마로 해야 해요?", "안전한가요?"처럼 거의 같은 후속 질문이 같은 주제·같은 단계에서 되풀이됩니다.
+응답 캐시(response_cache)는 글자까지 같은 첫 턴만 찾으므로, 여기서는 질문을 가벼운 로컬 임베딩으로 바꿔
+가까운 이웃을 찾습니다.
+
+- 임베딩: 정규화한 글의 글자 2·3-gram을 해시해 부호를 붙여 더한 벡터 (외부 모델 없음, 질문 하나에 1ms 안팎)
+- 지문: 마지막 학생 질문(가중치 0.7) + 바로 앞 선생님 답변(0.2) + 처음 고른 아이디어(0.1)를 이어 붙인 벡터.
+  부분마다 단위 벡터라서 두 지문의 내적은 부분별 코사인 유사도의 가중 평균입니다.
+- 같은 (모델, 프롬프트 버전, 주제, 학생 질문 순서) 칸 안에서만 찾고, 유사도가 threshold 이상인 이웃의 답변을 씁니다.
+- 원래 질문에만 있던 숫자(가격·개수 등)를 답변이 되풀이하면 다른 학생에게 맞지 않으므로 쓰지 않습니다.
+- 통과(pass) 판정이 난 답변은 그 학생이 스스로 고쳐서 받은 칭찬이므로 넣지 않습니다.
+- 평가(루브릭)는 원래 학생의 아이디어를 채점한 것이므로, 재사용할 때는 답변 글만 쓰고 평가는 남기지 않습니다. (gemini_client)
+- TTL이 지나거나 max_entries를 넘으면 가장 오래 쓰지 않은 답변부터 지웁니다.
+
+numpy는 캐시를 켰을 때 처음 쓰는 순간에 가져옵니다. (앱 시작 비용에 더하지 않음)
+복제본마다 따로 두며, 여러 세션(스크립트 스레드)이 함께 쓰므로 모든 접근은 잠금 안에서 이루어집니다.
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 글자 n-gram 크기와 부분마다의 벡터 차원
+NGRAM_SIZES = (2, 3)
+DIMENSIONS = 512
+# 지문 부분별 가중치: 마지막 학생 질문, 바로 앞 선생님 답변, 처음 고른 아이디어
+PART_WEIGHTS = (0.7, 0.2, 0.1)
+# 이웃을 찾을 때 살펴보는 후보 수 (가장 가까운 답변이 숫자 때문에 안 맞으면 다음 후보)
+CANDIDATES = 5
+
+_WORDS = re.compile(r"[^\w]+")
+_NUMBERS = re.compile(r"\d+")
+
+
+def normalize(text: str) -> str:
+    """유니코드 정규화(NFKC)·소문자로 바꾸고 문장 부호를 지워 단어 사이 공백 하나만 남깁니다."""
+    return " ".join(_WORDS.sub(" ", unicodedata.normalize("NFKC", text).lower()).split())
+
+
+def embed_text(text: str) -> "np.ndarray":
+    """글자 n-gram 해시 벡터 (길이 1, 빈 글이면 0 벡터)."""
+    import numpy as np
+
+    padded = f" {normalize(text)} "
+    hashes = [
+        zlib.crc32(padded[i:i + n].encode("utf-8"))
+        for n in NGRAM_SIZES
+        for i in range(len(padded) - n + 1)
+    ]
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    if hashes:
+        hashed = np.array(hashes, dtype=np.uint32)
+        # 아래 비트로 자리를, 맨 위 비트로 부호를 정해 충돌이 서로 상쇄되게 함
+        np.add.at(vector, hashed % DIMENSIONS, np.where(hashed >> 31, 1.0, -1.0).astype(np.float32))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """학생 턴 하나의 지문."""
+
+    stage: int  # 이번이 학생의 몇 번째 질문인지 (첫 턴 = 1)
+    question: str  # 마지막 학생 질문
+    vector: "np.ndarray"
+
+
+def fingerprint(messages: list[dict], max_stage: int) -> Fingerprint | None:
+    """
+    대화 전체(messages, 처음부터)의 마지막 학생 턴 지문. 첫 턴(응답 캐시가 맡음)이거나,
+    마지막이 학생 메시지가 아니거나, max_stage번째보다 뒤의 질문이면 None.
+    """
+    import numpy as np
+
+    history = [m for m in messages if m.get("role") in ("user", "assistant")]
+    if not history or history[-1]["role"] != "user":
+        return None
+    stage = sum(m["role"] == "user" for m in history)
+    if stage < 2 or stage > max_stage:
+        return None
+    question = history[-1].get("content", "")
+    previous = next((m.get("content", "") for m in reversed(history) if m["role"] == "assistant"), "")
+    idea = history[0].get("content", "") if history[0]["role"] == "user" else ""
+    parts = [math.sqrt(weight) * embed_text(text) for weight, text in zip(PART_WEIGHTS, (question, previous, idea))]
+    return Fingerprint(stage, question, np.concatenate(parts))
+
+
+def reusable(evaluation: dict | None) -> bool:
+    """다른 학생에게 다시 보여 줘도 되는 답변인지. 통과 판정(칭찬)은 그 학생만의 것이므로 넣지 않음."""
+    return not evaluation or evaluation.get("verdict") != "pass"
+
+
+def echoes_details(question: str, reply: str, new_question: str) -> bool:
+    """원래 질문에만 있고 새 질문에는 없는 숫자(예: 그 학생이 정한 가격 500원)를 답변이 되풀이하는지."""
+    specific = set(_NUMBERS.findall(question)) - set(_NUMBERS.findall(new_question))
+    return any(number in reply for number in specific)
+
+
+@dataclass
+class _Entry:
+    bucket: tuple
+    row: int  # 칸 행렬에서의 행 번호
+    question: str
+    reply: str  # 숫자 확인용 답변 글
+    raw: str  # 돌려줄 모델 출력 (JSON 형식이면 평가 포함)
+    latency: float
+    created_at: float
+
+
+class _Bucket:
+    """한 칸의 지문 행렬. 행을 지우면 마지막 행을 그 자리로 옮겨 빈틈 없이 유지합니다."""
+
+    def __init__(self, width: int) -> None:
+        import numpy as np
+
+        self.vectors = np.zeros((16, width), dtype=np.float32)
+        self.ids: list[int] = []
+
+    def add(self, entry_id: int, vector: "np.ndarray") -> int:
+        import numpy as np
+
+        row = len(self.ids)
+        if row == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.vectors[row] = vector
+        self.ids.append(entry_id)
+        return row
+
+    def remove(self, row: int) -> int | None:
+        """row를 지우고, 그 자리로 옮긴 항목 번호를 돌려줍니다. (마지막 행이었으면 None)"""
+        last = len(self.ids) - 1
+        moved = None
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = moved = self.ids[last]
+        self.ids.pop()
+        return moved
+
+
+class SemanticCache:
+    """
+    의미 캐시 (TTL + LRU). 칸(bucket)은 부르는 쪽이 정하는 튜플로, 보통 (모델, 프롬프트 버전, 주제, 질문 순서)입니다.
+
+    lookup()이 None을 돌려주면 부르는 쪽이 새 답변을 받아 put()으로 보탭니다.
+    """
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 2000, ttl_seconds: float = 86400) -> None:
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()  # 맨 뒤가 가장 최근에 쓴 답변
+        self._buckets: dict[tuple, _Bucket] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "evictions": 0}
+
+    def lookup(self, bucket: tuple, probe: Fingerprint) -> tuple[str, float] | None:
+        """같은 칸에서 유사도가 threshold 이상인 가장 가까운 답변의 (모델 출력, 유사도). 없으면 None."""
+        import numpy as np
+
+        now = time.time()
+        with self._lock:
+            found = None
+            cells = self._buckets.get(bucket)
+            if cells is not None and cells.ids:
+                similarities = cells.vectors[:len(cells.ids)] @ probe.vector
+                order = np.argsort(-similarities)[:CANDIDATES]
+                candidates = [(cells.ids[row], float(similarities[row])) for row in order]
+                for entry_id, similarity in candidates:
+                    if similarity < self.threshold:
+                        break
+                    entry = self._entries.get(entry_id)
+                    if entry is None:
+                        continue
+                    if now - entry.created_at >= self.ttl:
+                        self._remove(entry_id)
+                        continue
+                    if echoes_details(entry.question, entry.reply, probe.question):
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    found = entry, similarity
+                    break
+            if found is None:
+                self._stats["misses"] += 1
+                return None
+            entry, similarity = found
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += entry.latency
+            return entry.raw, similarity
+
+    def put(self, bucket: tuple, probe: Fingerprint, raw: str, reply: str, latency: float) -> None:
+        """
+        새 답변을 보탭니다.
+
+        Args:
+            bucket: lookup()에 쓴 칸
+            probe: 이 답변을 받은 학생 턴의 지문
+            raw: 다시 돌려줄 모델 출력 (JSON 형식 답변이면 평가 포함)
+            reply: 답변 글 (숫자 확인용)
+            latency: 이 답변을 받는 데 걸린 시간(초). 아낀 시간 계산에 씀
+        """
+        if not reply.strip():
+            return
+        with self._lock:
+            cells = self._buckets.get(bucket)
+            if cells is None:
+                cells = self._buckets[bucket] = _Bucket(len(probe.vector))
+            entry_id = self._next_id
+            self._next_id += 1
+            row = cells.add(entry_id, probe.vector)
+            self._entries[entry_id] = _Entry(bucket, row, probe.question, reply, raw, latency, time.time())
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _remove(self, entry_id: int) -> None:
+        """답변 하나를 지웁니다. (잠금 안에서 부름)"""
+        entry = self._entries.pop(entry_id)
+        cells = self._buckets[entry.bucket]
+        moved = cells.remove(entry.row)
+        if moved is not None:
+            self._entries[moved].row = entry.row
+        if not cells.ids:
+            del self._buckets[entry.bucket]
+
+    def stats(self) -> dict:
+        """적중/실패 수, 적중률, 아낀 응답 시간(초), 보관 중인 답변 수, 밀려난 답변 수, 기준 유사도."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["threshold"] = self.threshold
+        return stats
@@ -0,0 +1,330 @@
+"""
+여러 앱 복제본(프로세스/서버)이 함께 쓰는 공유 저장소.
+
+gemini_chatbot.py를 여러 개 띄워 로드 밸런서 뒤에 두면, 학생의 연결이 어느 복제본으로 가든
+대화(대화 저장소), 첫 답변 캐시, 분당 요청 수 제한을 한곳에서 함께 써야 합니다.
+SHARED_BACKEND_URL로 저장소를 고릅니다.
+
+- redis://host:6379/0 — Redis(또는 Redis 호환 서버). 여러 서버에 나눠 띄울 때 (redis 패키지 필요)
+- sqlite:///경로/shared.db — SQLite 파일. 한 서버에서 여러 프로세스를 띄울 때와 시험용
+- memory:// — 프로세스 안에서만 쓰는 SQLite (개발·시험용, 복제본끼리 공유되지 않음)
+
+SharedBackend는 위 용도에 필요한 Redis 명령만 같은 이름과 의미로 갖추고(값은 모두 문자열),
+분당 요청 수 제한은 원자적으로 처리해야 하므로 rate_reserve() 하나로 묶어 둡니다.
+(Redis는 Lua 스크립트, SQLite는 트랜잭션 하나로 처리)
+"""
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import streamlit as st
+
+from app_config import get_service_settings
+
+
+class SharedBackendError(RuntimeError):
+    """공유 저장소에 접근하지 못했을 때 발생합니다. (연결 끊김, 잠금 시간 초과 등)"""
+
+
+class SharedBackend(ABC):
+    """
+    공유 저장소 인터페이스. 메서드 이름·인자·반환값은 redis-py(decode_responses=True)와 같습니다.
+    lrange의 end는 Redis처럼 끝을 포함하고, 음수는 뒤에서부터 셉니다.
+    """
+
+    @abstractmethod
+    def expire(self, key: str, seconds: float) -> bool:
+        """seconds초 뒤에 키를 지웁니다. (PEXPIRE)"""
+
+    @abstractmethod
+    def rpush(self, key: str, *values: str) -> int:
+        """리스트 끝에 값들을 붙이고 새 길이를 돌려줍니다. (RPUSH)"""
+
+    @abstractmethod
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        """리스트의 start~end(끝 포함) 값들. (LRANGE)"""
+
+    @abstractmethod
+    def llen(self, key: str) -> int:
+        """리스트 길이. 키가 없으면 0. (LLEN)"""
+
+    @abstractmethod
+    def hset(self, key: str, mapping: dict[str, str]) -> int:
+        """해시에 필드들을 쓰고 새로 생긴 필드 수를 돌려줍니다. (HSET)"""
+
+    @abstractmethod
+    def hgetall(self, key: str) -> dict[str, str]:
+        """해시 전체. 키가 없으면 빈 dict. (HGETALL)"""
+
+    @abstractmethod
+    def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        """정렬 집합에 값(점수)들을 넣고 새로 들어간 값 수를 돌려줍니다. (ZADD)"""
+
+    @abstractmethod
+    def zrangebyscore(self, key: str, low: float, high: float) -> list[str]:
+        """점수가 low 이상 high 이하인 값들 (점수 순). (ZRANGEBYSCORE)"""
+
+    @abstractmethod
+    def rate_reserve(self, key: str, interval: float, burst: int, debt: bool = True) -> float:
+        """
+        GCRA 방식 속도 제한. interval초마다 하나씩, 최대 burst개까지 한꺼번에 보낼 수 있는 자리를 하나 잡고
+        실제로 보내기까지 기다려야 할 시간(초)을 돌려줍니다.
+        debt=False이면 지금 바로 보낼 수 있을 때만 자리를 잡고, 아니면 자리를 잡지 않고 기다릴 시간만 돌려줍니다.
+        """
+
+
+# -------------------------------------------------------------------
+# Redis
+# -------------------------------------------------------------------
+# KEYS[1]: 다음 요청의 이론상 도착 시각(TAT), ARGV: interval, 허용 오차(초), debt(1/0)
+# Lua 숫자는 정수로 잘려 돌아오므로 문자열로 돌려줌. 시각은 복제본 시계 대신 Redis 서버 시계를 씀
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local wait = tat - tolerance - now
+if wait < 0 then wait = 0 end
+if wait > 0 and ARGV[3] ~= '1' then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBackend(SharedBackend):
+    """Redis(또는 Redis 호환 서버)를 쓰는 공유 저장소."""
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_BACKEND_URL이 redis://이면 redis 패키지가 필요합니다. (pip install redis)") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2, health_check_interval=30)
+        self._errors = redis.RedisError
+        self._gcra = self._redis.register_script(_GCRA_SCRIPT)
+
+    def _call(self, command, *args, **kwargs):
+        try:
+            return command(*args, **kwargs)
+        except self._errors as e:
+            raise SharedBackendError(f"공유 저장소(Redis) 오류: {e}") from e
+
+    def expire(self, key: str, seconds: float) -> bool:
+        return bool(self._call(self._redis.pexpire, key, int(seconds * 1000)))
+
+    def rpush(self, key: str, *values: str) -> int:
+        return self._call(self._redis.rpush, key, *values)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return self._call(self._redis.lrange, key, start, end)
+
+    def llen(self, key: str) -> int:
+        return self._call(self._redis.llen, key)
+
+    def hset(self, key: str, mapping: dict[str, str]) -> int:
+        return self._call(self._redis.hset, key, mapping=mapping)
+
+    def hgetall(self, key: str) -> dict[str, str]:
+        return self._call(self._redis.hgetall, key)
+
+    def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        return self._call(self._redis.zadd, key, mapping)
+
+    def zrangebyscore(self, key: str, low: float, high: float) -> list[str]:
+        return self._call(self._redis.zrangebyscore, key, low, high)
+
+    def rate_reserve(self, key: str, interval: float, burst: int, debt: bool = True) -> float:
+        tolerance = (max(1, burst) - 1) * interval
+        return float(self._call(self._gcra, keys=[key], args=[interval, tolerance, int(debt)]))
+
+
+# -------------------------------------------------------------------
+# SQLite (한 서버 안의 여러 프로세스 / 시험용)
+# -------------------------------------------------------------------
+class SQLiteBackend(SharedBackend):
+    """
+    SQLite 파일로 Redis 명령을 흉내 내는 공유 저장소. 명령마다 트랜잭션 하나로 처리하므로
+    같은 파일을 여는 여러 프로세스가 함께 써도 됩니다. path가 ":memory:"이면 프로세스 안에서만 씁니다.
+
+    만료된 키는 읽을 때 없는 것으로 보고, 쓸 때 그 키를 지우며, 가끔 한꺼번에 정리합니다.
+    """
+
+    # 쓰기 이만큼마다 만료된 키를 한꺼번에 정리
+    SWEEP_EVERY = 1000
+    _TABLES = ("kv", "items", "fields", "members")
+
+    def __init__(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS items ("
+                "key TEXT NOT NULL, idx INTEGER NOT NULL, value TEXT NOT NULL, PRIMARY KEY (key, idx)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS fields ("
+                "key TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (key, field)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS members ("
+                "key TEXT NOT NULL, member TEXT NOT NULL, score REAL NOT NULL, PRIMARY KEY (key, member)) WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS members_score ON members (key, score);"
+                "CREATE TABLE IF NOT EXISTS expiry (key TEXT PRIMARY KEY, at REAL NOT NULL) WITHOUT ROWID;"
+            )
+
+    @contextmanager
+    def _transaction(self, write: bool) -> Iterator[sqlite3.Connection]:
+        """잠금과 트랜잭션 하나. 쓰기는 BEGIN IMMEDIATE로 다른 프로세스의 쓰기와 겹치지 않게 합니다."""
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                try:
+                    yield self._db
+                    if write:
+                        self._writes += 1
+                        if self._writes % self.SWEEP_EVERY == 0:
+                            self._sweep()
+                    self._db.execute("COMMIT")
+                finally:
+                    if self._db.in_transaction:
+                        self._db.execute("ROLLBACK")
+            except sqlite3.Error as e:
+                raise SharedBackendError(f"공유 저장소(SQLite) 오류: {e}") from e
+
+    def _sweep(self) -> None:
+        now = time.time()
+        for table in self._TABLES:
+            self._db.execute(f"DELETE FROM {table} WHERE key IN (SELECT key FROM expiry WHERE at <= ?)", (now,))
+        self._db.execute("DELETE FROM expiry WHERE at <= ?", (now,))
+
+    def _expired(self, db: sqlite3.Connection, key: str) -> bool:
+        row = db.execute("SELECT at FROM expiry WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] <= time.time()
+
+    def _purge(self, db: sqlite3.Connection, key: str) -> None:
+        """쓰기 전에 만료된 키를 지웁니다. (Redis처럼 만료된 키에 쓰면 새 키가 됨)"""
+        if self._expired(db, key):
+            for table in self._TABLES:
+                db.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+            db.execute("DELETE FROM expiry WHERE key = ?", (key,))
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._transaction(write=True) as db:
+            self._purge(db, key)
+            exists = any(
+                db.execute(f"SELECT 1 FROM {table} WHERE key = ? LIMIT 1", (key,)).fetchone()
+                for table in self._TABLES
+            )
+            if exists:
+                db.execute("INSERT OR REPLACE INTO expiry (key, at) VALUES (?, ?)", (key, time.time() + seconds))
+            return exists
+
+    def rpush(self, key: str, *values: str) -> int:
+        with self._transaction(write=True) as db:
+            self._purge(db, key)
+            (start,) = db.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM items WHERE key = ?", (key,)).fetchone()
+            db.executemany(
+                "INSERT INTO items (key, idx, value) VALUES (?, ?, ?)",
+                [(key, start + i, value) for i, value in enumerate(values)],
+            )
+            return start + len(values)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        with self._transaction(write=False) as db:
+            if self._expired(db, key):
+                return []
+            if start < 0 or end < 0:
+                (length,) = db.execute("SELECT COUNT(*) FROM items WHERE key = ?", (key,)).fetchone()
+                start = max(0, start + length) if start < 0 else start
+                end = end + length if end < 0 else end
+            rows = db.execute(
+                "SELECT value FROM items WHERE key = ? AND idx >= ? AND idx <= ? ORDER BY idx", (key, start, end)
+            ).fetchall()
+        return [value for (value,) in rows]
+
+    def llen(self, key: str) -> int:
+        with self._transaction(write=False) as db:
+            if self._expired(db, key):
+                return 0
+            return db.execute("SELECT COUNT(*) FROM items WHERE key = ?", (key,)).fetchone()[0]
+
+    def hset(self, key: str, mapping: dict[str, str]) -> int:
+        with self._transaction(write=True) as db:
+            self._purge(db, key)
+            added = 0
+            for field, value in mapping.items():
+                added += db.execute("SELECT 1 FROM fields WHERE key = ? AND field = ?", (key, field)).fetchone() is None
+                db.execute(
+                    "INSERT OR REPLACE INTO fields (key, field, value) VALUES (?, ?, ?)", (key, field, str(value))
+                )
+            return added
+
+    def hgetall(self, key: str) -> dict[str, str]:
+        with self._transaction(write=False) as db:
+            if self._expired(db, key):
+                return {}
+            return dict(db.execute("SELECT field, value FROM fields WHERE key = ?", (key,)).fetchall())
+
+    def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        with self._transaction(write=True) as db:
+            self._purge(db, key)
+            added = 0
+            for member, score in mapping.items():
+                added += db.execute("SELECT 1 FROM members WHERE key = ? AND member = ?", (key, member)).fetchone() is None
+                db.execute(
+                    "INSERT OR REPLACE INTO members (key, member, score) VALUES (?, ?, ?)", (key, member, score)
+                )
+            return added
+
+    def zrangebyscore(self, key: str, low: float, high: float) -> list[str]:
+        with self._transaction(write=False) as db:
+            if self._expired(db, key):
+                return []
+            rows = db.execute(
+                "SELECT member FROM members WHERE key = ? AND score >= ? AND score <= ? ORDER BY score, member",
+                (key, low, high),
+            ).fetchall()
+        return [member for (member,) in rows]
+
+    def rate_reserve(self, key: str, interval: float, burst: int, debt: bool = True) -> float:
+        tolerance = (max(1, burst) - 1) * interval
+        with self._transaction(write=True) as db:
+            self._purge(db, key)
+            now = time.time()
+            row = db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            tat = max(now, float(row[0])) if row else now
+            wait = max(0.0, tat - tolerance - now)
+            if wait > 0 and not debt:
+                return wait
+            db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, repr(tat + interval)))
+            db.execute(
+                "INSERT OR REPLACE INTO expiry (key, at) VALUES (?, ?)", (key, now + math.ceil(tat + interval - now) + 1)
+            )
+            return wait
+
+
+def create_backend(url: str) -> SharedBackend:
+    """주소(redis://, rediss://, sqlite:///경로, memory://)에 맞는 공유 저장소를 만듭니다."""
+    if not url:
+        raise ValueError("공유 저장소를 쓰려면 SHARED_BACKEND_URL을 설정해야 합니다.")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith("memory://"):
+        return SQLiteBackend(":memory:")
+    raise ValueError(f"알 수 없는 공유 저장소 주소입니다: {url!r} (redis:// / sqlite:/// / memory://)")
+
+
+@st.cache_resource
+def get_shared_backend() -> SharedBackend | None:
+    """프로세스 전체에서 쓰는 공유 저장소. SHARED_BACKEND_URL을 비웠으면 None."""
+    url = get_service_settings().storage.shared_backend_url
+    return create_backend(url) if url else None
@@ -0,0 +1,35 @@
+"""
+선생님 전용 페이지(대시보드, 관리자 통계)의 비밀번호 확인.
+
+TEACHER_PASSWORD를 설정했다면 비밀번호를 한 번 입력해야 페이지를 볼 수 있고,
+확인되면 같은 세션에서는 다른 선생님 페이지도 다시 묻지 않습니다.
+"""
+import hmac
+
+import streamlit as st
+
+from app_config import get_settings
+
+
+def load_teacher_password() -> str | None:
+    """st.secrets 또는 .env의 TEACHER_PASSWORD (app_config에서 프로세스에 한 번만 읽음)."""
+    return get_settings().teacher_password
+
+
+def require_teacher(unprotected_warning: str) -> None:
+    """
+    비밀번호가 확인될 때까지 페이지 실행을 멈춥니다.
+
+    Args:
+        unprotected_warning: TEACHER_PASSWORD가 없어 누구나 볼 수 있을 때 띄울 경고
+    """
+    teacher_password = load_teacher_password()
+    if teacher_password and not st.session_state.get("teacher_unlocked"):
+        entered = st.text_input("선생님 비밀번호", type="password")
+        if not hmac.compare_digest(entered.encode("utf-8"), teacher_password.encode("utf-8")):
+            if entered:
+                st.error("비밀번호가 맞지 않습니다.")
+            st.stop()
+        st.session_state.teacher_unlocked = True
+    elif not teacher_password:
+        st.warning(unprotected_warning)
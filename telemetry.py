@@ -0,0 +1,255 @@
+"""
+Gemini 호출 계측: 호출마다 대기열 대기·연결·첫 응답·전체 시간, 시도 횟수, 상태 코드,
+프롬프트/응답 토큰 수와 카테고리를 기록합니다.
+
+엔진(gemini_engine)이 호출 하나가 끝날 때마다 CallTrace를 Telemetry.record()로 넘기면
+- 최근 호출 표본을 메모리에 두어 관리자 페이지에서 p50/p95/p99와 토큰 사용량을 보여 주고,
+- Prometheus 텍스트 형식 지표(카운터 + 히스토그램)를 쌓아 GEMINI_METRICS_PORT의 /metrics로 내보내고,
+- GEMINI_TRACE_PATH를 정하면 호출마다 JSON 한 줄씩 파일에 남깁니다.
+
+기록은 엔진 루프 스레드에서, 조회는 스크립트 스레드에서 하므로 모든 접근은 잠금 안에서 이루어집니다.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING
+
+from app_config import TelemetrySettings, get_service_settings
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+# 시간 히스토그램 구간(초)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+# 히스토그램으로 내보내는 시간 항목
+PHASES = ("queue_wait", "connect", "ttfb", "total")
+
+
+@dataclass
+class CallTrace:
+    """
+    Gemini 호출 하나의 계측 기록. 호출한 쪽이 kind/category를 정해 넘기고 나머지는 엔진이 채웁니다.
+
+    시간은 모두 초 단위입니다. queue_wait는 공정 대기열에서 기다린 시간, connect는 새 연결(TCP+TLS)을
+    맺는 데 쓴 시간(연결을 재사용했으면 0), ttfb는 차례가 온 뒤 마지막 시도의 응답 헤더를 받기까지
+    (재시도 대기 포함), total은 차례가 온 뒤 응답을 끝까지 받기까지입니다.
+    헤지 요청이 이기면 상태 코드·연결·첫 응답 시간은 헤지 요청의 값이고, attempts는 두 요청의 시도를 더한 값입니다.
+    """
+
+    kind: str = "other"  # generate / stream / summary / prefetch / batch / other
+    category: str = ""
+    route: str = ""  # opener / mentoring / summary (model_router 참고)
+    model: str = ""  # 응답을 돌려준 모델
+    key: str = ""  # 쓴 API 키의 이름 (key_label, 키 자체는 남기지 않음)
+    started_at: float = field(default_factory=time.time)
+    request_bytes: int = 0
+    queue_wait: float = 0.0
+    connect: float = 0.0
+    ttfb: float | None = None
+    total: float = 0.0
+    attempts: int = 0
+    failovers: int = 0  # 과부하로 다음 모델로 넘어간 횟수
+    hedge: str = ""  # 헤지 요청: "" 안 보냄 / "sent" 보냈지만 첫 요청이 이김 / "won" 헤지 요청이 이김
+    status: int | None = None  # 마지막 시도의 HTTP 상태 코드 (응답을 못 받았으면 None)
+    outcome: str = "ok"  # ok / error / cancelled
+    error: str = ""
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    thoughts_tokens: int = 0
+    total_tokens: int = 0
+
+    def use_usage(self, usage: dict | None) -> None:
+        """Gemini 응답의 usageMetadata를 반영합니다. (스트리밍은 마지막 값이 전체)"""
+        if not usage:
+            return
+        self.prompt_tokens = usage.get("promptTokenCount", self.prompt_tokens)
+        self.response_tokens = usage.get("candidatesTokenCount", self.response_tokens)
+        self.thoughts_tokens = usage.get("thoughtsTokenCount", self.thoughts_tokens)
+        self.total_tokens = usage.get("totalTokenCount", self.total_tokens)
+
+
+def key_label(api_key: str) -> str:
+    """기록·화면에 키 대신 남기는 짧은 이름. 키의 해시 앞부분이라 원래 키를 알 수 없습니다."""
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """정렬된 values의 p 백분위 값 (0 ≤ p ≤ 1). 비어 있으면 0."""
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def _labels(**labels: object) -> str:
+    """Prometheus 레이블 문자열 {a="1",b="2"}."""
+
+    def escape(value: object) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Telemetry:
+    """Gemini 호출 기록 모음. 최근 표본 + Prometheus 지표 + JSONL 추적 파일."""
+
+    def __init__(self, samples: int = 5000, trace_path: str = "") -> None:
+        self._lock = threading.Lock()
+        self._recent: deque[CallTrace] = deque(maxlen=max(1, samples))
+        # (kind, category, model, outcome, status) → 호출 수
+        self._calls: defaultdict[tuple, int] = defaultdict(int)
+        # (kind, category) → 시도 수 / 토큰 종류별 합계
+        self._attempts: defaultdict[tuple, int] = defaultdict(int)
+        # (kind, category) → 다른 모델로 넘어간 수 / (kind, category, "sent"|"won") → 헤지 요청 수
+        self._failovers: defaultdict[tuple, int] = defaultdict(int)
+        self._hedges: defaultdict[tuple, int] = defaultdict(int)
+        self._tokens: defaultdict[tuple, int] = defaultdict(int)
+        # (kind, model, phase) → [구간별 개수..., 합계, 개수]
+        self._histograms: dict[tuple, list[float]] = {}
+        self._trace_file = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+        self._server: "ThreadingHTTPServer | None" = None
+
+    def record(self, call: CallTrace) -> None:
+        """호출 하나를 기록합니다."""
+        key = (call.kind, call.category)
+        with self._lock:
+            self._recent.append(call)
+            self._calls[(*key, call.model, call.outcome, str(call.status or ""))] += 1
+            self._failovers[key] += call.failovers
+            if call.hedge:
+                self._hedges[(*key, call.hedge)] += 1
+            self._attempts[key] += call.attempts
+            self._tokens[(*key, "prompt")] += call.prompt_tokens
+            self._tokens[(*key, "response")] += call.response_tokens
+            self._tokens[(*key, "thoughts")] += call.thoughts_tokens
+            for phase in PHASES:
+                value = getattr(call, phase)
+                if value is None:
+                    continue
+                histogram = self._histograms.setdefault(
+                    (call.kind, call.model, phase), [0.0] * (len(DURATION_BUCKETS) + 2)
+                )
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    if value <= bound:
+                        histogram[i] += 1
+                histogram[-2] += value
+                histogram[-1] += 1
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps(asdict(call), ensure_ascii=False) + "\n")
+
+    def recent(self) -> list[CallTrace]:
+        """최근 호출 기록 (오래된 순)."""
+        with self._lock:
+            return list(self._recent)
+
+    def summary(self, calls: list[CallTrace] | None = None) -> dict:
+        """
+        호출 수, 오류/취소 수, 평균 시도 횟수, 다른 모델로 넘어간 호출 수, 헤지 요청을 보낸/이긴 호출 수,
+        시간 항목별 p50/p95/p99(초), 토큰 합계.
+        calls를 넘기지 않으면 최근 호출 전체로 계산합니다.
+        """
+        calls = self.recent() if calls is None else calls
+        done = [c for c in calls if c.outcome == "ok"]
+        summary = {
+            "calls": len(calls),
+            "errors": sum(c.outcome == "error" for c in calls),
+            "cancelled": sum(c.outcome == "cancelled" for c in calls),
+            "retried": sum(c.attempts > 1 for c in calls),
+            "avg_attempts": sum(c.attempts for c in calls) / len(calls) if calls else 0.0,
+            "failed_over": sum(c.failovers > 0 for c in calls),
+            "hedged": sum(bool(c.hedge) for c in calls),
+            "hedge_won": sum(c.hedge == "won" for c in calls),
+            "prompt_tokens": sum(c.prompt_tokens for c in calls),
+            "response_tokens": sum(c.response_tokens for c in calls),
+            "thoughts_tokens": sum(c.thoughts_tokens for c in calls),
+            "total_tokens": sum(c.total_tokens for c in calls),
+        }
+        for phase in PHASES:
+            values = sorted(v for c in done if (v := getattr(c, phase)) is not None)
+            for p in (50, 95, 99):
+                summary[f"{phase}_p{p}"] = percentile(values, p / 100)
+        return summary
+
+    def prometheus_text(self) -> str:
+        """지금까지의 지표를 Prometheus 텍스트 형식으로 돌려줍니다."""
+        lines = [
+            "# HELP gemini_calls_total Gemini API 호출 수",
+            "# TYPE gemini_calls_total counter",
+        ]
+        with self._lock:
+            calls = dict(self._calls)
+            attempts = dict(self._attempts)
+            failovers = dict(self._failovers)
+            hedges = dict(self._hedges)
+            tokens = dict(self._tokens)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        for (kind, category, model, outcome, status), count in sorted(calls.items()):
+            labels = _labels(kind=kind, category=category, model=model, outcome=outcome, status=status)
+            lines.append(f"gemini_calls_total{labels} {count}")
+        lines += ["# HELP gemini_call_attempts_total 재시도를 포함한 시도 수", "# TYPE gemini_call_attempts_total counter"]
+        for (kind, category), count in sorted(attempts.items()):
+            lines.append(f"gemini_call_attempts_total{_labels(kind=kind, category=category)} {count}")
+        lines += ["# HELP gemini_failovers_total 과부하로 다음 모델로 넘어간 수", "# TYPE gemini_failovers_total counter"]
+        for (kind, category), count in sorted(failovers.items()):
+            lines.append(f"gemini_failovers_total{_labels(kind=kind, category=category)} {count}")
+        lines += ["# HELP gemini_hedges_total 헤지 요청 수 (result=won이면 헤지 요청이 먼저 옴)", "# TYPE gemini_hedges_total counter"]
+        for (kind, category, result), count in sorted(hedges.items()):
+            lines.append(f"gemini_hedges_total{_labels(kind=kind, category=category, result=result)} {count}")
+        lines += ["# HELP gemini_tokens_total usageMetadata 토큰 수", "# TYPE gemini_tokens_total counter"]
+        for (kind, category, token_type), count in sorted(tokens.items()):
+            lines.append(f"gemini_tokens_total{_labels(kind=kind, category=category, type=token_type)} {count}")
+        lines += ["# HELP gemini_call_seconds 호출 단계별 시간(초)", "# TYPE gemini_call_seconds histogram"]
+        for (kind, model, phase), histogram in sorted(histograms.items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(
+                    f"gemini_call_seconds_bucket{_labels(kind=kind, model=model, phase=phase, le=bound)} {count:g}"
+                )
+            lines.append(
+                f"gemini_call_seconds_bucket{_labels(kind=kind, model=model, phase=phase, le='+Inf')} {histogram[-1]:g}"
+            )
+            lines.append(f"gemini_call_seconds_sum{_labels(kind=kind, model=model, phase=phase)} {histogram[-2]}")
+            lines.append(f"gemini_call_seconds_count{_labels(kind=kind, model=model, phase=phase)} {histogram[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int) -> None:
+        """백그라운드 스레드에서 http://0.0.0.0:port/metrics 로 지표를 내보냅니다."""
+        # 포트를 정했을 때만 필요하므로 여기서 가져옴
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="gemini-metrics", daemon=True).start()
+
+
+def create_telemetry(config: TelemetrySettings | None = None) -> Telemetry:
+    """설정(기본은 app_config의 계측 설정)대로 계측기를 만들고, 포트를 정했으면 /metrics를 엽니다."""
+    config = config or get_service_settings().telemetry
+    telemetry = Telemetry(config.samples, config.trace_path)
+    if config.metrics_port:
+        try:
+            telemetry.serve(config.metrics_port)
+        except OSError as e:
+            # 다른 프로세스가 이미 포트를 쓰는 경우 등: 지표 서버 없이 계속
+            logger.warning("/metrics 포트 %s를 열지 못했습니다: %s", config.metrics_port, e)
+    return telemetry
@@ -0,0 +1,212 @@
+"""
+일괄 피드백 (명령줄): 반 전체가 낸 아이디어에 선생님 피드백을 미리 받아 상담 일지 형식으로 씁니다.
+
+    python tools/batch_feedback.py 아이디어.csv --out 피드백.zip
+    python tools/batch_feedback.py 아이디어.jsonl --out 피드백.csv --format csv --concurrency 16
+
+입력은 학생마다 한 줄인 CSV(첫 줄은 열 이름, 엑셀에서 저장한 BOM도 됨) 또는 JSONL이고,
+student(학생)·category(주제)·idea(아이디어) 열을 읽습니다. 주제가 빈 줄은 --category를 씁니다.
+
+요청은 앱과 같은 시스템 프롬프트·요청 형식(build_gemini_payload)으로 앱과 같은 요청 엔진에 올리므로
+분당 제한(GEMINI_RATE_LIMIT_RPM)·재시도·모델 전환이 그대로 적용되고, --concurrency개까지만 동시에 보냅니다.
+--api-key를 주지 않으면 앱처럼 요청마다 학교 키 묶음(GOOGLE_API_KEY·GEMINI_API_KEYS)에서 키를 골라 나눠 보냅니다.
+끝난 학생은 바로 체크포인트 파일(기본: 출력 경로.checkpoint.jsonl)에 한 줄씩 남기므로,
+도중에 멈추거나 일부가 실패해도 같은 명령을 다시 실행하면 남은 학생만 요청합니다.
+결과는 대시보드 내보내기와 같은 형식(학생별 TXT 묶음 ZIP·JSONL·CSV)에 학생 이름을 붙여 씁니다.
+
+--stub을 주면 로컬 스텁 서버(tools/stub_gemini.py)를 띄워 할당량을 쓰지 않고 돌려 봅니다.
+(--latency, --error-503, --error-429 등으로 느린 응답과 과부하를 넣어 재시도·체크포인트를 확인)
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_config import load_environment  # noqa: E402
+from stub_gemini import add_config_arguments, config_from_args, start_stub_server  # noqa: E402
+
+# 입력 열 이름 (영문 또는 한글)
+COLUMNS = {
+    "student": ("student", "학생", "이름"),
+    "category": ("category", "주제", "탐구 주제"),
+    "idea": ("idea", "아이디어", "내용"),
+}
+
+
+def read_rows(path: str, default_category: str) -> list[dict]:
+    """입력 파일(CSV/JSONL)을 읽어 {"key", "student", "category", "idea"} 목록으로 돌려줍니다. 아이디어가 빈 줄은 뺍니다."""
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            records = [json.loads(line) for line in file if line.strip()]
+        else:
+            records = list(csv.DictReader(file))
+    rows = []
+    for number, record in enumerate(records, start=1):
+        row = {
+            name: next((str(record[alias]).strip() for alias in aliases if record.get(alias)), "")
+            for name, aliases in COLUMNS.items()
+        }
+        row["category"] = row["category"] or default_category
+        if not row["idea"]:
+            print(f"  {number}번째 줄: 아이디어가 비어 있어 건너뜀")
+            continue
+        row["student"] = row["student"] or f"학생 {number}"
+        # 같은 학생·주제·아이디어는 같은 키: 다시 실행할 때 이미 받은 피드백을 알아봄
+        row["key"] = hashlib.sha256(f"{row['student']}\0{row['category']}\0{row['idea']}".encode("utf-8")).hexdigest()[:16]
+        rows.append(row)
+    return rows
+
+
+def load_checkpoint(path: str) -> dict[str, dict]:
+    """체크포인트 파일에서 끝난 학생들(키 → 결과)을 읽습니다. 쓰다가 끊긴 마지막 줄은 무시합니다."""
+    done: dict[str, dict] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            done[record["key"]] = record
+    return done
+
+
+def request_body(row: dict) -> bytes:
+    """앱의 대화 요청과 같은 형식: 학생 메시지 하나 + 주제별 시스템 프롬프트 (+ 구조화된 평가 형식)."""
+    from gemini_client import build_gemini_payload, encode_payload
+
+    return encode_payload(build_gemini_payload([{"role": "user", "content": row["idea"]}], row["category"]))
+
+
+def reply_text(data: dict) -> str:
+    try:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError) as e:
+        raise RuntimeError(f"Gemini 응답 파싱 중 오류가 발생했습니다: {e}") from e
+
+
+def run(rows: list[dict], checkpoint: str, api_key: str | None, concurrency: int) -> dict[str, dict]:
+    """
+    남은 학생들의 피드백을 concurrency개씩 동시에 요청하고, 끝나는 대로 체크포인트에 덧붙입니다.
+    api_key가 None이면 요청마다 키 관리자(key_manager)가 학교 키를 골라 줍니다.
+    """
+    from evaluation import parse_reply
+    from gemini_engine import get_engine
+    from key_manager import get_key_manager
+    from model_router import MENTORING_ROUTE
+    from telemetry import CallTrace
+
+    done = load_checkpoint(checkpoint)
+    todo = list({row["key"]: row for row in rows if row["key"] not in done}.values())
+    requested = len(todo)
+    print(f"학생 {len(rows)}명 중 {len(rows) - len(todo)}명은 이미 끝남 → {requested}명 요청")
+    engine = get_engine()
+    path, *fallbacks = MENTORING_ROUTE.paths("generateContent")
+    pending: dict = {}
+    failed = 0
+    started = time.perf_counter()
+    with open(checkpoint, "a", encoding="utf-8") as out:
+        while todo or pending:
+            while todo and len(pending) < concurrency:
+                row = todo.pop(0)
+                call = CallTrace(kind="batch", category=row["category"], route=MENTORING_ROUTE.name)
+                key = api_key or get_key_manager().pick()
+                future = engine.submit_json(path, request_body(row), key, "batch", call, fallbacks)
+                pending[future] = row
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = pending.pop(future)
+                try:
+                    reply, evaluation = parse_reply(reply_text(future.result()))
+                except RuntimeError as e:
+                    # 실패한 학생은 체크포인트에 남기지 않음: 다시 실행하면 또 요청
+                    failed += 1
+                    print(f"  {row['student']}: 실패 ({e})")
+                    continue
+                record = {**row, "reply": reply, "evaluation": evaluation, "finished_at": time.time()}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done[row["key"]] = record
+                print(f"  {len(done)}/{len(rows)} {row['student']}")
+    print(f"요청 {requested}건 중 실패 {failed}건, {time.perf_counter() - started:.1f}초")
+    if api_key is None and requested:
+        print("키별 요청: " + " · ".join(f"{key['key']} {key['picks']}건" for key in get_key_manager().stats()))
+    return done
+
+
+def write_output(rows: list[dict], done: dict[str, dict], out_path: str, fmt: str) -> int:
+    """끝난 학생들을 입력 순서대로 상담 일지 형식으로 씁니다. 쓴 학생 수를 돌려줍니다."""
+    from conversation_store import MemoryConversationStore
+    from log_export import iter_export
+
+    store = MemoryConversationStore()
+    sessions = []
+    for row in rows:
+        record = done.get(row["key"])
+        if record is None:
+            continue
+        session_id = store.create_session(row["category"])
+        store.append(session_id, "user", row["idea"])
+        store.append(session_id, "assistant", record["reply"], record["evaluation"])
+        sessions.append(
+            {**store.get_session(session_id), "created_at": record["finished_at"], "student": row["student"]}
+        )
+    with open(out_path, "wb") as out:
+        for chunk in iter_export(store, sessions, fmt, with_student=True):
+            out.write(chunk)
+    return len(sessions)
+
+
+def main() -> None:
+    load_environment()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="학생별 아이디어 파일 (.csv 또는 .jsonl)")
+    parser.add_argument("--out", required=True, help="저장할 파일 경로")
+    parser.add_argument("--format", help="출력 형식 zip / jsonl / csv (기본: --out 확장자, 없으면 zip)")
+    parser.add_argument("--category", default="🏫 학교 생활 개선", help="주제 열이 빈 학생의 탐구 주제")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시에 보낼 최대 요청 수")
+    parser.add_argument("--checkpoint", help="진행 상황 파일 (기본: 출력 경로.checkpoint.jsonl)")
+    parser.add_argument(
+        "--api-key", help="모든 요청에 쓸 Gemini API 키 (기본: 요청마다 학교 키 묶음 GOOGLE_API_KEY·GEMINI_API_KEYS에서 고름)"
+    )
+    parser.add_argument("--stub", action="store_true", help="로컬 스텁 서버를 상대로 돌려 봄 (아래 지연·오류 옵션 사용)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    if args.stub:
+        server = start_stub_server(config_from_args(args))
+        os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+        # 학교 키가 없어도 키 나눠 주기까지 돌려 보도록 스텁용 키 묶음
+        os.environ.setdefault("GEMINI_API_KEYS", "stub-key-0,stub-key-1")
+
+    # 앱 모듈은 가져올 때 설정(GEMINI_BASE_URL 등)을 읽으므로 스텁 서버 주소를 정한 뒤에 가져옴
+    from key_manager import get_key_manager
+    from log_export import EXPORT_FORMATS
+
+    if not args.api_key and not get_key_manager().keys:
+        parser.error("API 키가 필요합니다. .env 파일에 GOOGLE_API_KEY 또는 GEMINI_API_KEYS를 설정하거나 --api-key로 주세요.")
+
+    if args.format and args.format not in EXPORT_FORMATS:
+        parser.error(f"출력 형식은 {' / '.join(EXPORT_FORMATS)} 중 하나여야 합니다: {args.format}")
+
+    fmt = args.format or Path(args.out).suffix.lstrip(".")
+    fmt = fmt if fmt in EXPORT_FORMATS else "zip"
+    checkpoint = args.checkpoint or f"{args.out}.checkpoint.jsonl"
+    rows = read_rows(args.input, args.category)
+    done = run(rows, checkpoint, args.api_key, max(1, args.concurrency))
+    written = write_output(rows, done, args.out, fmt)
+    print(f"학생 {written}명의 피드백 → {args.out}")
+    if written < len(rows):
+        print(f"{len(rows) - written}명은 아직 피드백이 없습니다. 같은 명령을 다시 실행하면 남은 학생만 요청합니다.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+로컬 스텁 서버를 상대로 '요청마다 새 연결'과 '공유 연결 풀'을 비교하는 벤치마크.
+
+    python tools/bench_http_pool.py --requests 200 --concurrency 8
+
+스텁 서버가 실제로 받아들인 TCP 연결 수를 세므로, 연결 풀을 쓰면 핸드셰이크가
+요청 수가 아니라 동시 접속 수만큼만 일어나는 것을 확인할 수 있습니다.
+같은 첫 메시지를 되풀이해 보내므로 응답 캐시·첫 답변 미리 요청·의미 캐시는 끄고 재며,
+서버가 받은 요청 수가 보낸 요청 수와 다르면 실패로 끝납니다.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_gemini import StubServer, start_stub_server  # noqa: E402
+
+
+def run(label: str, call, total: int, concurrency: int, server: StubServer) -> bool:
+    """call을 total번 보내고 결과를 한 줄로 출력합니다. 서버가 받은 요청 수가 total과 같으면 True."""
+    before = server.stats()
+    latencies: list[float] = []
+
+    def timed_call(_: int) -> None:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_call, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    after = server.stats()
+    received = after.get("requests", 0) - before.get("requests", 0)
+    print(
+        f"{label:<10} 요청 {total}회 · 처리량 {total / elapsed:7.1f}/s · "
+        f"p50 {statistics.median(latencies) * 1000:6.2f}ms · p95 {p95 * 1000:6.2f}ms · "
+        f"서버가 받은 요청 {received}건 · 새 연결 {after.get('connections', 0) - before.get('connections', 0)}개"
+    )
+    if received != total:
+        print(f"  서버가 받은 요청이 보낸 요청({total}회)과 다릅니다. 캐시 등에서 답한 호출은 연결 재사용을 재지 못합니다.")
+    return received == total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    # 매번 같은 첫 메시지이므로 캐시와 미리 요청을 끄지 않으면 서버까지 가지 않고 답함
+    os.environ["GEMINI_RESPONSE_CACHE"] = "0"
+    os.environ["GEMINI_SPECULATION"] = "0"
+    os.environ["GEMINI_SEMANTIC_CACHE"] = "0"
+
+    # 환경 변수를 바꾼 뒤에 가져와야 함
+    import gemini_client
+    import gemini_engine
+    from app_config import get_service_settings
+
+    messages = [{"role": "user", "content": "저는 🎨 만들기/공예 관련 아이디어를 생각해보고 싶어요."}]
+    category = "🏫 학교 생활 개선"
+    payload = gemini_client.build_gemini_payload(messages, category)
+    url = f"{get_service_settings().engine.base_url}/models/{gemini_client.GEMINI_MODEL}:generateContent"
+
+    def unpooled_call() -> None:
+        # 기존 requests.post 방식처럼 요청마다 새 연결을 맺음
+        resp = httpx.post(
+            url,
+            headers={"Content-Type": "application/json", "x-goog-api-key": "bench"},
+            content=json.dumps(payload),
+        )
+        resp.json()
+
+    def pooled_call() -> None:
+        gemini_client.call_gemini(messages, category, "bench")
+
+    ok = run("새 연결", unpooled_call, args.requests, args.concurrency, server)
+    ok = run("연결 풀", pooled_call, args.requests, args.concurrency, server) and ok
+    print(f"연결 풀 통계: {gemini_engine.get_engine().stats()}")
+    server.shutdown()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
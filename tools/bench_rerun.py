@@ -0,0 +1,143 @@
+"""
+Streamlit rerun 비용 벤치마크: 대화가 10/50/100개 쌓였을 때 rerun 한 번의 서버 CPU 시간과 보내는 바이트 수.
+
+    python tools/bench_rerun.py --messages 10 50 100 --repeat 5
+
+Streamlit AppTest로 gemini_chatbot.py를 실행하고, 스크립트가 브라우저로 보내는 ForwardMsg의
+직렬화 크기를 더해 '보내는 바이트'로 셉니다. (선생님 답변은 로컬 스텁 서버가 바로 돌려줌)
+
+- 전체 rerun: 사이드바 조작처럼 스크립트 전체가 다시 실행되는 경우
+- 질문 한 번: 학생이 채팅 입력으로 질문하고 답변을 받는 경우. 채팅 영역이 st.fragment이면
+  그 fragment만 다시 실행합니다.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from stub_gemini import start_stub_server
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TEACHER_REPLY = (
+    "좋습니다. 아이디어의 취지는 아주 좋아요. 다만 초등학생이 만들기에는 재료비가 조금 비쌀 수 있겠네요. "
+    "어떤 재료로 바꾸면 가격을 낮출 수 있을까요? 안전한 재료인지도 함께 생각해 봅시다."
+)
+STUDENT_MESSAGE = "재활용 종이로 스티커를 만들면 한 장에 백 원 정도면 될 것 같아요."
+
+
+def patch_runner(sent: list[int]) -> dict:
+    """
+    AppTest가 쓰는 LocalScriptRunner를 감싸서 실행마다 보낸 ForwardMsg 크기를 sent에 남기고,
+    control["fragment_ids"]가 있으면 전체 스크립트 대신 그 fragment만 다시 실행하게 합니다.
+    """
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+    from streamlit.testing.v1 import local_script_runner
+
+    control: dict = {"fragment_ids": None}
+    original_run = local_script_runner.LocalScriptRunner.run
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        if control["fragment_ids"]:
+            # LocalScriptRunner는 만들 때 전체 rerun 요청을 미리 넣어 두므로, 그대로 두면
+            # fragment rerun이 전체 rerun에 합쳐짐. 대기 중인 요청을 비우고 fragment만 요청함
+            self._requests = ScriptRequests()
+            self.request_rerun(
+                RerunData(
+                    widget_states=widget_state,
+                    page_script_hash=page_hash,
+                    fragment_id_queue=list(control["fragment_ids"]),
+                    is_fragment_scoped_rerun=True,
+                )
+            )
+            try:
+                if not self._script_thread:
+                    self.start()
+                local_script_runner.require_widgets_deltas(self, timeout)
+            finally:
+                self.join()
+            tree = local_script_runner.parse_tree_from_messages(self.forward_msgs())
+        else:
+            tree = original_run(self, widget_state, query_params, timeout, page_hash)
+        sent.append(sum(msg.ByteSize() for msg in self.forward_msgs()))
+        return tree
+
+    local_script_runner.LocalScriptRunner.run = run
+    return control
+
+
+def history(count: int) -> list[dict]:
+    """학생/선생님이 번갈아 말한 대화 count개."""
+    return [
+        {"role": "user", "content": STUDENT_MESSAGE} if i % 2 == 0 else {"role": "assistant", "content": TEACHER_REPLY}
+        for i in range(count)
+    ]
+
+
+def measure(app, sent: list[int], action) -> tuple[float, int]:
+    """action()을 실행하는 동안 쓴 프로세스 CPU 시간(밀리초)과 보낸 바이트 수."""
+    started = time.process_time()
+    action()
+    return (time.process_time() - started) * 1000, sent[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    os.environ["GEMINI_SPECULATION"] = "0"
+    os.environ.setdefault("CONVERSATION_STORE", "memory")
+
+    from streamlit.testing.v1 import AppTest
+
+    from conversation_store import get_conversation_store
+
+    store = get_conversation_store()
+
+    sent: list[int] = []
+    control = patch_runner(sent)
+
+    print(f"{'메시지':>6} | {'전체 rerun CPU':>14} | {'전체 rerun 전송':>14} | {'질문 한 번 CPU':>14} | {'질문 한 번 전송':>14}")
+    for count in args.messages:
+        full_cpu, full_bytes, turn_cpu, turn_bytes = [], [], [], []
+        for _ in range(args.repeat):
+            # 저장해 둔 대화를 주소창의 대화 번호로 이어 가는 상태에서 시작
+            conversation_id = store.create_session("🏫 학교 생활 개선")
+            for message in history(count):
+                store.append(conversation_id, message["role"], message["content"])
+            app = AppTest.from_file(str(ROOT / "gemini_chatbot.py"), default_timeout=30)
+            app.secrets["GOOGLE_API_KEY"] = "bench"
+            app.query_params["s"] = conversation_id
+            app.run()
+
+            cpu, size = measure(app, sent, app.run)
+            full_cpu.append(cpu)
+            full_bytes.append(size)
+
+            # 채팅 영역이 fragment라면 질문은 그 fragment만 다시 실행함
+            storage = getattr(app, "_fragment_storage", None)
+            control["fragment_ids"] = list(getattr(storage, "_fragments", {}) or []) or None
+            app.chat_input[0].set_value(STUDENT_MESSAGE)
+            cpu, size = measure(app, sent, app.run)
+            control["fragment_ids"] = None
+            turn_cpu.append(cpu)
+            turn_bytes.append(size)
+            if app.exception:
+                raise SystemExit(app.exception[0].value)
+
+        print(
+            f"{count:>6} | {statistics.median(full_cpu):>11.1f} ms | {statistics.median(full_bytes) / 1024:>11.1f} KB | "
+            f"{statistics.median(turn_cpu):>11.1f} ms | {statistics.median(turn_bytes) / 1024:>11.1f} KB"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
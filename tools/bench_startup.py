@@ -0,0 +1,160 @@
+"""
+시작 비용 벤치마크: 새 복제본이 첫 학생을 받을 때까지 드는 가져오기(import) 시간과 메모리(RSS).
+
+    python tools/bench_startup.py --repeat 5
+    git worktree add /tmp/before HEAD~1 && python tools/bench_startup.py --root /tmp/before   # 고치기 전과 비교
+
+단계마다 새 파이썬 프로세스를 띄워 재므로 앞 단계에서 불러온 모듈이 섞이지 않습니다.
+
+- streamlit: `import streamlit`만 (streamlit run이 서버를 띄울 때 이미 내는 비용, 기준선)
+- 앱 모듈: streamlit을 불러 둔 뒤 gemini_chatbot.py가 가져오는 앱 모듈을 가져오는 시간과 늘어난 메모리,
+  그때 httpx(네트워크 라이브러리)가 함께 올라오는지
+- 첫 화면: 새 프로세스에서 AppTest로 gemini_chatbot.py를 처음 실행하는 시간 (가져오기 + 설정 읽기 + 시작 화면,
+  첫 답변 미리 요청은 Gemini 스텁 서버로 감)과 그 뒤 메모리
+- rerun: 같은 세션에서 한 번 더 실행하는 시간 (설정을 다시 읽지 않는지 확인)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# gemini_chatbot.py가 맨 위에서 가져오는 앱 모듈 (예전 버전에 없는 모듈은 건너뜀)
+APP_MODULES = ("app_config", "conversation_store", "gemini_client", "gemini_engine", "key_manager")
+
+
+# -------------------------------------------------------------------
+# 측정 프로세스 (--child)
+# 다른 도구 모듈(load_app, stub_gemini)을 가져오면 그 모듈이 부르는 표준 라이브러리가 측정에 섞이므로 쓰지 않음
+# -------------------------------------------------------------------
+def rss_mb() -> float:
+    """지금 프로세스의 상주 메모리(MB). /proc가 없으면 최대 사용량으로 대신합니다."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child_streamlit() -> dict:
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+
+    return {"seconds": time.perf_counter() - started, "rss": rss_mb()}
+
+
+def child_modules(root: Path) -> dict:
+    import importlib
+
+    import streamlit  # noqa: F401
+
+    before_rss, before_modules = rss_mb(), len(sys.modules)
+    started = time.perf_counter()
+    for name in APP_MODULES:
+        if (root / f"{name}.py").exists():
+            importlib.import_module(name)
+    return {
+        "seconds": time.perf_counter() - started,
+        "rss": rss_mb() - before_rss,
+        "modules": len(sys.modules) - before_modules,
+        "httpx": "httpx" in sys.modules,
+    }
+
+
+def child_first_page(root: Path) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(root / "gemini_chatbot.py"), default_timeout=60)
+    app.secrets["GOOGLE_API_KEY"] = "bench"
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    rss = rss_mb()
+    started = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - started
+    if app.exception:
+        raise SystemExit(app.exception[0].value)
+    return {"seconds": first, "rss": rss, "rerun": rerun}
+
+
+def run_child(stage: str, root: Path) -> None:
+    sys.path.insert(0, str(root))
+    os.chdir(root)
+    if stage == "streamlit":
+        result = child_streamlit()
+    elif stage == "modules":
+        result = child_modules(root)
+    else:
+        result = child_first_page(root)
+    print(json.dumps(result))
+
+
+# -------------------------------------------------------------------
+# 반복 측정 (부모 프로세스)
+# -------------------------------------------------------------------
+def measure(stage: str, root: Path, env: dict, repeat: int) -> list[dict]:
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", stage, "--root", str(root)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def median(results: list[dict], key: str) -> float:
+    return statistics.median(result[key] for result in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="단계마다 반복할 횟수 (중앙값을 보고)")
+    parser.add_argument("--root", default=str(ROOT), help="잴 앱 폴더 (다른 버전과 비교할 때)")
+    parser.add_argument("--child", choices=("streamlit", "modules", "first_page"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    root = Path(args.root).resolve()
+    if args.child:
+        run_child(args.child, root)
+        return
+
+    from stub_gemini import StubConfig, start_stub_server
+
+    server = start_stub_server(StubConfig(latency="fixed:0.05", chunk_interval=0.01, seed=1))
+    env = {
+        **os.environ,
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1beta",
+        "CONVERSATION_STORE": "memory",
+        "PYTHONWARNINGS": "ignore",
+    }
+    print(f"{root} · 단계마다 {args.repeat}회, 중앙값")
+
+    base = measure("streamlit", root, env, args.repeat)
+    print(f"streamlit 가져오기 {median(base, 'seconds') * 1000:7.1f} ms | RSS {median(base, 'rss'):6.1f} MB")
+
+    modules = measure("modules", root, env, args.repeat)
+    print(
+        f"앱 모듈 가져오기    {median(modules, 'seconds') * 1000:7.1f} ms | RSS +{median(modules, 'rss'):5.1f} MB | "
+        f"모듈 {median(modules, 'modules'):.0f}개 | httpx {'불러옴' if modules[0]['httpx'] else '미룸'}"
+    )
+
+    first = measure("first_page", root, env, args.repeat)
+    print(f"첫 화면             {median(first, 'seconds') * 1000:7.1f} ms | RSS {median(first, 'rss'):6.1f} MB")
+    print(f"rerun               {median(first, 'rerun') * 1000:7.1f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+복제본 점검: 앱 프로세스 여러 개가 공유 저장소를 함께 쓸 때 대화·첫 답변 캐시·분당 요청 수 제한이 이어지는지 확인합니다.
+
+    python tools/check_replicas.py --replicas 3
+    python tools/check_replicas.py --replicas 4 --backend redis://127.0.0.1:6379/15
+
+복제본은 각각 따로 띄운 파이썬 프로세스이고(Streamlit AppTest로 gemini_chatbot.py를 실행), Gemini 스텁 서버 하나와
+공유 저장소 하나(기본은 임시 SQLite 파일)를 함께 씁니다. 로드 밸런서가 학생을 매번 다른 복제본으로 보낸다고 보고,
+
+1. 이어 쓰기: 복제본 0에서 대화를 시작하고, 나머지 복제본이 주소의 대화 번호(?s=)로 차례로 들어와 질문합니다.
+   저장된 대화에 모든 복제본의 질문과 답변이 순서대로 있어야 합니다.
+2. 첫 답변 캐시: 복제본마다 같은 선택지를 고릅니다. 스텁 서버가 받은 첫 답변 요청은 한 건이어야 합니다.
+3. 분당 제한: 모든 복제본이 동시에 요청을 몰아 보냅니다. 요청을 내보낸 시각이 복제본을 합친 분당 제한을 지켜야 합니다.
+
+하나라도 어긋나면 종료 코드 1로 끝납니다.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from stub_gemini import StubConfig, start_stub_server
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# 첫 답변 캐시 단계에서 모든 복제본이 고르는 선택지 (선택 화면의 순서)
+CACHE_OPTION = 2
+
+
+# -------------------------------------------------------------------
+# 복제본 프로세스 (--worker)
+# -------------------------------------------------------------------
+def open_app(conversation: str | None = None):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(ROOT / "gemini_chatbot.py"), default_timeout=60)
+    app.secrets["GOOGLE_API_KEY"] = "replica-check"
+    if conversation:
+        app.query_params["s"] = conversation
+    app.run()
+    return app
+
+
+def choose_option(app, index: int) -> None:
+    app.radio(key="idea_selection").set_value(app.radio(key="idea_selection").options[index]).run()
+    next(button for button in app.button if button.label == "선택 완료").click().run()
+
+
+def worker_start(replica: int) -> dict:
+    """새 대화를 시작해 첫 답변을 받고 질문 하나를 합니다."""
+    app = open_app()
+    choose_option(app, 0)
+    app.chat_input[0].set_value(f"복제본 {replica}에서 한 질문").run()
+    return {"conversation": app.session_state.conversation_id, "exception": [e.message for e in app.exception]}
+
+
+def worker_resume(replica: int, conversation: str) -> dict:
+    """주소의 대화 번호로 들어와 이어서 질문합니다."""
+    app = open_app(conversation)
+    restored = len(app.session_state.messages) + app.session_state.message_offset
+    app.chat_input[0].set_value(f"복제본 {replica}에서 한 질문").run()
+    return {"restored": restored, "exception": [e.message for e in app.exception]}
+
+
+def worker_opener(replica: int) -> dict:
+    """모든 복제본이 같은 선택지를 고릅니다."""
+    app = open_app()
+    choose_option(app, CACHE_OPTION)
+    return {"exception": [e.message for e in app.exception]}
+
+
+def worker_burst(replica: int, requests: int, start_at: float) -> dict:
+    """start_at에 맞춰 요청을 한꺼번에 올리고, 대기열을 지나 실제로 내보낸 시각을 돌려줍니다."""
+    from gemini_engine import get_engine
+    from telemetry import CallTrace
+
+    engine = get_engine()
+    body = json.dumps({"contents": [{"role": "user", "parts": [{"text": "분당 제한 확인"}]}]}).encode("utf-8")
+    time.sleep(max(0.0, start_at - time.time()))
+    calls = [CallTrace(kind="other") for _ in range(requests)]
+    futures = [
+        engine.submit_json("models/gemini-2.5-flash:generateContent", body, "replica-check", f"r{replica}-{i}", call)
+        for i, call in enumerate(calls)
+    ]
+    # call.total은 대기열을 지나 보내기 시작한 때부터 끝날 때까지이므로, 끝난 시각에서 빼면 보낸 시각
+    finished = [0.0] * requests
+    for i, future in enumerate(futures):
+        future.add_done_callback(lambda _, i=i: finished.__setitem__(i, time.time()))
+    for future in futures:
+        future.result()
+    return {"sent": [done - call.total for done, call in zip(finished, calls)]}
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    if args.worker == "start":
+        result = worker_start(args.replica)
+    elif args.worker == "resume":
+        result = worker_resume(args.replica, args.conversation)
+    elif args.worker == "opener":
+        result = worker_opener(args.replica)
+    else:
+        result = worker_burst(args.replica, args.requests, args.start_at)
+    print(json.dumps(result))
+
+
+# -------------------------------------------------------------------
+# 점검 (부모 프로세스)
+# -------------------------------------------------------------------
+def spawn(env: dict, *worker_args: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, __file__, "--worker", *worker_args],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def collect(process: subprocess.Popen) -> dict:
+    out, err = process.communicate(timeout=300)
+    if process.returncode != 0:
+        raise RuntimeError(f"복제본 프로세스가 실패했습니다:\n{err[-2000:]}")
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=3, help="띄울 복제본(프로세스) 수")
+    parser.add_argument("--backend", help="공유 저장소 주소 (기본: 임시 SQLite 파일)")
+    parser.add_argument("--rpm", type=float, default=120, help="분당 제한 단계의 분당 요청 수 (복제본 합계)")
+    parser.add_argument("--burst", type=int, default=2, help="분당 제한 단계에서 한꺼번에 보낼 수 있는 요청 수")
+    parser.add_argument("--requests", type=int, default=4, help="분당 제한 단계에서 복제본마다 보내는 요청 수")
+    parser.add_argument("--worker", choices=("start", "resume", "opener", "burst"), help=argparse.SUPPRESS)
+    parser.add_argument("--replica", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--conversation", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    server = start_stub_server(StubConfig(latency="fixed:0.05", chunk_interval=0.01, seed=7))
+    workdir = tempfile.mkdtemp(prefix="replicas-")
+    backend = args.backend or f"sqlite:///{workdir}/shared.db"
+    env = {
+        **os.environ,
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1beta",
+        "SHARED_BACKEND_URL": backend,
+        "CONVERSATION_STORE": "shared",
+        "TEACHER_MIN_THINKING_SECONDS": "0",
+        # 요청 수를 정확히 세도록 헤지와 재시도를 끔
+        "GEMINI_HEDGE": "0",
+        "GEMINI_RETRY_MAX_ATTEMPTS": "1",
+        "GEMINI_RATE_LIMIT_RPM": "0",
+    }
+    print(f"복제본 {args.replicas}개 · 공유 저장소 {backend}")
+    failures: list[str] = []
+
+    # 1. 이어 쓰기
+    started = collect(spawn(env, "start", "--replica", "0"))
+    conversation = started["conversation"]
+    for replica in range(1, args.replicas):
+        resumed = collect(spawn(env, "resume", "--replica", str(replica), "--conversation", conversation))
+        expected = 2 + 2 * replica
+        if resumed["restored"] != expected:
+            failures.append(f"복제본 {replica}가 이어 받은 메시지 {resumed['restored']}개 (기대 {expected}개)")
+        failures += [f"복제본 {replica}: {e}" for e in resumed["exception"]]
+    failures += [f"복제본 0: {e}" for e in started["exception"]]
+
+    os.environ["SHARED_BACKEND_URL"] = backend
+    from conversation_store import SharedConversationStore
+    from shared_state import create_backend
+
+    messages = list(SharedConversationStore(create_backend(backend)).iter_messages(conversation))
+    questions = [m["content"] for m in messages if m["role"] == "user"][1:]
+    roles_ok = all(m["role"] == ("user" if i % 2 == 0 else "assistant") for i, m in enumerate(messages))
+    order_ok = questions == [f"복제본 {i}에서 한 질문" for i in range(args.replicas)]
+    if not (roles_ok and order_ok):
+        failures.append(f"저장된 대화 순서가 어긋남: {questions}")
+    print(f"1. 이어 쓰기: 메시지 {len(messages)}개, 질문 순서 {'정상' if order_ok else '어긋남'}")
+
+    # 2. 첫 답변 캐시 (복제본마다 차례로 같은 선택지를 고름)
+    before = server.stats().get("requests_gemini-2.5-flash-lite", 0)
+    for replica in range(args.replicas):
+        failures += [f"복제본 {replica}: {e}" for e in collect(spawn(env, "opener", "--replica", str(replica)))["exception"]]
+    opener_requests = server.stats().get("requests_gemini-2.5-flash-lite", 0) - before
+    if opener_requests != 1:
+        failures.append(f"첫 답변 요청이 {opener_requests}건 (기대 1건: 나머지 복제본은 공유 캐시를 써야 함)")
+    print(f"2. 첫 답변 캐시: 복제본 {args.replicas}개가 같은 선택지 → Gemini 요청 {opener_requests}건")
+
+    # 3. 분당 제한 (모든 복제본이 동시에 몰아 보냄)
+    burst_env = {**env, "GEMINI_RATE_LIMIT_RPM": str(args.rpm), "GEMINI_RATE_LIMIT_BURST": str(args.burst)}
+    start_at = time.time() + 3  # 프로세스가 모두 뜰 때까지 기다림
+    processes = [
+        spawn(burst_env, "burst", "--replica", str(r), "--requests", str(args.requests), "--start-at", str(start_at))
+        for r in range(args.replicas)
+    ]
+    sent = sorted(t for process in processes for t in collect(process)["sent"])
+    interval = 60 / args.rpm
+    # GCRA: k번째(0부터) 요청은 첫 요청보다 (k - burst + 1) × interval 뒤에야 나갈 수 있음 (시계 오차 0.05초 허용)
+    early = [k for k, t in enumerate(sent) if t - sent[0] < (k - args.burst + 1) * interval - 0.05]
+    span = sent[-1] - sent[0]
+    if early:
+        failures.append(f"분당 제한보다 일찍 나간 요청 {len(early)}건")
+    print(
+        f"3. 분당 제한: 요청 {len(sent)}건을 {span:.1f}초에 걸쳐 보냄 "
+        f"(제한 {args.rpm:g}/분·한꺼번에 {args.burst}건이면 최소 {max(0, len(sent) - args.burst) * interval:.1f}초)"
+    )
+    server.shutdown()
+
+    if failures:
+        for failure in failures:
+            print(f"  ! {failure}")
+        print("실패")
+        sys.exit(1)
+    print("통과")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+의미 캐시 오프라인 평가: 저장된 상담 기록을 다시 흘려 유사도 기준(threshold)마다 적중률과 답변 품질을 비교합니다.
+
+    python tools/eval_semantic_cache.py                                  # 대화 저장소(CONVERSATION_STORE 설정)의 기록
+    python tools/eval_semantic_cache.py --jsonl 상담일지.jsonl --thresholds 0.8 0.85 0.9 0.95 --show 5
+
+기록은 대시보드·export_logs의 JSONL 내보내기 형식이나 대화 저장소에서 읽습니다. Gemini는 부르지 않습니다.
+한 반이 함께 진행한다고 보고 모든 대화의 첫 번째 후속 질문, 두 번째 후속 질문… 순서로 캐시에 흘려 넣고,
+캐시가 답했을 턴마다 재사용했을 답변을 그 학생이 실제로 받은 답변과 비교합니다.
+
+- 적중률: 의미 캐시를 쓸 수 있는 턴(첫 턴 제외, GEMINI_SEMANTIC_CACHE_MAX_STAGE번째 질문까지) 중 재사용한 비율
+- 답변 유사도: 재사용했을 답변과 실제 답변의 글자 n-gram 코사인 유사도 (캐시와 같은 임베딩)
+- 초점/판정 일치: 두 답변의 평가(evaluation)에서 선생님이 짚은 초점(focus)과 판정(verdict)이 같은 비율
+- (기준) 항상 재사용: 같은 칸에서 가장 가까운 답변을 무조건 썼을 때. 품질 지표가 이보다 얼마나 나은지 봅니다.
+
+--show N은 기준 유사도(GEMINI_SEMANTIC_CACHE_THRESHOLD 또는 --show-threshold)에서 재사용했을 예를 N개 보여 줍니다.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app_config import get_service_settings  # noqa: E402
+from evaluation import parse_reply  # noqa: E402
+from semantic_cache import SemanticCache, embed_text, fingerprint, reusable  # noqa: E402
+
+BASELINE = -1.0
+
+
+def load_sessions(args: argparse.Namespace) -> list[dict]:
+    """[{"category", "messages"}] (시작 순서)."""
+    if args.jsonl:
+        with open(args.jsonl, encoding="utf-8") as file:
+            sessions = [json.loads(line) for line in file if line.strip()]
+        return [s for s in sessions if not args.topic or s["category"] in args.topic]
+    from conversation_store import create_store
+
+    store = create_store()
+    return [
+        {"category": info["category"], "messages": list(store.iter_messages(info["id"]))}
+        for info in store.list_sessions(args.topic)
+    ]
+
+
+def model_output(message: dict) -> str:
+    """저장된 선생님 답변을 캐시에 넣는 모델 출력 형식으로 (평가가 있으면 JSON 형식 답변)."""
+    if message.get("evaluation"):
+        return json.dumps({"reply": message["content"], **message["evaluation"]}, ensure_ascii=False)
+    return message["content"]
+
+
+def collect_turns(sessions: list[dict], max_stage: int) -> list[dict]:
+    """의미 캐시를 쓸 수 있는 학생 턴과 그 뒤 실제 답변. 반 전체가 같은 단계를 함께 지나도록 (단계, 대화 순서)로 정렬."""
+    turns = []
+    for order, session in enumerate(sessions):
+        messages = session["messages"]
+        for index in range(len(messages) - 1):
+            if messages[index]["role"] != "user" or messages[index + 1]["role"] != "assistant":
+                continue
+            probe = fingerprint(messages[:index + 1], max_stage)
+            if probe is None:
+                continue
+            turns.append({"order": order, "category": session["category"], "probe": probe, "actual": messages[index + 1]})
+    turns.sort(key=lambda turn: (turn["probe"].stage, turn["order"]))
+    return turns
+
+
+def replay(turns: list[dict], threshold: float, max_entries: int) -> dict:
+    """한 기준 유사도로 기록을 흘려 보고, 재사용했을 턴마다 실제 답변과 비교합니다."""
+    cache = SemanticCache(threshold, max_entries, ttl_seconds=float("inf"))
+    similarities: list[float] = []
+    focus = verdict = compared = 0
+    examples = []
+    for turn in turns:
+        bucket = (turn["category"], turn["probe"].stage)
+        found = cache.lookup(bucket, turn["probe"])
+        actual = turn["actual"]
+        if found is None:
+            if reusable(actual.get("evaluation")):
+                cache.put(bucket, turn["probe"], model_output(actual), actual["content"], 0.0)
+            continue
+        cached_reply, cached_evaluation = parse_reply(found[0])
+        similarity = float(embed_text(cached_reply) @ embed_text(actual["content"]))
+        similarities.append(similarity)
+        if cached_evaluation and actual.get("evaluation"):
+            compared += 1
+            focus += cached_evaluation.get("focus") == actual["evaluation"].get("focus")
+            verdict += cached_evaluation.get("verdict") == actual["evaluation"].get("verdict")
+        examples.append(
+            {"question": turn["probe"].question, "match": found[1], "cached": cached_reply, "actual": actual["content"]}
+        )
+    stats = cache.stats()
+    return {
+        "threshold": threshold,
+        "turns": len(turns),
+        "hits": stats["hits"],
+        "hit_rate": stats["hits"] / len(turns) if turns else 0.0,
+        "reply_similarity": statistics.fmean(similarities) if similarities else None,
+        "reply_similarity_p10": sorted(similarities)[len(similarities) // 10] if similarities else None,
+        "focus_agreement": focus / compared if compared else None,
+        "verdict_agreement": verdict / compared if compared else None,
+        "entries": stats["entries"],
+        "evictions": stats["evictions"],
+        "examples": examples,
+    }
+
+
+def percent(value: float | None) -> str:
+    return "-" if value is None else f"{value:.0%}"
+
+
+def decimal(value: float | None) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def main() -> None:
+    config = get_service_settings().replies
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jsonl", help="JSONL 상담 기록 (없으면 대화 저장소에서 읽음)")
+    parser.add_argument("--topic", action="append", help="이 탐구 주제만 (여러 번 줄 수 있음)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.75, 0.8, 0.85, 0.9, 0.95], help="비교할 유사도 기준")
+    parser.add_argument("--max-stage", type=int, default=config.semantic_cache_max_stage,
+                        help="학생의 몇 번째 질문까지 재사용할지")
+    parser.add_argument("--max-entries", type=int, default=config.semantic_cache_max_entries,
+                        help="캐시에 보관할 최대 답변 수")
+    parser.add_argument("--show", type=int, default=0, help="재사용했을 예를 이만큼 보여 줌")
+    parser.add_argument("--show-threshold", type=float, default=config.semantic_cache_threshold,
+                        help="--show에 쓸 유사도 기준")
+    parser.add_argument("--json", help="결과를 JSON으로 저장할 경로")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args)
+    started = time.perf_counter()
+    turns = collect_turns(sessions, args.max_stage)
+    per_turn = (time.perf_counter() - started) / max(1, len(turns))
+    print(f"대화 {len(sessions)}개 · 의미 캐시 대상 턴 {len(turns)}개 · 지문 만들기 평균 {per_turn * 1000:.2f}ms")
+    if not turns:
+        print("평가할 후속 질문이 없습니다.")
+        return
+
+    results = [replay(turns, threshold, args.max_entries) for threshold in [BASELINE, *args.thresholds]]
+    print(f"{'기준':>14} | {'적중':>5} | {'적중률':>5} | {'답변 유사도':>8} | {'하위 10%':>6} | {'초점 일치':>6} | {'판정 일치':>6}")
+    for result in results:
+        label = "(기준) 항상 재사용" if result["threshold"] == BASELINE else f"{result['threshold']:.2f}"
+        print(
+            f"{label:>14} | {result['hits']:>6} | {percent(result['hit_rate']):>7} | "
+            f"{decimal(result['reply_similarity']):>12} | {decimal(result['reply_similarity_p10']):>9} | "
+            f"{percent(result['focus_agreement']):>10} | {percent(result['verdict_agreement']):>10}"
+        )
+
+    if args.show:
+        shown = replay(turns, args.show_threshold, args.max_entries)["examples"][:args.show]
+        print(f"\n유사도 {args.show_threshold:.2f}에서 재사용했을 예 {len(shown)}개")
+        for example in shown:
+            print(f"- 질문: {example['question']} (유사도 {example['match']:.2f})")
+            print(f"  재사용: {example['cached'][:120]}")
+            print(f"  실제:   {example['actual'][:120]}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(
+                [{key: value for key, value in result.items() if key != "examples"} for result in results],
+                out, ensure_ascii=False, indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
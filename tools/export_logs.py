@@ -0,0 +1,50 @@
+"""
+상담 일지 일괄 내보내기 (명령줄): 대시보드와 같은 형식으로 파일에 바로 씁니다.
+
+    python tools/export_logs.py --format zip --out 상담일지.zip
+    python tools/export_logs.py --format csv --out 3월.csv --since 2026-03-01 --until 2026-03-31 --topic "🌍 환경 보호"
+
+대화 저장소(CONVERSATION_STORE / CONVERSATION_DB_PATH 설정)를 읽어 대화를 하나씩 파일에 흘려 쓰므로
+학기 전체처럼 큰 내보내기도 메모리를 거의 쓰지 않습니다.
+"""
+import argparse
+import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from conversation_store import create_store  # noqa: E402
+from log_export import EXPORT_FORMATS, iter_export  # noqa: E402
+
+
+def day_start(value: str) -> float:
+    """'YYYY-MM-DD' 날짜의 0시 (서버 시간대, UNIX 초)."""
+    return datetime.datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="zip", help="내보낼 파일 형식")
+    parser.add_argument("--out", required=True, help="저장할 파일 경로")
+    parser.add_argument("--topic", action="append", help="이 탐구 주제만 (여러 번 줄 수 있음)")
+    parser.add_argument("--since", help="이 날짜(YYYY-MM-DD)부터 시작한 대화만")
+    parser.add_argument("--until", help="이 날짜(YYYY-MM-DD)까지 시작한 대화만")
+    args = parser.parse_args()
+
+    store = create_store()
+    sessions = store.list_sessions(
+        args.topic,
+        day_start(args.since) if args.since else None,
+        day_start(args.until) + 86400 if args.until else None,
+    )
+    written = 0
+    with open(args.out, "wb") as out:
+        for chunk in iter_export(store, sessions, args.format):
+            out.write(chunk)
+            written += len(chunk)
+    print(f"대화 {len(sessions)}개 → {args.out} ({written / 1024:.1f}KB)")
+
+
+if __name__ == "__main__":
+    main()
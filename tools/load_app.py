@@ -0,0 +1,284 @@
+"""
+앱 부하 테스트: Gemini 스텁 서버를 상대로 학생 N명이 gemini_chatbot.py를 동시에 쓰는 상황을 흉내 냅니다.
+
+    python tools/load_app.py --students 30 --turns 3 --latency lognormal:0.8,0.5
+    python tools/load_app.py --students 60 --turns 5 --error-503 0.05 --error-429 0.02 --max-p95 6 --max-error-rate 0.02
+
+학생마다 자기 프로세스에서 Streamlit AppTest 세션 하나를 돌립니다. 첫 화면을 열고, 아이디어 유형을 골라
+'선택 완료'를 누른 뒤(첫 답변), 채팅 입력으로 질문을 M번 합니다. AppTest는 한 프로세스의 여러 스레드에서
+동시에 돌리면 스크립트 실행기가 서로 꼬여(KeyError·"Runtime hasn't been created!") 없는 오류를 내므로,
+학생 프로세스를 모두 띄워 준비시킨 뒤 한꺼번에 출발시킵니다. 그래서 엔진·캐시·대화 저장소는 학생마다
+따로이고(복제본이 학생 수만큼 있는 셈), 함께 받는 부하는 Gemini 스텁 서버 쪽에서 잽니다.
+한 프로세스 안의 엔진·대기열에 몰리는 부하는 tools/load_engine.py, tools/load_chat_api.py로 잽니다.
+(AppTest는 질문마다 스크립트 전체를 다시 실행하므로 채팅 fragment만 다시 도는 실제 브라우저보다 조금 무겁게 잽니다)
+
+처리량, 단계별 지연 p50/p95/p99, 오류율(선생님 답변 대신 오류 안내가 나온 비율), 학생 프로세스 메모리(RSS),
+스텁 서버가 받은 요청·주입한 오류 수와 학생 프로세스들의 엔진 계측을 합친 값(재시도, 첫 응답 시간)을 출력합니다.
+--max-p95 / --max-error-rate를 넘으면 종료 코드 1로 끝나므로 수업 전 회귀 확인에 쓸 수 있습니다.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import statistics
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict
+from pathlib import Path
+
+from stub_gemini import add_config_arguments, config_from_args, start_stub_server
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+STUDENT_QUESTIONS = (
+    "재활용 종이로 스티커를 만들면 한 장에 백 원 정도면 될 것 같아요.",
+    "친구들이 쉬는 시간에 쓸 수 있게 가볍게 만들고 싶어요.",
+    "가위 대신 손으로 뜯을 수 있게 하면 더 안전할 것 같아요.",
+    "반 친구 열 명에게 물어봤는데 일곱 명이 사고 싶대요.",
+    "남은 재료는 다음 수업 때 다시 쓸 거예요.",
+)
+
+
+def rss_mb(pid: int | str = "self") -> float:
+    """프로세스(기본은 지금 프로세스)의 상주 메모리(MB). /proc가 없으면 지금 프로세스의 최대 사용량으로 대신합니다."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """프로세스 최대 상주 메모리(MB). (Linux는 KB, macOS는 바이트 단위로 돌려줌)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(values: list[float]) -> tuple[float, float, float]:
+    values = sorted(values)
+    if not values:
+        return 0.0, 0.0, 0.0
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))]  # noqa: E731
+    return pick(0.5), pick(0.95), pick(0.99)
+
+
+def run_student(index: int, args: argparse.Namespace, ready, go, results) -> None:
+    """
+    학생 한 명 (자기 프로세스에서 실행). 준비가 끝나면 ready를 올리고 go 신호를 기다렸다가 출발합니다.
+    단계별 지연·오류 안내 여부, 멈춘 이유, 메모리, 엔진 계측을 results 큐로 돌려줍니다.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    # 앱이 가져오는 모듈을 미리 가져와 둠 (모듈 가져오기는 재지 않음)
+    import conversation_store  # noqa: F401
+    import gemini_client  # noqa: F401
+    import key_manager  # noqa: F401
+    from gemini_engine import get_engine
+
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    failures: defaultdict[str, int] = defaultdict(int)
+    crash = None
+
+    def step(name: str, app: AppTest, action) -> bool:
+        """action()으로 rerun 한 번을 하고 지연과 오류 안내 여부를 남깁니다. 더 진행할 수 있으면 True."""
+        errors_before = len(app.error)
+        started = time.perf_counter()
+        action()
+        latencies[name].append(time.perf_counter() - started)
+        failures[name] += bool(app.exception) or len(app.error) > errors_before
+        return not app.exception
+
+    ready.release()
+    go.wait()
+    time.sleep(args.ramp * index / max(1, args.students))
+    try:
+        app = AppTest.from_file(str(ROOT / "gemini_chatbot.py"), default_timeout=120)
+        app.secrets["GOOGLE_API_KEY"] = "load-test"
+        if step("첫 화면", app, app.run):
+            options = app.radio(key="idea_selection").options
+            app.radio(key="idea_selection").set_value(options[index % (len(options) - 1)])
+            done = next(button for button in app.button if button.label == "선택 완료")
+            if step("첫 답변", app, done.click().run):
+                for turn in range(args.turns):
+                    question = STUDENT_QUESTIONS[(index + turn) % len(STUDENT_QUESTIONS)]
+                    if not step("질문", app, app.chat_input[0].set_value(question).run):
+                        break
+    except Exception as e:  # noqa: BLE001 - 한 학생이 멈춰도 나머지 결과는 모음
+        crash = f"학생 {index}: {type(e).__name__}: {e}"
+    engine = get_engine()
+    results.put(
+        {
+            "latencies": dict(latencies),
+            "failures": dict(failures),
+            "crash": crash,
+            "rss_mb": peak_rss_mb(),
+            "calls": [asdict(call) for call in engine.telemetry.recent()],
+            "engine": {key: engine.stats()[key] for key in ("failovers", "hedges", "hedges_won")},
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=30, help="동시에 접속하는 학생 수 (학생마다 프로세스 하나)")
+    parser.add_argument("--turns", type=int, default=3, help="첫 답변 뒤 학생마다 하는 질문 수")
+    parser.add_argument("--ramp", type=float, default=2.0, help="학생들이 들어오는 데 걸리는 시간(초)")
+    parser.add_argument("--max-p95", type=float, help="질문 지연 p95가 이 초를 넘으면 실패로 끝냄")
+    parser.add_argument("--max-error-rate", type=float, help="오류율이 이 비율을 넘으면 실패로 끝냄")
+    parser.add_argument("--json", help="결과를 JSON으로 저장할 경로 (회귀 비교용)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stub_server(config_from_args(args))
+    # 학생 프로세스는 이 환경 변수를 물려받음
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    os.environ.setdefault("CONVERSATION_STORE", "memory")
+    os.environ.setdefault("TEACHER_MIN_THINKING_SECONDS", "0")
+
+    from telemetry import CallTrace, Telemetry
+
+    # spawn: 부모의 스레드(스텁 서버)·잠금을 물려받지 않는 새 인터프리터로 시작
+    context = multiprocessing.get_context("spawn")
+    ready = context.Semaphore(0)
+    go = context.Event()
+    results = context.Queue()
+    students = [
+        context.Process(target=run_student, args=(i, args, ready, go, results), name=f"student-{i}")
+        for i in range(args.students)
+    ]
+    for process in students:
+        process.start()
+    # 프로세스 시작·모듈 가져오기 시간은 재지 않음
+    for _ in students:
+        ready.acquire()
+
+    rss_before = sum(rss_mb(process.pid) for process in students)
+    reports: list[dict] = []
+    started = time.perf_counter()
+    go.set()
+    peak_during = rss_before
+    while len(reports) < len(students):
+        try:
+            reports.append(results.get(timeout=0.2))
+        except queue.Empty:
+            if not any(process.is_alive() for process in students):
+                break
+            peak_during = max(peak_during, sum(rss_mb(process.pid) for process in students if process.is_alive()))
+    elapsed = time.perf_counter() - started
+    for process in students:
+        process.join()
+
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    failures: defaultdict[str, int] = defaultdict(int)
+    crashes = [report["crash"] for report in reports if report["crash"]]
+    crashes += [f"{process.name}: 종료 코드 {process.exitcode}" for process in students if process.exitcode]
+    for report in reports:
+        for name, values in report["latencies"].items():
+            latencies[name].extend(values)
+        for name, count in report["failures"].items():
+            failures[name] += count
+    student_rss = [report["rss_mb"] for report in reports]
+
+    total_steps = sum(len(values) for values in latencies.values())
+    failed_steps = sum(failures.values())
+    replies = len(latencies["첫 답변"]) + len(latencies["질문"])
+    reply_failures = failures["첫 답변"] + failures["질문"]
+    error_rate = reply_failures / replies if replies else 1.0
+    stub = server.stats()
+    # 학생 프로세스마다 따로인 엔진 계측을 합침
+    telemetry = Telemetry(trace_path="")
+    recent = [CallTrace(**call) for report in reports for call in report["calls"]]
+    calls = telemetry.summary(recent)
+    engine_stats = {
+        key: sum(report["engine"][key] for report in reports) for key in ("failovers", "hedges", "hedges_won")
+    }
+    by_model: defaultdict[str, list] = defaultdict(list)
+    for call in recent:
+        by_model[call.model].append(call)
+    models = {model: telemetry.summary(group) for model, group in sorted(by_model.items())}
+    result = {
+        "students": args.students,
+        "turns": args.turns,
+        "latency": args.latency,
+        "elapsed": elapsed,
+        "replies_per_second": replies / elapsed,
+        "error_rate": error_rate,
+        "crashes": len(crashes),
+        "steps": {name: dict(zip(("p50", "p95", "p99"), percentiles(values))) for name, values in latencies.items()},
+        "rss_mb": {
+            "before": rss_before,
+            "peak": peak_during,
+            "per_student": statistics.fmean(student_rss) if student_rss else 0.0,
+        },
+        "stub_server": stub,
+        "engine": {
+            **{key: calls[key] for key in ("calls", "errors", "retried", "avg_attempts", "ttfb_p95", "total_p95")},
+            **{key: engine_stats[key] for key in ("failovers", "hedges", "hedges_won")},
+        },
+        "models": {
+            model: {key: summary[key] for key in ("calls", "errors", "ttfb_p50", "ttfb_p95", "total_p95")}
+            for model, summary in models.items()
+        },
+    }
+
+    print(
+        f"학생 {args.students}명 × 질문 {args.turns}번 · 지연 {args.latency} · "
+        f"503 {args.error_503:.0%} · 429 {args.error_429:.0%}"
+    )
+    print(
+        f"전체 소요 {elapsed:.1f}초 · 답변 {replies}개 ({replies / elapsed:.2f}개/초) · "
+        f"오류율 {error_rate:.1%} (단계 {failed_steps}/{total_steps}) · 멈춘 학생 {len(crashes)}명"
+    )
+    for name, values in latencies.items():
+        p50, p95, p99 = percentiles(values)
+        print(
+            f"  {name:<4} {len(values):>4}회 · 평균 {statistics.fmean(values):.2f}초 · "
+            f"p50 {p50:.2f}초 · p95 {p95:.2f}초 · p99 {p99:.2f}초 · 오류 {failures[name]}회"
+        )
+    print(
+        f"학생 프로세스 메모리(RSS) 합계: 출발 {rss_before:.0f}MB → 최대 {peak_during:.0f}MB "
+        f"(학생 1명당 최대 평균 {result['rss_mb']['per_student']:.0f}MB)"
+    )
+    print(
+        f"스텁 서버: 요청 {stub.get('requests', 0)}건 · 503 {stub.get('status_503', 0)}건 · "
+        f"429 {stub.get('status_429', 0)}건 · 동시 처리 최대 {stub['peak_in_flight']}건 · 연결 {stub.get('connections', 0)}개"
+    )
+    print(
+        f"엔진: 호출 {calls['calls']}건 · 재시도한 호출 {calls['retried']}건 · 실패 {calls['errors']}건 · "
+        f"첫 응답 p95 {calls['ttfb_p95']:.2f}초 · 전체 p95 {calls['total_p95']:.2f}초 · "
+        f"모델 전환 {engine_stats['failovers']}회 · 헤지 {engine_stats['hedges']}회 (이김 {engine_stats['hedges_won']}회)"
+    )
+    for model, summary in models.items():
+        print(
+            f"  {model}: 호출 {summary['calls']}건 · 실패 {summary['errors']}건 · "
+            f"첫 응답 p50 {summary['ttfb_p50']:.2f}초 · p95 {summary['ttfb_p95']:.2f}초"
+        )
+    for crash in crashes[:5]:
+        print(f"  ! {crash}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(result, out, ensure_ascii=False, indent=2)
+    server.shutdown()
+
+    regressions = []
+    question_p95 = result["steps"].get("질문", {}).get("p95", 0.0)
+    if args.max_p95 is not None and question_p95 > args.max_p95:
+        regressions.append(f"질문 지연 p95 {question_p95:.2f}초 > {args.max_p95:g}초")
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        regressions.append(f"오류율 {error_rate:.1%} > {args.max_error_rate:.1%}")
+    if crashes:
+        regressions.append(f"멈춘 학생 {len(crashes)}명")
+    if regressions:
+        print("실패: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+채팅 API 부하 테스트: Gemini 스텁 서버를 상대로 학생 N명이 gemini_chatbot.html(chat_api.py)로 동시에 대화하는 상황.
+
+    python tools/load_chat_api.py --students 200 --turns 3 --latency lognormal:0.8,0.5
+    python tools/load_chat_api.py --students 100 --rpm 600 --error-503 0.03
+
+chat_api 앱을 이 프로세스의 uvicorn으로 띄우고, 학생마다 브라우저처럼 /api/chat에 질문을 보내 SSE를 끝까지 읽습니다.
+(학생 쪽은 비동기 클라이언트 하나로 흉내 내므로 학생 수만큼 스레드를 만들지 않음)
+첫 조각까지의 시간(TTFT)·전체 시간 p50/p95/p99, 오류율, 대기열 안내를 받은 턴 수,
+서버 프로세스의 스레드 수·메모리(RSS)와 스텁 서버가 받은 요청·연결 수·키별 요청 수를 출력합니다.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+from stub_gemini import add_config_arguments, config_from_args, start_stub_server
+from load_app import STUDENT_QUESTIONS, percentiles, rss_mb
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=100, help="동시에 대화하는 학생 수")
+    parser.add_argument("--turns", type=int, default=3, help="학생마다 하는 질문 수")
+    parser.add_argument("--ramp", type=float, default=2.0, help="학생들이 들어오는 데 걸리는 시간(초)")
+    parser.add_argument("--rpm", type=float, default=0, help="분당 요청 수 제한 (GEMINI_RATE_LIMIT_RPM, 0이면 끔)")
+    parser.add_argument("--keys", type=int, default=2, help="학교 키 개수 (GEMINI_API_KEYS)")
+    parser.add_argument("--port", type=int, default=8765, help="채팅 API를 띄울 포트")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stub_server(config_from_args(args))
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    os.environ["GEMINI_RATE_LIMIT_RPM"] = f"{args.rpm:g}"
+    os.environ["GEMINI_API_KEYS"] = ",".join(f"load-key-{i}" for i in range(max(1, args.keys)))
+    os.environ.setdefault("CONVERSATION_STORE", "memory")
+
+    # 환경 변수를 바꾼 뒤에 가져와야 함
+    import httpx
+    import uvicorn
+
+    import chat_api
+
+    api = uvicorn.Server(uvicorn.Config(chat_api.app, port=args.port, log_level="warning", access_log=False))
+    threading.Thread(target=api.run, name="chat-api", daemon=True).start()
+    while not api.started:
+        time.sleep(0.05)
+    base = f"http://127.0.0.1:{args.port}"
+
+    ttft: list[float] = []
+    totals: list[float] = []
+    errors: list[str] = []
+    queued = 0
+    peak_threads = threading.active_count()
+
+    async def turn(client: httpx.AsyncClient, conversation: str | None, message: str) -> str | None:
+        """질문 하나를 보내 SSE를 끝까지 읽고 대화 번호를 돌려줍니다."""
+        nonlocal queued, peak_threads
+        started = time.perf_counter()
+        first = None
+        was_queued = False
+        async with client.stream("POST", f"{base}/api/chat", json={"conversation": conversation, "message": message}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                errors.append(f"HTTP {response.status_code}: {response.text[:80]}")
+                return conversation
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    continue
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[6:])
+                if event == "conversation":
+                    conversation = data["conversation"]
+                elif event == "queue" and data["position"] is not None:
+                    was_queued = True
+                elif event == "delta" and first is None:
+                    first = time.perf_counter() - started
+                elif event == "error":
+                    errors.append(data["message"][:80])
+                    return conversation
+        totals.append(time.perf_counter() - started)
+        ttft.append(first if first is not None else totals[-1])
+        queued += was_queued
+        peak_threads = max(peak_threads, threading.active_count())
+        return conversation
+
+    async def student(client: httpx.AsyncClient, index: int) -> None:
+        await asyncio.sleep(args.ramp * index / max(1, args.students))
+        conversation = None
+        for number in range(args.turns):
+            conversation = await turn(client, conversation, STUDENT_QUESTIONS[(index + number) % len(STUDENT_QUESTIONS)])
+
+    async def run_all() -> None:
+        limits = httpx.Limits(max_connections=args.students, max_keepalive_connections=args.students)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await asyncio.gather(*(student(client, i) for i in range(args.students)))
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    asyncio.run(run_all())
+    elapsed = time.perf_counter() - started
+    api.should_exit = True
+
+    turns = args.students * args.turns
+    stub = server.stats()
+    print(f"학생 {args.students}명 × 질문 {args.turns}번 · 지연 {args.latency} · 분당 제한 {args.rpm:g} · 학교 키 {args.keys}개")
+    print(
+        f"전체 소요 {elapsed:.1f}초 · 답변 {len(totals)}/{turns}개 ({len(totals) / elapsed:.2f}개/초) · "
+        f"오류 {len(errors)}건 · 대기열 안내를 받은 턴 {queued}개"
+    )
+    for name, values in (("첫 조각", ttft), ("전체", totals)):
+        if values:
+            p50, p95, p99 = percentiles(values)
+            print(f"  {name:<4} 평균 {statistics.fmean(values):.2f}초 · p50 {p50:.2f}초 · p95 {p95:.2f}초 · p99 {p99:.2f}초")
+    print(f"서버 프로세스: 스레드 최대 {peak_threads}개 · 메모리(RSS) {rss_before:.0f}MB → {rss_mb():.0f}MB")
+    keys = {name: count for name, count in stub.items() if name.startswith("key_")}
+    print(
+        f"스텁 서버: 요청 {stub.get('requests', 0)}건 · 연결 {stub.get('connections', 0)}개 · "
+        f"동시 처리 최대 {stub['peak_in_flight']}건 · 키별 {keys}"
+    )
+    for message in sorted(set(errors))[:5]:
+        print(f"  오류: {message}")
+    server.shutdown()
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+비동기 요청 엔진 부하 테스트: 로컬 스텁 서버를 상대로 학생 N명이 동시에 질문하는 상황을 흉내 냅니다.
+
+    python tools/load_engine.py --sessions 150 --delay 1.0 --limit 64
+    python tools/load_engine.py --sessions 30 --delay 0.2 --rpm 600 --hog 20
+
+각 세션은 Streamlit 스크립트 스레드처럼 자기 스레드에서 stream_gemini()를 부르고,
+실제 네트워크 I/O는 엔진의 이벤트 루프 스레드 하나에서 처리됩니다.
+동시 요청 수 제한(--limit)이나 분당 요청 수 제한(--rpm)을 넘는 요청은 루프 안의 세션별 공정 대기열에서
+순서를 기다립니다. --hog N을 주면 한 세션이 요청 N개를 한꺼번에 쌓아도 다른 학생들이 밀리지 않는지 볼 수 있습니다.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+from stub_gemini import StubConfig, start_stub_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=150, help="동시에 질문하는 학생 세션 수")
+    parser.add_argument("--delay", type=float, default=1.0, help="스텁 서버 응답 지연(초)")
+    parser.add_argument("--limit", type=int, default=64, help="엔진 전체 동시 요청 수 제한")
+    parser.add_argument("--rpm", type=float, default=0, help="엔진 전체 분당 요청 수 제한 (0이면 끔)")
+    parser.add_argument("--hog", type=int, default=0, help="한 세션이 한꺼번에 쌓는 추가 요청 수")
+    args = parser.parse_args()
+
+    server = start_stub_server(StubConfig(latency=f"fixed:{args.delay}"))
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta"
+    os.environ["GEMINI_MAX_CONCURRENT_REQUESTS"] = str(args.limit)
+    os.environ["GEMINI_POOL_MAX_CONNECTIONS"] = str(max(args.limit, 1))
+    os.environ["GEMINI_POOL_MAX_KEEPALIVE"] = str(max(args.limit, 1))
+    os.environ["GEMINI_RATE_LIMIT_RPM"] = str(args.rpm)
+
+    # 환경 변수를 바꾼 뒤에 가져와야 함
+    import gemini_client
+    import gemini_engine
+
+    threads_before_engine = threading.active_count()
+    engine = gemini_engine.get_engine()
+    engine_threads = threading.active_count() - threads_before_engine
+    latencies: list[float] = []
+    hog_latencies: list[float] = []
+    errors: list[str] = []
+    start_gate = threading.Event()
+
+    def session(index: int, session_id: str, results: list[float]) -> None:
+        messages = [{"role": "user", "content": f"학생 {index}: 친환경 물병 스티커를 팔고 싶어요."}]
+        start_gate.wait()
+        started = time.perf_counter()
+        try:
+            "".join(gemini_client.stream_gemini(messages, "🌍 환경 보호", "load-test", session=session_id))
+        except RuntimeError as e:
+            errors.append(str(e))
+            return
+        results.append(time.perf_counter() - started)
+
+    sessions = [threading.Thread(target=session, args=(i, f"s{i}", latencies)) for i in range(args.sessions)]
+    # 한 세션이 먼저 요청을 잔뜩 쌓아 두는 경우
+    sessions[:0] = [threading.Thread(target=session, args=(i, "hog", hog_latencies)) for i in range(args.hog)]
+    for thread in sessions:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in sessions:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = engine.stats()
+    latencies.sort()
+    hog_latencies.sort()
+    done = len(latencies) + len(hog_latencies)
+    print(
+        f"세션 {args.sessions}개 · 스텁 지연 {args.delay:.1f}초 · 동시 요청 제한 {args.limit} · "
+        f"분당 제한 {args.rpm:g} · 몰아 보낸 요청 {args.hog}개"
+    )
+    print(f"전체 소요 {elapsed:.2f}초 · 처리량 {done / elapsed:.1f}건/초 · 오류 {len(errors)}건")
+    for label, values in (("학생별", latencies), ("몰아 보낸 세션", hog_latencies)):
+        if values:
+            print(
+                f"{label} 지연 p50 {statistics.median(values):.2f}초 · "
+                f"p95 {values[max(0, int(len(values) * 0.95) - 1)]:.2f}초 · 최대 {values[-1]:.2f}초"
+            )
+    print(
+        f"대기열 대기 p50 {stats['wait_p50']:.2f}초 · p95 {stats['wait_p95']:.2f}초 · "
+        f"최대 {stats['wait_max']:.2f}초 · 분당 한도에 걸림 {stats['rate_limited']}회"
+    )
+    print(
+        f"엔진 최대 동시 요청 {stats['peak_in_flight']}건 · 서버가 받은 연결 {server.stats().get('connections', 0)}개 · "
+        f"엔진이 쓰는 스레드 {engine_threads}개"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+벤치마크/부하 테스트용 로컬 Gemini 스텁 서버: 실제 할당량을 쓰지 않고 느린 응답·과부하·스트리밍을 흉내 냅니다.
+
+    python tools/stub_gemini.py --port 8089 --latency lognormal:0.8,0.5 --error-503 0.03 --error-429 0.02
+    GEMINI_BASE_URL=http://127.0.0.1:8089/v1beta streamlit run gemini_chatbot.py
+
+벤치마크는 start_stub_server()를 설정 없이 불러 바로 답하는 서버로 쓰고(지연·오류 없음),
+부하 테스트(load_app, load_chat_api, load_engine)와 batch_feedback --stub은 아래 옵션으로 지연과 오류를 넣습니다.
+
+- 첫 응답까지의 지연은 분포로 정합니다: fixed:초 / uniform:최소,최대 / lognormal:중앙값,sigma / exp:평균
+- 스트리밍(?alt=sse)은 첫 지연 뒤에 답변을 여러 조각으로 나눠 조각 간격마다 보냅니다.
+- 정한 비율만큼 503(과부하)과 429(할당량 초과, Retry-After 포함)를 바로 돌려줍니다.
+- 응답에는 usageMetadata(요청 바이트로 추정한 토큰 수)가 붙고, 컨텍스트 캐시(cachedContents)도 받아 줍니다.
+- --model-latency / --model-error-503 으로 특정 모델만 느리거나 과부하이게 만들어 모델 전환·헤지를 시험합니다.
+- 받아들인 TCP 연결 수, 받은 요청 수(모델별·키별 포함), 상태 코드별 응답 수, 동시 처리 최대치를 server.stats()나
+  GET /stats 로 볼 수 있습니다.
+- 키는 실제 Gemini처럼 x-goog-api-key 헤더로 받습니다. 없으면 403, "invalid"로 시작하는 키는 400(API_KEY_INVALID)이고,
+  GET models/<모델>(키 확인)에는 모델 정보를 돌려줍니다.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 스텁 선생님 답변과 그 평가 (통과 판정도 섞어 축하 효과까지 지나가게 함)
+STUB_REPLIES = (
+    (
+        "좋은 출발이에요. 그런데 이 물건을 만드는 데 재료비는 얼마나 들까요? 친구들이 사려면 가격이 얼마면 좋을지 생각해 봅시다.",
+        {"rubric": {"feasibility": 3, "budget": 2, "safety": 4, "ethics": 4}, "focus": "budget", "verdict": "revise"},
+    ),
+    (
+        "아이디어가 재미있네요. 다만 초등학생이 직접 만들기에 안전한 재료인지 확인해 볼까요? 칼이나 뜨거운 도구가 필요한지도 적어 봅시다.",
+        {"rubric": {"feasibility": 3, "budget": 3, "safety": 2, "ethics": 4}, "focus": "safety", "verdict": "revise"},
+    ),
+    (
+        "가격과 재료를 꼼꼼하게 정했네요. 훌륭합니다! 이제 이 물건이 환경에 어떤 영향을 주는지도 한 줄 더해 보면 완성이에요.",
+        {"rubric": {"feasibility": 4, "budget": 5, "safety": 4, "ethics": 4}, "focus": "budget", "verdict": "pass"},
+    ),
+)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'lognormal:0.8,0.6' 같은 지연 분포 설정을 난수 생성기를 받아 초를 돌려주는 함수로 바꿉니다."""
+    name, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+        if name == "fixed":
+            (seconds,) = values
+            return lambda rng: seconds
+        if name == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if name == "lognormal":
+            median, sigma = values
+            return lambda rng: median * rng.lognormvariate(0, sigma)
+        if name == "exp":
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean)
+    except ValueError as e:
+        raise ValueError(f"지연 분포 설정이 올바르지 않습니다: {spec} ({e})") from e
+    raise ValueError(f"알 수 없는 지연 분포입니다: {spec} (fixed / uniform / lognormal / exp)")
+
+
+@dataclass
+class StubConfig:
+    """스텁 서버 동작 설정. 기본값은 지연·오류 없이 바로 답하는 벤치마크용."""
+
+    latency: str = "fixed:0"  # 첫 응답(헤더)까지의 지연 분포
+    chunks: int = 6  # 스트리밍 답변을 나눌 조각 수
+    chunk_interval: float = 0.0  # 스트리밍 조각 사이 간격(초)
+    error_503: float = 0.0  # 503으로 거절할 요청 비율
+    error_429: float = 0.0  # 429로 거절할 요청 비율
+    retry_after: float = 1.0  # 429 응답의 Retry-After(초)
+    seed: int | None = None
+    # 모델별로 덮어쓸 지연 분포 / 503 비율 (예: {"gemini-2.5-flash": "lognormal:3,0.5"})
+    model_latency: dict[str, str] = field(default_factory=dict)
+    model_error_503: dict[str, float] = field(default_factory=dict)
+
+
+# 부하 테스트 명령줄 옵션의 기본값 (실제 Gemini와 비슷하게 느린 응답)
+LOAD_TEST_LATENCY = "lognormal:0.8,0.5"
+LOAD_TEST_CHUNK_INTERVAL = 0.05
+
+
+def stub_chunk(text: str, model: str, usage: dict | None = None, finished: bool = False) -> dict:
+    """generateContent 응답(또는 SSE 이벤트) 한 개."""
+    candidate: dict = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    chunk: dict = {"candidates": [candidate], "modelVersion": model}
+    if usage:
+        chunk["usageMetadata"] = usage
+    return chunk
+
+
+def stub_usage(request_bytes: int, reply: str) -> dict:
+    """요청/응답 길이로 추정한 usageMetadata (한글 기준 3바이트당 1토큰)."""
+    prompt = max(1, request_bytes // 3)
+    response = max(1, len(reply.encode("utf-8")) // 3)
+    return {"promptTokenCount": prompt, "candidatesTokenCount": response, "totalTokenCount": prompt + response}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Gemini REST API(generateContent / streamGenerateContent / cachedContents)처럼 응답합니다."""
+
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count("connections")
+
+    def send_json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(f"status_{status}")
+
+    def send_error_status(self, status: int) -> None:
+        """Google API 형식의 오류 응답. 429에는 Retry-After를 붙입니다."""
+        reason = "UNAVAILABLE" if status == 503 else "RESOURCE_EXHAUSTED"
+        headers = {"Retry-After": f"{self.server.config.retry_after:g}"} if status == 429 else None
+        self.send_json(status, {"error": {"code": status, "message": "stub overload", "status": reason}}, headers)
+
+    def check_key(self) -> bool:
+        """x-goog-api-key 헤더를 확인하고 키별 요청 수를 셉니다. 쓸 수 없는 키면 오류로 답하고 False."""
+        key = self.headers.get("x-goog-api-key")
+        if not key:
+            self.send_json(403, {"error": {"code": 403, "message": "missing API key", "status": "PERMISSION_DENIED"}})
+            return False
+        if key.startswith("invalid"):
+            self.send_json(
+                400, {"error": {"code": 400, "message": "API key not valid", "status": "INVALID_ARGUMENT", "reason": "API_KEY_INVALID"}}
+            )
+            return False
+        self.server.count(f"key_{key}")
+        return True
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            self.send_json(200, self.server.stats())
+            return
+        if "/models/" in path and ":" not in path:
+            if self.check_key():
+                self.server.count("key_checks")
+                self.send_json(200, {"name": path.split("/v1beta/")[-1], "supportedGenerationMethods": ["generateContent"]})
+            return
+        self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0]
+        if not self.check_key():
+            return
+        if "/cachedContents" in path:
+            self.send_json(200, {"name": f"cachedContents/stub-{self.server.count('cached_contents')}"})
+            return
+        if not path.endswith((":generateContent", ":streamGenerateContent")):
+            self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+
+        model = path.split("/models/")[-1].split(":")[0]
+        self.server.count("requests")
+        self.server.count(f"requests_{model}")
+        status, delay, (reply, evaluation) = self.server.plan(model)
+        if status != 200:
+            self.send_error_status(status)
+            return
+        if b'"responseMimeType":"application/json"' in body:
+            # 구조화된 평가를 요청하면 실제 Gemini처럼 답변과 평가를 JSON 글로 돌려줌
+            reply = json.dumps({"reply": reply, **evaluation}, ensure_ascii=False)
+
+        with self.server.active():
+            time.sleep(delay)
+            usage = stub_usage(len(body), reply)
+            if "alt=sse" not in self.path:
+                self.send_json(200, stub_chunk(reply, model, usage, finished=True))
+                return
+            self.stream(reply, model, usage)
+
+    def stream(self, reply: str, model: str, usage: dict) -> None:
+        """답변을 SSE 조각으로 나눠 보냅니다. 마지막 조각에 usageMetadata를 붙입니다."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        config = self.server.config
+        size = -(-len(reply) // max(1, config.chunks))
+        pieces = [reply[i:i + size] for i in range(0, len(reply), size)]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(config.chunk_interval)
+            last = i == len(pieces) - 1
+            event = stub_chunk(piece, model, usage if last else None, finished=last)
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.server.count("status_200")
+        self.server.count("streams")
+
+    def do_PATCH(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_json(200, {"name": self.path.split("?")[0].split("/v1beta/")[-1]})
+
+    def do_DELETE(self) -> None:
+        self.send_json(200, {})
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # listen()은 생성자에서 불리므로 대기열 길이는 클래스 속성으로 정해야 함
+    # (기본값 5로는 부하 테스트에서 한꺼번에 들어오는 연결이 거절됨)
+    request_queue_size = 512
+
+    def __init__(self, address: tuple[str, int], config: StubConfig) -> None:
+        super().__init__(address, StubHandler)
+        self.config = config
+        self._latency = parse_latency(config.latency)
+        self._model_latency = {model: parse_latency(spec) for model, spec in config.model_latency.items()}
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._counts: Counter[str] = Counter()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            self._counts[name] += 1
+            return self._counts[name]
+
+    def plan(self, model: str) -> tuple[int, float, tuple[str, dict]]:
+        """model로 온 이번 요청의 (상태 코드, 지연, (답변, 평가))를 정합니다."""
+        error_503 = self.config.model_error_503.get(model, self.config.error_503)
+        with self._lock:
+            roll = self._rng.random()
+            delay = max(0.0, self._model_latency.get(model, self._latency)(self._rng))
+            reply = self._rng.choice(STUB_REPLIES)
+        if roll < error_503:
+            return 503, 0.0, ("", {})
+        if roll < error_503 + self.config.error_429:
+            return 429, 0.0, ("", {})
+        return 200, delay, reply
+
+    def handle_error(self, request, client_address) -> None:
+        # 미리 요청을 취소하는 등 클라이언트가 먼저 연결을 끊는 것은 정상 동작
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        """응답을 만드는 동안 동시 처리 수를 셉니다."""
+        with self._lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self) -> dict:
+        """받아들인 연결 수, 받은 요청 수, 상태 코드별 응답 수, 동시 처리 수."""
+        with self._lock:
+            return {**self._counts, "in_flight": self._in_flight, "peak_in_flight": self._peak_in_flight}
+
+
+def start_stub_server(config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """백그라운드 스레드에서 스텁 서버를 띄우고 돌려줍니다. (server.server_port로 포트 확인)"""
+    server = StubServer((host, port), config or StubConfig())
+    threading.Thread(target=server.serve_forever, name="stub-gemini", daemon=True).start()
+    return server
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """스텁 서버 설정 옵션을 parser에 더합니다. (부하 테스트 도구들이 같이 씀. 기본값은 실제 Gemini와 비슷한 지연)"""
+    parser.add_argument("--latency", default=LOAD_TEST_LATENCY, help="첫 응답 지연 분포 (예: lognormal:0.8,0.5)")
+    parser.add_argument("--chunks", type=int, default=StubConfig.chunks, help="스트리밍 답변 조각 수")
+    parser.add_argument("--chunk-interval", type=float, default=LOAD_TEST_CHUNK_INTERVAL, help="조각 간격(초)")
+    parser.add_argument("--error-503", type=float, default=0.0, help="503으로 거절할 요청 비율 (0~1)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="429로 거절할 요청 비율 (0~1)")
+    parser.add_argument("--retry-after", type=float, default=StubConfig.retry_after, help="429의 Retry-After(초)")
+    parser.add_argument("--seed", type=int, help="난수 시드 (같은 값이면 같은 순서로 지연·오류가 나옴)")
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="모델=분포", help="이 모델만 다른 지연 분포 (여러 번 줄 수 있음)"
+    )
+    parser.add_argument(
+        "--model-error-503", action="append", default=[], metavar="모델=비율", help="이 모델만 다른 503 비율 (여러 번 줄 수 있음)"
+    )
+
+
+def parse_model_options(values: list[str]) -> dict[str, str]:
+    """["모델=값", ...] → {모델: 값}"""
+    options = {}
+    for value in values:
+        model, sep, setting = value.partition("=")
+        if not sep or not model:
+            raise ValueError(f"'모델=값' 형식이어야 합니다: {value}")
+        options[model] = setting
+    return options
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    parse_latency(args.latency)
+    model_latency = parse_model_options(args.model_latency)
+    for spec in model_latency.values():
+        parse_latency(spec)
+    return StubConfig(
+        latency=args.latency,
+        chunks=args.chunks,
+        chunk_interval=args.chunk_interval,
+        error_503=args.error_503,
+        error_429=args.error_429,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        model_latency=model_latency,
+        model_error_503={model: float(rate) for model, rate in parse_model_options(args.model_error_503).items()},
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), config_from_args(args))
+    print(f"Gemini 스텁 서버: GEMINI_BASE_URL=http://{args.host}:{server.server_port}/v1beta (집계: /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()